@@ -0,0 +1,82 @@
+# -*- coding:utf-8 -*-
+
+"""
+Renders the blocks of the Intercom articles found in the cache, plus generated articles with large tables, and
+reports the rendering time with and without a BeautifulSoup round trip of the output. The round trip must not
+change the output: the renderer writes the HTML as BeautifulSoup serializes it.
+
+    python -m benchmarks.blocks [--backend tmp] [--rows 500]
+"""
+
+from bs4 import BeautifulSoup
+from services.next import Next
+from utils.cache import PageCache
+from utils.parsers import extract_next_data, load_json
+import argparse, contextlib, io, time
+
+
+def load_cached_articles(backend):
+    cache = PageCache(backend)
+    articles = []
+    for key, _, _ in cache.entries():
+        metadata = cache.read_metadata(key)
+        entry = cache._decode(metadata['url'], cache.backend.read(key)) if metadata else None
+        if entry is None:
+            continue
+
+        raw = entry.body if entry.content_type == 'application/json' else extract_next_data(entry.body)
+        if not raw:
+            continue
+
+        try:
+            data = load_json(raw)
+        except ValueError:
+            continue
+
+        # Either a page's __NEXT_DATA__ or a data route
+        page_props = data.get('props', {}).get('pageProps') if 'props' in data else data.get('pageProps')
+        blocks = ((page_props or {}).get('articleContent') or {}).get('blocks')
+        if blocks:
+            articles.append((metadata['url'], blocks))
+
+    return articles
+
+
+def generate_table_article(rows, columns=6):
+    cell = {'type': 'paragraph', 'text': 'Cell with <b>bold</b> &amp; <a href="https://example.com/?a=1&b=2">a link</a>'}
+    table = {
+        'type': 'table', 'responsive': False, 'container': False, 'stacked': True,
+        'rows': [{'cells': [{'content': [cell]} for _ in range(columns)]} for _ in range(rows)]
+    }
+    return [{'type': 'heading', 'text': 'Large table'}, table, {'type': 'paragraph', 'text': 'The end.'}]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='benchmarks.blocks')
+    parser.add_argument('--backend', default=None, help='Cache to read the Intercom pages from (default: tmp).')
+    parser.add_argument('--rows', type=int, default=500, help='Rows of the generated tables.')
+    args = parser.parse_args()
+
+    articles = load_cached_articles(args.backend)
+    print('{} cached articles'.format(len(articles)))
+    articles += [('generated:{}x{}'.format(rows, 6), generate_table_article(rows)) for rows in (args.rows // 10, args.rows)]
+
+    importer = Next.__new__(Next)
+    rendering, round_trip, changed = 0, 0, []
+    with contextlib.redirect_stdout(io.StringIO()):  # Unsupported blocks are reported on stdout
+        for url, blocks in articles:
+            started = time.perf_counter()
+            content = importer.build_blocks(url, blocks)
+            rendered = time.perf_counter()
+            reparsed = str(BeautifulSoup(content, features='html.parser'))
+            rendering += rendered - started
+            round_trip += time.perf_counter() - rendered
+
+            if reparsed != content:
+                changed.append(url)
+
+    print('Rendering:             {:.3f}s'.format(rendering))
+    print('BeautifulSoup reparse: {:.3f}s (saved)'.format(round_trip))
+    print('Articles changed by the reparse: {}'.format(len(changed)))
+    for url in changed[:10]:
+        print('    {}'.format(url))
@@ -0,0 +1,102 @@
+# -*- coding:utf-8 -*-
+
+"""
+Compares gzip, zstd and zstd with a dictionary trained per host on the cached pages, and per language on the
+articles of an export. The dictionary is trained on the first pages of each group and measured on the others.
+
+    python -m benchmarks.compression [--backend tmp] [--export export.json] [--train-ratio 0.2]
+"""
+
+from urllib.parse import urlparse
+from utils.cache import PageCache
+from utils.compression import Dictionary, compress, decompress, zstandard
+import argparse, gzip, json, time
+
+
+def load_cached_pages(backend):
+    cache = PageCache(backend)
+    groups = {}
+    for key, _, _ in cache.entries():
+        metadata = cache.read_metadata(key)
+        if metadata is None:
+            continue
+
+        entry = cache._decode(metadata['url'], cache.backend.read(key))
+        if entry is not None:
+            groups.setdefault(urlparse(metadata['url']).netloc, []).append(entry.body)
+
+    return groups
+
+
+def load_exported_articles(path):
+    with open(path, 'r') as f:
+        data = json.load(f)
+
+    return {
+        'export:{}'.format(language): [article['content'].encode() for article in store['articles'].values()]
+        for language, store in data.items()
+    }
+
+
+def throughput(function, samples, size):
+    """Returns the decoding throughput in MB/s, repeating the decoding for at least 200ms."""
+    rounds, started = 0, time.perf_counter()
+    while True:
+        for sample in samples:
+            function(sample)
+        rounds += 1
+
+        elapsed = time.perf_counter() - started
+        if elapsed > 0.2:
+            return size * rounds / elapsed / 1024 / 1024
+
+
+def measure(name, samples, train_ratio):
+    split = max(1, int(len(samples) * train_ratio))
+    training, testing = samples[:split], samples[split:]
+    raw = sum(len(sample) for sample in testing)
+
+    codecs = [
+        ('gzip', lambda data: gzip.compress(data), gzip.decompress),
+        ('zlib', lambda data: compress(data, 'zlib'), lambda data: decompress(data, 'zlib')),
+    ]
+
+    if zstandard is not None:
+        codecs.append(('zstd', lambda data: compress(data, 'zstd'), lambda data: decompress(data, 'zstd')))
+        try:
+            dictionary = Dictionary.train(training)
+        except Exception as e:
+            print('{}: could not train a dictionary ({})'.format(name, e))
+        else:
+            codecs.append((
+                'zstd-dict',
+                lambda data: compress(data, 'zstd', dictionary),
+                lambda data: decompress(data, 'zstd', dictionary)
+            ))
+
+    print('{} ({} pages, {} bytes measured, {} pages used for training)'.format(name, len(testing), raw, len(training)))
+    print('    {:<10} {:>12} {:>8} {:>14}'.format('Codec', 'Bytes', 'Ratio', 'Decode MB/s'))
+    for codec, encode, decode in codecs:
+        compressed = [encode(sample) for sample in testing]
+        size = sum(len(data) for data in compressed)
+        print('    {:<10} {:>12} {:>8.2f} {:>14.1f}'.format(codec, size, raw / size, throughput(decode, compressed, raw)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='benchmarks.compression')
+    parser.add_argument('--backend', default=None, help='Cache to read the pages from (default: tmp).')
+    parser.add_argument('--export', default=None, help='Also measure the articles of this exported JSON file.')
+    parser.add_argument('--train-ratio', type=float, default=0.2, help='Share of each group used to train the dictionary.')
+    parser.add_argument('--min-pages', type=int, default=20, help='Ignore the groups with fewer pages.')
+    args = parser.parse_args()
+
+    if zstandard is None:
+        print('zstandard is not installed, only gzip and zlib are measured.')
+
+    groups = load_cached_pages(args.backend)
+    if args.export:
+        groups.update(load_exported_articles(args.export))
+
+    for name, samples in sorted(groups.items()):
+        if len(samples) >= args.min_pages:
+            measure(name, samples, args.train_ratio)
@@ -0,0 +1,98 @@
+# -*- coding:utf-8 -*-
+
+"""
+Fills a datastore with generated articles and reports the memory it uses, compared to the same knowledge base kept
+as plain dictionaries (the previous layout of the datastore), and the time taken to encode both to JSON. Both must
+encode to the same JSON.
+
+    python -m benchmarks.datastore [--articles 100000] [--categories 500]
+"""
+
+from slugify import slugify
+from utils.datastore import KnowledgeData, make_identifier
+from utils.output import iterencode
+import argparse, contextlib, io, logging, time, tracemalloc
+
+
+def generate(articles, categories):
+    for index in range(articles):
+        yield index % categories, {
+            'title': 'Article {}'.format(index),
+            'content': '<p>Content of the article {}</p>'.format(index),
+            'previous_url': 'https://help.example.com/articles/{}'.format(index),
+            'description': 'Description of the article {}'.format(index),
+            'last_updated': 1700000000 + index
+        }
+
+
+def fill_records(articles, categories):
+    store = KnowledgeData('en', 'https://help.example.com/', unique_articles_slug=False, service='benchmark')
+    category_ids = [store.add_category(None, 'Category {}'.format(index)) for index in range(categories)]
+    for category, article in generate(articles, categories):
+        store.add_article_to_category(store.add_article(**article), category_ids[category])
+    return store
+
+
+def fill_dicts(articles, categories):
+    """The same knowledge base in the previous layout of the datastore: a dictionary per category and article."""
+    parse_date = KnowledgeData.parse_date
+    data = {'base_url': 'https://help.example.com/', 'language': 'en', 'metadata': {}, 'categories': {}, 'articles': {}}
+    category_ids = []
+    for index in range(categories):
+        title = 'Category {}'.format(index)
+        identifier = make_identifier('benchmark', 'en', 'category', '/' + title)
+        data['categories'][identifier] = {
+            'title': title, 'url': None, 'slug': slugify(title), 'icon': None, 'description': None, 'seo_title': None,
+            'seo_description': None, 'parent': None, 'articles': []
+        }
+        category_ids.append(identifier)
+
+    # The datastore exports the articles by category
+    for category, article in sorted(generate(articles, categories), key=lambda item: item[0]):
+        identifier = make_identifier('benchmark', 'en', 'article', article['previous_url'])
+        data['articles'][identifier] = {
+            'title': article['title'], 'content': article['content'], 'previous_url': article['previous_url'],
+            'slug': slugify(article['title']), 'description': article['description'], 'seo_title': None,
+            'seo_description': None, 'created': parse_date(None, article['last_updated']),
+            'last_updated': parse_date(None, article['last_updated'])
+        }
+        data['categories'][category_ids[category]]['articles'].append(identifier)
+    return data
+
+
+def measure(function, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - started
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def encode(data):
+    started = time.perf_counter()
+    encoded = ''.join(iterencode(data))
+    return encoded, time.perf_counter() - started
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='benchmarks.datastore')
+    parser.add_argument('--articles', type=int, default=100000)
+    parser.add_argument('--categories', type=int, default=500)
+    args = parser.parse_args()
+
+    logging.getLogger('knowledge-base-exporter').setLevel(logging.WARNING)
+    with contextlib.redirect_stdout(io.StringIO()):
+        store, records_size, records_time = measure(fill_records, args.articles, args.categories)
+    data, dicts_size, _ = measure(fill_dicts, args.articles, args.categories)
+
+    records_json, records_encoding = encode(store.serialize())
+    dicts_json, dicts_encoding = encode(data)
+
+    print('{} articles in {} categories, filled in {:.2f}s'.format(args.articles, args.categories, records_time))
+    print('{:<10} {:>14} {:>14}'.format('Layout', 'Memory (MB)', 'Encoding (s)'))
+    print('{:<10} {:>14.1f} {:>14.2f}'.format('records', records_size / 1024 ** 2, records_encoding))
+    print('{:<10} {:>14.1f} {:>14.2f}'.format('dicts', dicts_size / 1024 ** 2, dicts_encoding))
+    print('Memory saved: {:.1%}'.format(1 - records_size / dicts_size))
+    print('Same JSON: {}'.format(records_json == dicts_json))
@@ -0,0 +1,93 @@
+# -*- coding:utf-8 -*-
+
+"""
+Exports a knowledge base from the cache with each installed HTML parser, then reports how long each one took and
+whether the articles are byte-identical to the ones produced with html.parser.
+
+The pages must be cached first, by a regular export of the same url:
+
+    python export.py -u https://help.example.com -s crisp
+    python -m benchmarks.parsers -u https://help.example.com -s crisp [--backend tmp] [--language en]
+"""
+
+from export import get_importer
+from utils.parsers import PARSERS, is_available
+import argparse, time
+
+
+def run(service, url, language, parser, backend, warc_in):
+    importer = get_importer(service, cache_policy='offline', cache_backend=backend, warc_in=warc_in, parser=parser)
+    timings = {'parse': 0, 'parse_content': 0}
+
+    def timed(name, function):
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                timings[name] += time.perf_counter() - started
+
+        return wrapper
+
+    # parse_content may parse fragments itself, its timing includes them
+    importer.parse = timed('parse', importer.parse)
+    if hasattr(importer, 'parse_content'):
+        importer.parse_content = timed('parse_content', importer.parse_content)
+
+    started = time.perf_counter()
+    try:
+        importer.load(url, language)
+    finally:
+        importer.close()
+    timings['total'] = time.perf_counter() - started
+
+    articles = {}
+    for code, store in importer.serialize().items():
+        for article in store['articles'].values():
+            articles[(code, article['previous_url'])] = article
+
+    return timings, articles
+
+
+def compare(reference, articles):
+    """Returns the (language, url) of the articles missing or differing from the reference."""
+    differences = []
+    for key, article in reference.items():
+        if key not in articles:
+            differences.append((key, 'missing'))
+            continue
+
+        for field in ('title', 'description', 'content'):
+            if article.get(field) != articles[key].get(field):
+                differences.append((key, field))
+                break
+
+    differences += [(key, 'extra') for key in articles if key not in reference]
+    return differences
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='benchmarks.parsers')
+    parser.add_argument('-u', '--url', required=True)
+    parser.add_argument('-s', '--service', required=True)
+    parser.add_argument('-l', '--language', default=None)
+    parser.add_argument('--backend', default=None, help='Cache holding the pages (default: tmp).')
+    parser.add_argument('--warc-in', default=None, help='Read the pages from this WARC file instead.')
+    args = parser.parse_args()
+
+    parsers = [name for name in PARSERS if is_available(name)]
+    print('Available parsers: {}'.format(', '.join(parsers)))
+
+    reference = None
+    print('{:<12} {:>10} {:>10} {:>14} {:>10} {:>11}'.format('Parser', 'Total (s)', 'Parse (s)', 'Content (s)', 'Articles', 'Different'))
+    for name in parsers:
+        timings, articles = run(args.service, args.url, args.language, name, args.backend, args.warc_in)
+        differences = [] if reference is None else compare(reference, articles)
+        if reference is None:
+            reference = articles
+
+        print('{:<12} {:>10.2f} {:>10.2f} {:>14.2f} {:>10} {:>11}'.format(
+            name, timings['total'], timings['parse'], timings['parse_content'], len(articles), len(differences)
+        ))
+        for (code, url), field in differences[:10]:
+            print('    [{}] {}: {}'.format(code, url, field))
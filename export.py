@@ -6,40 +6,113 @@ What to do left:
 
 * Adapt the code for all the services. So far only the following has been properly implemented:
     * Crisp
-
-Change the "output" parameter to not be a file, but a path only (string) to avoid erasing the file when starting (and keeping it when it fails)
 """
 
 from argparse import RawTextHelpFormatter
-import argparse, json, logging
+from utils.cache import PageCache, parse_duration, parse_size
+from utils.delta import compute_delta
+from utils.output import iterencode, write_json
+import argparse, logging, sys
 
 
-def export(url, service, output, language=None, pretty=False):
-    importer = None
+def get_importer(service, **kwargs):
+    service_name = ''.join([x.title() for x in service.split('_')])
     try:
-        service_name = ''.join([x.title() for x in service.split('_')])
         mod = __import__('services.{}'.format(service.lower()), fromlist=[service_name])
-        importer = getattr(mod, service_name)()
+        importer = getattr(mod, service_name)(**kwargs)
         assert importer is not None, 'Service {} is not available to be automatically imported yet'.format(service_name)
     except ImportError as e:
         raise NotImplementedError('Service {} is not available to be automatically imported yet'.format(service_name))
 
+    return importer
+
+
+def export(url, service, output, language=None, pretty=False, workers=8, rate=10, pool_size=None, http2=False, cache_policy=None, cache_max_size=None, cache_max_age=None, cache_backend=None, cache_compression=None, warc_in=None, warc_out=None, parser=None, blobs=None, since=None, delta=None):
+    assert since or not delta, '--delta requires --since, the export the changes are computed from'
+
+    importer = get_importer(
+        service,
+        max_workers=workers,
+        rate=rate,
+        pool_size=pool_size,
+        http2=http2,
+        cache_policy=cache_policy,
+        cache_max_size=parse_size(cache_max_size) if cache_max_size else None,
+        cache_max_age=parse_duration(cache_max_age) if cache_max_age else None,
+        cache_backend=cache_backend,
+        cache_compression=cache_compression,
+        warc_in=warc_in,
+        warc_out=warc_out,
+        parser=parser,
+        blobs=blobs,
+        since=since,
+        # Only the digests of the previous export are kept during the crawl
+        delta=bool(delta)
+    )
+
     if language:
         language = language.lower()
 
-    importer.load(url, language)
+    try:
+        importer.load(url, language)
+    finally:
+        importer.close()
+
+    logging.getLogger('knowledge-base-exporter').info('HTTP: {requests} requests, {connections_opened} connections opened, {connections_reused} reused'.format(**importer.http.stats()))
+    if since:
+        logging.getLogger('knowledge-base-exporter').info('{} articles reused from {}'.format(importer.reused_articles, since))
+    serialized = importer.serialize()
+    if delta:
+        changes = compute_delta(importer.previous_digests, serialized)
+        write_json(delta, changes, pretty)
+        logging.getLogger('knowledge-base-exporter').info('Delta: {} added, {} updated, {} removed'.format(*[
+            sum(len(language[kind][change]) for language in changes.values() for kind in language)
+            for change in ('added', 'updated', 'removed')
+        ]))
+
     if output:
-        params = {}
-        if pretty:
-            params['indent'] = 4
+        write_json(output, serialized, pretty)
+    else:
+        for chunk in iterencode(serialized, indent=4):
+            sys.stdout.write(chunk)
+        sys.stdout.write('\n')
+
+
+def cache(action, host=None, max_size=None, max_age=None, backend=None):
+    page_cache = PageCache(backend)
+
+    if action == 'stats':
+        stats = page_cache.stats()
+        print('{:<40} {:>10} {:>14} {:>10}'.format('Host', 'Entries', 'Bytes', 'Hit ratio'))
+        for name in sorted(stats):
+            if host and name != host.lower():
+                continue
+
+            entry = stats[name]
+            hit_ratio = '-' if entry['hit_ratio'] is None else '{:.1%}'.format(entry['hit_ratio'])
+            print('{:<40} {:>10} {:>14} {:>10}'.format(name, entry['entries'], entry['bytes'], hit_ratio))
+        return
 
-        with open(output, 'w') as f:
-            f.write(json.dumps(importer.serialize(), **params))
+    if action == 'gc':
+        assert max_size or max_age, 'gc requires --max-size and/or --max-age'
+        removed, freed = page_cache.gc(parse_size(max_size) if max_size else None, parse_duration(max_age) if max_age else None)
     else:
-        print(json.dumps(importer.serialize(), indent=4))
+        removed, freed = page_cache.purge(host)
 
+    page_cache.close()
+    print('Removed {} entries ({} bytes)'.format(removed, freed))
 
-if __name__ == '__main__':
+
+if __name__ == '__main__' and len(sys.argv) > 1 and sys.argv[1] == 'cache':
+    parser = argparse.ArgumentParser(prog='knowledge-base-exporter cache', description='Manage the pages cache.')
+    parser.add_argument('action', choices=('stats', 'gc', 'purge'))
+    parser.add_argument('--backend', required=False, default=None, help='Cache to manage: a directory (default: tmp), sqlite:<path> or the url of a cache server.')
+    parser.add_argument('--host', required=False, default=None, help='Only report or purge the entries of this host.')
+    parser.add_argument('--max-size', required=False, default=None, help='gc: maximum size of the cache (e.g. 500M, 2G).')
+    parser.add_argument('--max-age', required=False, default=None, help='gc: remove the entries unused for this long (e.g. 12h, 7d).')
+
+    cache(**vars(parser.parse_args(sys.argv[2:])))
+elif __name__ == '__main__':
     parser = argparse.ArgumentParser(
         prog='knowledge-base-exporter',
         formatter_class=RawTextHelpFormatter,
@@ -59,10 +132,49 @@ if __name__ == '__main__':
 
     parser.add_argument('-u', '--url', required=True, help='URL to the knowledge base to export', dest='url')
     parser.add_argument('-s', '--service', required=True, help='Name of the service providing the knowledge base.')
-    parser.add_argument('-o', '--output', required=False, default=None, help="JSON file to write the exported data")
+    parser.add_argument('-o', '--output', required=False, default=None, help="JSON file to write the exported data, replaced once the export succeeded. Compressed if it ends with .gz or .zst (requires zstandard).")
     parser.add_argument('-l', '--language', required=False, default=None, help='Specific language to process. Defaults to all available.')
     parser.add_argument('-v', '--verbose', help='Set output logging to debug', action='store_const', const=logging.DEBUG, default=logging.WARNING)
     parser.add_argument('--pretty', action='store_true')
+    parser.add_argument('-w', '--workers', required=False, type=int, default=8, help='Number of pages fetched concurrently. Defaults to 8.')
+    parser.add_argument('-r', '--rate', required=False, type=float, default=10, help='Maximum number of requests per second sent to a single host. Defaults to 10.')
+    parser.add_argument('--pool-size', required=False, type=int, default=None, help='Number of keep-alive connections per host. Defaults to the number of workers.')
+    parser.add_argument(
+        '--cache-policy', required=False, default=None, dest='cache_policy',
+        help='How cached pages are reused: forever (default), offline, ttl=<duration> (e.g. 3600, 30m, 12h, 7d), revalidate or refresh.'
+    )
+    parser.add_argument('--cache-max-size', required=False, default=None, help='Evict the least recently used pages when the cache exceeds this size (e.g. 500M, 2G).')
+    parser.add_argument('--cache-max-age', required=False, default=None, help='Evict the pages unused for this long (e.g. 12h, 7d).')
+    parser.add_argument(
+        '--cache-backend', required=False, default=None,
+        help='Where pages are cached: a directory (default: tmp), sqlite:<path>, or the url of a shared cache server (see utils/cache_server.py).'
+    )
+    parser.add_argument(
+        '--cache-compression', required=False, default=None, choices=('zlib', 'zstd', 'zstd-dict'),
+        help='Compression of the cached pages. zstd-dict trains a zstd dictionary per host (requires zstandard). Defaults to zlib.'
+    )
+    parser.add_argument(
+        '--warc-in', required=False, default=None,
+        help='WARC file (.warc or .warc.gz) to read the pages missing from the cache from. Use with --cache-policy offline to replay an archived crawl.'
+    )
+    parser.add_argument('--warc-out', required=False, default=None, help='Archive every page used by the export in this WARC file (gzipped if it ends with .gz).')
+    parser.add_argument(
+        '--parser', required=False, default=None, choices=('html.parser', 'lxml', 'html5lib'),
+        help='HTML parser used by BeautifulSoup. lxml is much faster, see benchmarks/parsers.py to check a service gives the same output with it. Defaults to html.parser.'
+    )
+    parser.add_argument(
+        '--blobs', required=False, default=None,
+        help='Directory where the articles content is kept during the export instead of memory. Contents are stored once per digest and can be shared by several exports.'
+    )
+    parser.add_argument(
+        '--since', required=False, default=None,
+        help='Previous export of the same knowledge base. Articles whose last update date did not change are copied from it instead of being parsed again.'
+    )
+    parser.add_argument(
+        '--delta', required=False, default=None,
+        help='Also write the categories and articles added, updated and removed since the --since export in this JSON file.'
+    )
+    parser.add_argument('--http2', action='store_true', help='Use HTTP/2 when available (requires httpx[http2]).')
 
     args = vars(parser.parse_args())
     logger = logging.getLogger('knowledge-base-exporter')
@@ -1,23 +1,366 @@
 # -*- coding:utf-8 -*-
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, Comment, Tag
+from email.utils import format_datetime
 from urllib.parse import urlparse, parse_qs, urlencode
+from utils.blobs import BlobStore
 from utils.datastore import KnowledgeData
-import requests, os, base64
+from utils.delta import digest_export
+from utils.crawler import Crawler, SingleFlight, Throttled, parse_retry_after
+from utils.http import HttpClient
+from utils.cache import PageCache
+from utils.urls import canonicalize_url
+from utils.output import read_json
+from utils.parsers import check_parser, parse_fragment, parse_html
+import datetime, json, logging, re, shutil, tempfile, threading, time
+
+# A tag name, class and attribute, each optional: "div", ".hint", "div.hint", "[role=cell]", "img[alt]"
+SELECTOR_RE = re.compile(r'^(\w+)?(?:\.([\w-]+))?(?:\[([\w-]+)(?:=([^\]]*))?\])?$')
+
+
+def _classes(item):
+    classes = item.get('class') or []
+    return classes.split() if isinstance(classes, str) else classes
+
+
+def _detached(node):
+    # Decomposed nodes lose their attributes, parent included. Tag.decomposed is avoided: on the elements that were
+    # not decomposed, it searches their whole subtree for a <_decomposed> tag.
+    return getattr(node, 'parent', None) is None
+
+
+def is_blank(element):
+    """Returns whether `element` holds no text, stopping at the first string that isn't blank."""
+    return not any(string.strip() for string in element.strings)
+
+
+def _compile_selector(selector):
+    """Returns the (name, class, attribute, value, parent) of a selector, the parent being compiled the same way."""
+    parent, _, selector = selector.rpartition('>')
+    match = SELECTOR_RE.match(selector.strip())
+    assert match and any(match.groups()), 'Unsupported selector "{}"'.format(selector)
+    return match.groups() + (_compile_selector(parent) if parent.strip() else None,)
+
+
+def _matches(item, selector, classes=None):
+    name, cls, attribute, value, parent = selector
+    if name and item.name != name:
+        return False
+
+    if cls and cls not in (_classes(item) if classes is None else classes):
+        return False
+
+    if attribute and (attribute not in item.attrs or (value is not None and item.attrs[attribute] != value)):
+        return False
+
+    return parent is None or (item.parent is not None and _matches(item.parent, parent))
+
+
+class Rule:
+    """
+    What to do with the elements matched by one of `selectors`. A selector is a tag name, a class and an attribute,
+    each optional ("div.hint", "[role=cell]"), and may require a parent ("code > span").
+
+    The element is either dropped, left as is (`skip`), or has, in order:
+    - the attributes in `remove` deleted,
+    - the classes in `remove_classes` deleted, or all its classes when `classes` is given, any other class failing,
+    - its tag renamed to `rename` and the `attributes` set,
+    - been wrapped in a callout: `callout` is the modifier class of the callout, or an (attribute, {value: modifier})
+      pair choosing it from the value of an attribute of the element,
+    - the importer's method named `handler` called with the element and the soup,
+    - been unwrapped.
+    """
+
+    def __init__(self, *selectors, drop=False, skip=False, unwrap=False, rename=None, remove=(), classes=None, remove_classes=(), attributes=None, callout=None, handler=None):
+        self.selectors = [_compile_selector(selector) for selector in selectors]
+        self.drop = drop
+        self.skip = skip
+        self.unwrap = unwrap
+        self.rename = rename
+        self.remove = frozenset(remove)
+        self.classes = frozenset(classes) if classes is not None else None
+        self.remove_classes = frozenset(remove_classes)
+        self.attributes = attributes or {}
+        self.callout = callout
+        self.handler = handler
+
+    def get_callout(self, item):
+        if not self.callout or isinstance(self.callout, str):
+            return self.callout
+
+        attribute, modifiers = self.callout
+        value = item.get(attribute)
+        assert value in modifiers, 'Unknown {} "{}" for callout'.format(attribute, value)
+        return modifiers[value]
+
+
+class Sanitizer:
+    """
+    Cleans up the HTML of articles in a single walk of the tree, applying to each element the first of the `rules`
+    matching it, or the `default` one. Rules are indexed by tag name, class and attribute when the sanitizer is built,
+    so finding the rule of an element costs a few dict lookups whatever the number of rules.
+
+    Unless its rule drops or skips it, every element also loses the attributes in `remove` or starting with one of
+    `remove_prefixes` and the classes in `remove_classes`. The elements remaining in place are then given to the
+    importer's method named `check`, if any, and once the whole tree was processed, to the one named `after`,
+    children first. `comments` tells whether HTML comments are kept.
+    """
+
+    def __init__(self, *rules, default=None, remove=(), remove_prefixes=(), remove_classes=(), check=None, after=None, comments=True):
+        self.default = default or Rule()
+        self.remove_prefixes = tuple(remove_prefixes)
+        self.check = check
+        self.after = after
+        self.comments = comments
+
+        # Each selector is indexed on its most selective part
+        self.by_name, self.by_class, self.by_attribute = {}, {}, {}
+        for priority, rule in enumerate(rules):
+            for selector in rule.selectors:
+                name, cls, attribute = selector[:3]
+                if cls:
+                    index, key = self.by_class, cls
+                elif attribute:
+                    index, key = self.by_attribute, attribute
+                else:
+                    index, key = self.by_name, name
+
+                index.setdefault(key, []).append((priority, selector, rule))
+
+        # The attributes and classes removed by each rule, on top of the ones removed from every element
+        self.removed = {
+            rule: (frozenset(remove) | rule.remove, frozenset(remove_classes) | rule.remove_classes | (rule.classes or frozenset()))
+            for rule in rules + (self.default,)
+        }
+
+    def match(self, item, classes):
+        candidates = self.by_name.get(item.name, [])
+        others = [candidate for cls in classes for candidate in self.by_class.get(cls, ())]
+        if self.by_attribute:
+            others += [candidate for attribute in item.attrs for candidate in self.by_attribute.get(attribute, ())]
+        if others:
+            candidates = candidates + others
+
+        best = None
+        for candidate in candidates:
+            if (best is None or candidate[0] < best[0]) and _matches(item, candidate[1], classes):
+                best = candidate
+
+        return best[2] if best else self.default
+
+    def apply(self, importer, root, soup):
+        """Sanitizes the descendants of `root` in place."""
+        processed = []
+        # Elements moved or created by the rules are not visited, the ones dropped or detached are skipped
+        for node in list(root.descendants):
+            if _detached(node):
+                continue
+
+            if isinstance(node, Comment):
+                if not self.comments:
+                    node.extract()
+                continue
+
+            if not isinstance(node, Tag):
+                continue
+
+            try:
+                if self.process(importer, node, soup):
+                    processed.append(node)
+            except Exception:
+                logging.getLogger('knowledge-base-exporter').error('While sanitizing <{}> {}'.format(node.name, node.attrs))
+                raise
+
+        if self.after:
+            after = getattr(importer, self.after)
+            for item in reversed(processed):
+                if not _detached(item):
+                    after(item, soup)
+
+    def process(self, importer, item, soup):
+        """Applies its rule to `item`, returns whether the element is still in place."""
+        classes = _classes(item)
+        rule = self.match(item, classes)
+        if rule.drop:
+            item.decompose()
+            return False
+
+        if rule.skip:
+            return True
+
+        callout = rule.get_callout(item)
+        remove, remove_classes = self.removed[rule]
+
+        removed = [name for name in item.attrs if name in remove or name.startswith(self.remove_prefixes)]
+        for name in removed:
+            del item.attrs[name]
+
+        if classes and 'class' not in removed:
+            if rule.classes is not None:
+                unexpected = [cls for cls in classes if cls not in remove_classes]
+                assert not unexpected, 'Unexpected classes {} on <{}>'.format(unexpected, item.name)
+
+            kept = [cls for cls in classes if cls not in remove_classes]
+            if not kept:
+                del item.attrs['class']
+            elif len(kept) < len(classes):
+                item.attrs['class'] = kept
+
+        if rule.rename:
+            item.name = rule.rename
+
+        for name, value in rule.attributes.items():
+            item.attrs[name] = value
+
+        if callout:
+            item.wrap(soup.new_tag('div', attrs={'class': ['callout', callout]}))
+
+        if rule.handler:
+            getattr(importer, rule.handler)(item, soup)
+
+        if rule.unwrap and not _detached(item):
+            item.unwrap()
+            return False
+
+        if _detached(item):
+            return False
+
+        if self.check:
+            getattr(importer, self.check)(item, soup)
+
+        return True
 
 
 class KnowledgeBaseImporter:
-    def __init__(self):
+    # The selectors of the service (see `utils.selectors.SiteProfile`)
+    PROFILE = None
+
+    def __init__(self, max_workers=8, rate=10, pool_size=None, http2=False, cache_policy=None, cache_max_size=None, cache_max_age=None, cache_backend=None, cache_compression=None, warc_in=None, warc_out=None, parser=None, blobs=None, since=None, delta=False):
         self.datastores = {}
+        self._datastores_lock = threading.Lock()
+        self.blobs = BlobStore(blobs) if blobs else None
         self.current_language = None
+        self.max_workers = max_workers
+        self.http = HttpClient(pool_size=pool_size or max_workers, http2=http2)
+        self.cache = PageCache(
+            cache_backend, cache_policy, max_size=cache_max_size, max_age=cache_max_age, compression=cache_compression,
+            warc_in=warc_in, warc_out=warc_out
+        )
+        self.crawler = Crawler(self.download, rate=rate, burst=rate, max_concurrency=max_workers)
+        self.flights = SingleFlight()
+        self.parser = check_parser(parser)
+
+        # Articles of the previous export that can be reused, see `load_previous`, and the digests of its records when
+        # the changes since are computed (see `utils.delta`)
+        self.previous_blobs = BlobStore(tempfile.mkdtemp(prefix='knowledge-base-exporter-')) if since else None
+        self.previous, self.previous_digests = self.load_previous(since, delta) if since else ({}, None)
+        self.reused_articles = 0
+
+    def load_previous(self, path, digests=False):
+        """
+        Reads the previous export and returns the last update of its articles by language and previous url, with the
+        digest of the article: the articles are kept in `previous_blobs`, and only read back when reused. The digests
+        of all its records (see `utils.delta.digest_export`) are returned too when `digests` is set, else None.
+        """
+        export = read_json(path)
+        previous = {}
+        for language, store in export.items():
+            # Articles without last_updated can't be told unchanged, they are always parsed again
+            previous[language] = {
+                article['previous_url']: (article['last_updated'], self.previous_blobs.put(json.dumps(article)))
+                for article in store.get('articles', {}).values() if article.get('last_updated')
+            }
+        return previous, digest_export(export) if digests else None
+
+    def previous_article(self, previous_url, last_updated, language=None):
+        """
+        Returns the article of the previous export (see --since) at `previous_url` if it has the same `last_updated`,
+        or None when the article is new or was updated since.
+        """
+        if not last_updated or not self.previous:
+            return None
+
+        language = language or self.current_language
+        previous = self.previous.get(language, {}).get(self.get_url(previous_url, language))
+        if previous is None or previous[0] != self.datastore(language).parse_date(last_updated):
+            return None
+
+        return json.loads(self.previous_blobs.get(previous[1]))
+
+    def unchanged_articles(self, urls, language=None):
+        """
+        Returns the articles of the previous export at `urls` whose page was not modified since they were last updated,
+        by url, for the services whose listings don't give the update date: the server is asked with a conditional
+        HEAD request, so that the unchanged pages are not downloaded. The pages in the cache are always read instead.
+        """
+        if not self.previous or self.cache.policy.offline:
+            return {}
+
+        language = language or self.current_language
+        previous = self.previous.get(language, {})
+        dates, requested = {}, []
+        for url in urls:
+            absolute = self.get_url(url, language)
+            if absolute not in previous or absolute in dates or self.get_cached_version(absolute)[1]:
+                continue
+
+            try:
+                last_updated = datetime.datetime.fromisoformat(previous[absolute][0])
+            except ValueError:
+                continue
+
+            if last_updated.tzinfo is None:
+                last_updated = last_updated.replace(tzinfo=datetime.timezone.utc)
+            dates[absolute] = format_datetime(last_updated.astimezone(datetime.timezone.utc), usegmt=True)
+            requested.append(url)
+
+        if not dates:
+            return {}
+
+        modified = self.crawler.run(list(dates), modified_since=dates)
+        return {
+            url: json.loads(self.previous_blobs.get(previous[absolute][1]))
+            for url, absolute, changed in zip(requested, dates, modified) if not changed
+        }
+
+    def previous_content(self, previous_url, last_updated, language=None):
+        """Returns the content of the article in the previous export if it was not updated since, else None."""
+        previous = self.previous_article(previous_url, last_updated, language)
+        if previous is None:
+            return None
+
+        self.reused_articles += 1
+        return previous['content']
+
+    def copy_article(self, category_id, previous, language=None, position=None, **entry):
+        """
+        Saves an article of the previous export as it was, see `previous_article`. `entry` gives the fields that are
+        not exported, such as the source_id.
+        """
+        self.reused_articles += 1
+        fields = ('title', 'slug', 'description', 'seo_title', 'seo_description', 'created', 'last_updated', 'previous_url', 'content')
+        return self.save_article(category_id, {**{field: previous.get(field) for field in fields}, **entry}, language, position)
+
+    def close(self):
+        if self.PROFILE:
+            self.PROFILE.report()
+
+        if self.cache.max_size or self.cache.max_age:
+            self.cache.gc()
+
+        self.cache.close()
+        self.http.close()
+        if self.previous_blobs:
+            shutil.rmtree(self.previous_blobs.directory, ignore_errors=True)
 
     def serialize(self):
         return {key: self.datastores[key].serialize() for key in self.datastores}
 
     def add_language(self, language, url):
-        assert language not in self.datastores, "Language {} already in the data store".format(language)
-        self.datastores[language] = KnowledgeData(language, url)
-        self.current_language = language
+        with self._datastores_lock:
+            assert language not in self.datastores, "Language {} already in the data store".format(language)
+            self.datastores[language] = KnowledgeData(language, url, blobs=self.blobs, service=type(self).__name__.lower())
+            self.current_language = language
 
     def load(self, base_url: str):
         raise NotImplementedError('load method must be implemented')
@@ -29,86 +372,183 @@ class KnowledgeBaseImporter:
     def base_url(self):
         return self.datastores[self.current_language].base_url
 
-    def get_url(self, url):
+    def get_url(self, url, language=None):
         if url.startswith('http'):
             return url
 
+        base_url = self.datastore(language).base_url
         if url.startswith('/'):
-            last_slash_index = self.base_url.find('/', 9)
+            last_slash_index = base_url.find('/', 9)
             if last_slash_index == -1:
-                return self.base_url + url
-            return self.base_url[0:self.base_url.find('/', 9)] + url
+                return base_url + url
+            return base_url[0:last_slash_index] + url
 
-        return self.base_url + url
+        return base_url + url
 
     def get_cached_version(self, url):
-        cache_fp = os.path.join('tmp', base64.b64encode(url.encode()).decode())
-        if os.path.exists(cache_fp):
-            with open(cache_fp, 'r') as f:
-                complete = f.read()
-                url, content = complete.split('\n\n', 1)
-                return url, content
+        entry = self.cache.get(url)
+        if entry:
+            return entry.final_url, entry.content
 
         return None, None
 
-    def cache_request(self, original_url, destination_url, content):
-        if not os.path.exists('tmp'):
-            # create folder
-            os.mkdir('tmp')
+    def cache_request(self, original_url, destination_url, content, headers=None):
+        entry = self.cache.put(original_url, destination_url, content, headers)
+        return destination_url, entry.content
 
-        cache_fp = os.path.join('tmp', base64.b64encode(original_url.encode()).decode())
-        if not os.path.exists(cache_fp):
-            with open(cache_fp, 'w') as f:
-                f.write(destination_url)
-                f.write('\n\n')
-                f.write(content)
+    def remove_cache(self, url):
+        self.cache.remove(url)
 
-        return destination_url, content
+    def download(self, url, modified_since=None, **kwargs):
+        if modified_since is not None:
+            return self._modified(url, modified_since[url], **kwargs)
 
-    def remove_cache(self, url):
-        cache_fp = os.path.join('tmp', base64.b64encode(url.encode()).decode())
-        if os.path.exists(cache_fp):
-            os.remove(cache_fp)
+        # Concurrent downloads of the same page (or of two variants of its url) share a single request
+        return self.flights.do(self.cache.canonical(url), self._download, url, **kwargs)
 
-    def retrieve(self, url, return_url=False, **kwargs) -> BeautifulSoup:
+    def _modified(self, url, since, **kwargs):
+        """Returns whether the page was modified since the HTTP date `since`, see `unchanged_articles`."""
         if 'timeout' not in kwargs:
             kwargs['timeout'] = 10
 
+        headers = {**kwargs.pop('headers', {}), 'If-Modified-Since': since}
+        r = self.http.request('HEAD', canonicalize_url(url, strip_trailing_slash=False), headers=headers, **kwargs)
+        if r.status_code in (429, 503):
+            raise Throttled(url, parse_retry_after(r.headers.get('Retry-After')))
+
+        return r.status_code != 304
+
+    def _download(self, url, **kwargs):
+        assert not self.cache.policy.offline, '{} is not cached and the cache policy is offline'.format(url)
+
+        if 'timeout' not in kwargs:
+            kwargs['timeout'] = 10
+
+        started = time.time()
+        with self.cache.lock(url):
+            # Another thread or worker sharing the cache may have fetched the page while we were waiting
+            stale = self.cache.load(url)
+            if stale and self.cache.is_fresh(stale, since=started):
+                self.cache.validated.add(stale.url)
+                self.cache.record(stale)
+                return stale.final_url, stale.content
+
+            if stale and self.cache.policy.conditional:
+                kwargs['headers'] = {**stale.conditional_headers(), **kwargs.get('headers', {})}
+
+            # Fragments and tracking parameters don't change the page, the trailing slash is kept as some servers care
+            r = self.http.get(canonicalize_url(url, strip_trailing_slash=False), **kwargs)
+            if r.status_code == 304 and stale:
+                self.cache.touch(stale)
+                return stale.final_url, stale.content
+
+            if r.status_code in (429, 503):
+                raise Throttled(url, parse_retry_after(r.headers.get('Retry-After')))
+
+            r.raise_for_status()
+            return self.cache_request(url, str(r.url), r.content, r.headers)
+
+    def parse(self, markup, regions=None) -> BeautifulSoup:
+        return parse_html(markup, self.parser, regions)
+
+    def parse_fragment(self, markup):
+        """Returns the soup of a piece of HTML, and the element holding it (see `utils.parsers.parse_fragment`)."""
+        return parse_fragment(markup, self.parser)
+
+    def select(self, key, tag):
+        """Returns the elements under `tag` matching the selector `key` of the service's profile."""
+        return self.PROFILE.select(key, tag)
+
+    def select_one(self, key, tag):
+        return self.PROFILE.select_one(key, tag)
+
+    def sanitize(self, root, soup, sanitizer):
+        """Cleans up the content of `root` in place with the rules of `sanitizer` (see `Sanitizer`)."""
+        sanitizer.apply(self, root, soup)
+        return root
+
+    def retrieve_entry(self, url, **kwargs):
+        """Returns the cache entry of the page, downloading it if needed, for the callers not needing the HTML tree."""
+        url = self.get_url(url)
+        entry = self.cache.get(url)
+        if entry is None:
+            self.crawler.fetch(url, **kwargs)
+            entry = self.cache.load(url)
+
+        return entry
+
+    def retrieve(self, url, return_url=False, regions=None, **kwargs) -> BeautifulSoup:
+        """Returns the parsed page. With `regions` (see `utils.parsers.Regions`), only these parts of the page are parsed."""
         url = self.get_url(url)
         new_url, cached = self.get_cached_version(url)
         if not cached:
-            r = requests.get(url, **kwargs)
-            r.raise_for_status()
-            new_url, cached = self.cache_request(url, r.url, r.content.decode())
+            new_url, cached = self.crawler.fetch(url, **kwargs)
 
-        soup = BeautifulSoup(cached, features='html.parser')
+        soup = self.parse(cached, regions)
 
         if return_url:
             return new_url, soup
 
         return soup
 
-    def save_category(self, parent_id, entry):
-        return self.datastores[self.current_language].add_category(parent_id, **entry)
-
-    def save_article(self, category_id, entry):
+    def retrieve_many(self, urls, **kwargs):
+        """
+        Retrieve the given urls, downloading the missing ones concurrently through the crawler.
+        Results are returned in the same order as `urls`, so callers can save them as if they were fetched serially.
+        """
+        urls = [self.get_url(url) for url in urls]
+        unique = {}
+        for url in urls:
+            unique.setdefault(self.cache.canonical(url), url)
+
+        missing = [url for url in unique.values() if not self.get_cached_version(url)[1]]
+        if len(missing) > 1:
+            download_kwargs = {k: v for k, v in kwargs.items() if k not in ('return_url', 'regions')}
+            self.crawler.run(missing, **download_kwargs)
+
+        return [self.retrieve(url, **kwargs) for url in urls]
+
+    def datastore(self, language=None):
+        """
+        Returns the datastore of `language`, defaulting to the language being processed. Workers saving concurrently
+        must give their language, `current_language` is shared by all of them.
+        """
+        return self.datastores[language or self.current_language]
+
+    def save_category(self, parent_id, entry, language=None, position=None):
+        return self.datastore(language).add_category(parent_id, position=position, **entry)
+
+    def save_article(self, category_id, entry, language=None, position=None):
+        """Saves an article in `category_id`, at `position` among the articles of that category."""
         if not entry['previous_url'].startswith('http'):
-            entry['previous_url'] = self.get_url(entry['previous_url'])
-        identifier = self.datastores[self.current_language].add_article(**entry)
-        self.add_article_to_category(identifier, category_id)
+            entry['previous_url'] = self.get_url(entry['previous_url'], language)
+        identifier = self.datastore(language).add_article(**entry)
+        self.add_article_to_category(identifier, category_id, language, position)
         return identifier
 
-    def add_article_to_category(self, article_id, category_id):
-        self.datastores[self.current_language].add_article_to_category(article_id, category_id)
+    def find_article(self, previous_url=None, source_id=None, language=None):
+        """Returns the identifier of the article saved with this url or source id, or None."""
+        if previous_url is not None:
+            previous_url = self.get_url(previous_url, language)
+        return self.datastore(language).find_article(previous_url, source_id)
+
+    def add_source(self, source_id, previous_url, language=None):
+        self.datastore(language).add_source(source_id, self.get_url(previous_url, language))
 
-    def set_metadata(self, metadata):
-        self.datastores[self.current_language].set_metadata(metadata)
+    def source_url(self, source_id, language=None):
+        return self.datastore(language).source_url(source_id)
 
-    def add_header_link(self, title, url):
-        self.datastores[self.current_language].add_link('header', title, url)
+    def add_article_to_category(self, article_id, category_id, language=None, position=None):
+        self.datastore(language).add_article_to_category(article_id, category_id, position)
 
-    def add_footer_link(self, title, url):
-        self.datastores[self.current_language].add_link('footer', title, url)
+    def set_metadata(self, metadata, language=None):
+        self.datastore(language).set_metadata(metadata)
+
+    def add_header_link(self, title, url, language=None):
+        self.datastore(language).add_link('header', title, url)
+
+    def add_footer_link(self, title, url, language=None):
+        self.datastore(language).add_link('footer', title, url)
 
     def _video_no_cookie(self, url):
         if not url:
@@ -139,7 +579,7 @@ class KnowledgeBaseImporter:
         if not item.get('alt'):
             del item['alt']
 
-        if item.parent.name in ('p', 'div', 'span') and not item.parent.text.strip():
+        if item.parent.name in ('p', 'div', 'span') and is_blank(item.parent):
             item.parent.unwrap()
 
         if item.parent.name != 'figure':
@@ -147,7 +587,11 @@ class KnowledgeBaseImporter:
 
         item.parent['class'] = ['align--center width--normal']
 
-    def clean_iframe(self, item):
+    def absolute_link(self, item, soup=None):
+        if 'href' in item.attrs:
+            item['href'] = self.get_url(item['href'])
+
+    def clean_iframe(self, item, soup=None):
         item['src'] = self._video_no_cookie(item['src'])
         item['allowfullscreen'] = 'allowfullscreen'
         item['allow'] = 'fullscreen; picture-in-picture'
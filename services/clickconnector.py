@@ -1,11 +1,32 @@
 # -*- coding:utf-8 -*-
+from .base import Rule, Sanitizer
 from .next import Next
 from slugify import slugify
-from bs4 import BeautifulSoup
 
 
 # @see https://clickconnector.com/
 class Clickconnector(Next):
+    CONTENT_SANITIZER = Sanitizer(
+        Rule('pre', handler='highlight_code'),
+        Rule('a', attributes={'rel': 'nofollow noopener noreferrer'}, handler='absolute_link'),
+        Rule('code > .PlaygroundEditorTheme__textCode', unwrap=True),
+        Rule('li', remove=('value',)),
+        Rule('span', unwrap=True),
+        Rule('b > strong', unwrap=True, handler='merge_bold'),
+        Rule('img', handler='wrap_figure'),
+        Rule('p > br', handler='remove_empty_paragraph'),
+        Rule('.PlaygroundEditorTheme__textUnderline', rename='u'),
+        remove=('dir',),
+        remove_classes=(
+            'PlaygroundEditorTheme__textBold', 'PlaygroundEditorTheme__paragraph', 'PlaygroundEditorTheme__ul', 'PlaygroundEditorTheme__ol1',
+            'PlaygroundEditorTheme__listItem', 'PlaygroundEditorTheme__link', 'PlaygroundEditorTheme__textItalic', 'PlaygroundEditorTheme__nestedListItem',
+            'PlaygroundEditorTheme__h1', 'PlaygroundEditorTheme__h2', 'PlaygroundEditorTheme__h3', 'PlaygroundEditorTheme__h4',
+            'PlaygroundEditorTheme__textItalic', 'PlaygroundEditorTheme__textUnderline', 'PlaygroundEditorTheme__table', 'PlaygroundEditorTheme__tableCell',
+            'keyword'
+        ),
+        check='check_classes'
+    )
+
     def load(self, base_url: str, language=None):
         if not base_url.endswith('/'):
             base_url += '/'
@@ -72,17 +93,21 @@ class Clickconnector(Next):
         for item in data['props']['pageProps']['collections']:
             collections[item['id']] = item
 
+        ordered = []
         for id in data['props']['pageProps']['portalConfig']['data']['collections']['collectionOrder']:
-            item = collections[id]
-            self.get_collections(item, None)
-            del collections[id]
+            ordered.append(collections.pop(id))
+
+        ordered += list(collections.values())
+        for item, childs in zip(ordered, self.retrieve_many([self.get_collection_url(item) for item in ordered])):
+            self.get_collections(item, None, childs)
+
+    def get_collection_url(self, entry):
+        return f'/collections/{slugify(entry["label"])}-{entry["id"]}'
 
-        for id in list(collections.keys())[:]:
-            item = collections[id]
-            self.get_collections(item, None)
-            del collections[id]
+    def get_article_url(self, article):
+        return '/articles/' + slugify(article['title']) + '-' + article['id']
 
-    def get_collections(self, entry, parent_id=None):
+    def get_collections(self, entry, parent_id=None, childs=None):
         slug = slugify(entry['label'])
 
         collection_id = self.save_category(parent_id, {
@@ -91,23 +116,38 @@ class Clickconnector(Next):
             'description': entry.get('description')
         })
 
-        childs = self.retrieve(f'/collections/{slug}-{entry["id"]}')
-        if len(childs['props']['pageProps'].get('articles', [])) > 0:
-            for article in childs['props']['pageProps']['articles']:
-                self.get_article(article, collection_id)
+        if childs is None:
+            childs = self.retrieve(self.get_collection_url(entry))
+
+        articles = childs['props']['pageProps'].get('articles', [])
+        if len(articles) > 0:
+            # Articles listed with an unchanged update date are copied from the previous export without being fetched
+            previous = [self.previous_article(self.get_article_url(article), article.get('metaData', {}).get('updatedAt')) for article in articles]
+            fetched = iter(self.retrieve_many([self.get_article_url(article) for article, entry in zip(articles, previous) if entry is None]))
+            for article, entry in zip(articles, previous):
+                if entry is not None:
+                    self.copy_article(collection_id, entry)
+                else:
+                    self.get_article(article, collection_id, next(fetched))
 
-        if len(childs['props']['pageProps']['collection'].get('subcollections', [])) > 0:
-            subindex = 0
-            for col in childs['props']['pageProps']['collection']['subcollections']:
-                self.get_collections(col, collection_id)
-                subindex += 1
+        subcollections = childs['props']['pageProps']['collection'].get('subcollections', [])
+        if len(subcollections) > 0:
+            for col, col_childs in zip(subcollections, self.retrieve_many([self.get_collection_url(col) for col in subcollections])):
+                self.get_collections(col, collection_id, col_childs)
 
-    def get_article(self, article, collection_id):
+    def get_article(self, article, collection_id, data=None):
         slug = slugify(article['title'])
-        url = '/articles/' + slug + '-' + article['id']
-        data = self.retrieve(url)
+        url = self.get_article_url(article)
+        if data is None:
+            data = self.retrieve(url)
+
         article = data['props']['pageProps']['article']
         final_url = self.get_url(url)
+        last_updated = article.get('metaData', {}).get('updatedAt')
+
+        content = self.previous_content(final_url, last_updated)
+        if content is None:
+            content = self.parse_content(final_url, article['body'])
 
         # Intercom does not have created/updated properties
         self.save_article(
@@ -116,107 +156,69 @@ class Clickconnector(Next):
                 'title': article['title'],
                 'description': article.get('description'),
                 'created': article.get('metaData', {}).get('createdAt'),
-                'last_updated': article.get('metaData', {}).get('updatedAt'),
+                'last_updated': last_updated,
                 'slug': slug,
                 'previous_url': final_url,
-                'content': self.parse_content(final_url, article['body'])
+                'content': content
             }
         )
 
     def parse_content(self, url, content):
-        soup = BeautifulSoup(content, features='html.parser')
-        CLASSES = (
-            'PlaygroundEditorTheme__textBold', 'PlaygroundEditorTheme__paragraph', 'PlaygroundEditorTheme__ul', 'PlaygroundEditorTheme__ol1',
-            'PlaygroundEditorTheme__listItem', 'PlaygroundEditorTheme__link', 'PlaygroundEditorTheme__textItalic', 'PlaygroundEditorTheme__nestedListItem',
-            'PlaygroundEditorTheme__h1', 'PlaygroundEditorTheme__h2', 'PlaygroundEditorTheme__h3', 'PlaygroundEditorTheme__h4',
-            'PlaygroundEditorTheme__textItalic', 'PlaygroundEditorTheme__textUnderline', 'PlaygroundEditorTheme__table', 'PlaygroundEditorTheme__tableCell',
-            'keyword'
-        )
-        for item in soup.find_all():
-            if item.decomposed:
-                continue
-
-            if 'dir' in item.attrs:
-                del item['dir']
-
-            if item.name == 'pre':
-                del item['class']
-                # get content as text:
-                # We replace all the "br" element by a "\n" string
-                for br in item.find_all('br'):
-                    br.replace_with('\n')
-
-                raw_code = item.get_text()
-                language = item.attrs['data-highlight-language']
-
-                pre = soup.new_tag('pre')
-                code = soup.new_tag('code')
-                code.string = raw_code
-                code.attrs['class'] = ['hljs', 'language-{}'.format(language)]
-                pre.attrs['class'] = ['hljs']
-                pre.append(code)
-                item.insert_after(pre)
-                item.decompose()
-                continue
-            elif item.name == 'a':
-                if 'href' in item.attrs:
-                    item.attrs['href'] = self.get_url(item.attrs['href'])
-
-                # add nofollow noopener noreferrer
-                item.attrs['rel'] = 'nofollow noopener noreferrer'
-            elif item.name != 'code' and item.attrs.get('class', []).count('PlaygroundEditorTheme__textCode') > 0 and item.parent.name == 'code':
-                item.unwrap()
-                del item.attrs['class']
-            elif item.name == 'li':
-                if 'value' in item.attrs:
-                    del item['value']
-            elif item.name == 'span':
-                try:
-                    item.unwrap()
-                except ValueError:
-                    pass
-            elif item.name == 'strong' and item.parent.name == 'b':
-                item.parent.name = 'strong'
-                item.unwrap()
-            elif item.name == 'img':
-                if item.attrs.get('height') == 'inherit':
-                    del item['height']
-                if item.attrs.get('width') == 'inherit':
-                    del item['width']
-
-                if item.parent.name != 'figure':
-                    if item.parent.name == 'p':
-                        item.parent.name = 'figure'
-                    else:
-                        # wrap the image in a figure tag
-                        figure = soup.new_tag('figure')
-                        item.wrap(figure)
-
-                    item.parent.attrs['class'] = ['align--center width--normal']
-            elif item.name == 'br' and item.parent and item.parent.name == 'p':
-                # we only remove the item if the parent has only one child, which is the <br> tag
-                if len(item.parent.contents) == 1:
-                    item.parent.decompose()
-                    continue
-
-            if 'class' in item.attrs:
-                if 'PlaygroundEditorTheme__textUnderline' in item.attrs['class']:
-                    item.attrs['class'].remove('PlaygroundEditorTheme__textUnderline')
-                    item.name = 'u'
-
-                for x in CLASSES:
-                    item.attrs['class'].remove(x) if x in item.attrs['class'] else None
-
-                if len(item.attrs['class']) == 0:
-                    del item['class']
-                else:
-                    if item.attrs['class'].count('hljs') > 0 and item.name in ('pre', 'code'):
-                        continue
-
-                    print('')
-                    print(url)
-                    print('')
-                    print(str(soup))
-                    raise Exception('Unexpected class: ' + str(item.attrs['class']))
-
-        return str(soup)
+        soup, root = self.parse_fragment(content)
+        try:
+            self.sanitize(root, soup, self.CONTENT_SANITIZER)
+        except Exception:
+            print('')
+            print(url)
+            print('')
+            print(root.decode_contents())
+            raise
+
+        return root.decode_contents()
+
+    def highlight_code(self, item, soup):
+        # get content as text:
+        # We replace all the "br" element by a "\n" string
+        for br in item.find_all('br'):
+            br.replace_with('\n')
+
+        raw_code = item.get_text()
+        language = item.attrs['data-highlight-language']
+
+        pre = soup.new_tag('pre')
+        code = soup.new_tag('code')
+        code.string = raw_code
+        code.attrs['class'] = ['hljs', 'language-{}'.format(language)]
+        pre.attrs['class'] = ['hljs']
+        pre.append(code)
+        item.insert_after(pre)
+        item.decompose()
+
+    def merge_bold(self, item, soup):
+        item.parent.name = 'strong'
+
+    def wrap_figure(self, item, soup):
+        if item.attrs.get('height') == 'inherit':
+            del item['height']
+        if item.attrs.get('width') == 'inherit':
+            del item['width']
+
+        if item.parent.name != 'figure':
+            if item.parent.name == 'p':
+                item.parent.name = 'figure'
+            else:
+                # wrap the image in a figure tag
+                figure = soup.new_tag('figure')
+                item.wrap(figure)
+
+            item.parent.attrs['class'] = ['align--center width--normal']
+
+    def remove_empty_paragraph(self, item, soup):
+        # we only remove the item if the parent has only one child, which is the <br> tag
+        if len(item.parent.contents) == 1:
+            item.parent.decompose()
+
+    def check_classes(self, item, soup):
+        classes = item.attrs.get('class')
+        if classes and not (classes.count('hljs') > 0 and item.name in ('pre', 'code')):
+            raise Exception('Unexpected class: ' + str(classes))
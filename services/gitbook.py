@@ -1,11 +1,56 @@
 # -*- coding:utf-8 -*-
-from .base import KnowledgeBaseImporter
+from .base import KnowledgeBaseImporter, Rule, Sanitizer
 from playwright.sync_api import sync_playwright, TimeoutError
-from bs4 import BeautifulSoup, NavigableString
+from utils.selectors import SiteProfile
 import datetime, base64, os
 
 
 class Gitbook(KnowledgeBaseImporter):
+    PROFILE = SiteProfile(
+        'gitbook', 1,
+        optional=('logo', 'title_text', 'description', 'heading_anchor', 'picture_image', 'picture_caption'),
+        header='body>header div.scroll-nojump>div',
+        title='a',
+        logo='img',
+        title_text='div',
+        menu='body>div aside>div>div>ul',
+        main='div>main',
+        article_title='h1',
+        description='p',
+        updated='p>time',
+        heading_anchor='a',
+        picture_image='img',
+        picture_caption='figcaption'
+    )
+
+    # Seconds given to each attempt at rendering a page
+    RENDER_TIMEOUT = 60
+    RENDER_ATTEMPTS = 3
+
+    CONTENT_SANITIZER = Sanitizer(
+        Rule('template', 'div.scalar-app', drop=True),
+        Rule('[role=table]', rename='table', remove=('class', 'title')),
+        Rule('[role=row]', rename='tr', remove=('class', 'title')),
+        Rule('[role=columnheader]', rename='th', remove=('class', 'title')),
+        Rule('[role=cell]', rename='td', remove=('class', 'title')),
+        Rule('[role=rowgroup]', unwrap=True),
+        Rule('[role=dialog]', '[role=tablist]', '[role=tab]', '[role=tabpanel]', skip=True),
+        Rule('p', 'ul', 'strong', 'i', 'ol', 'li', 'span', 'hr', 'figcaption', 'blockquote', 'code', 'table', 'tr', 'td', 'th', 'pre', remove=('class', 'title')),
+        Rule('h2', 'h3', 'h4', 'h5', 'h6', remove=('class',), handler='clean_heading'),
+        Rule('a', remove=('class',), attributes={'target': '_blank', 'rel': 'noopener noreferrer'}, handler='absolute_link'),
+        Rule('svg', 'select', 'button', drop=True),
+        Rule('picture', handler='clean_picture'),
+        Rule('img', handler='wrap_image_figure'),
+        Rule('iframe', handler='clean_iframe'),
+        Rule('div.hint', handler='clean_hint'),
+        Rule('div', remove=('class', 'title')),
+        default=Rule(handler='unexpected_item'),
+        remove=('aria-busy', 'aria-label', 'aria-labelledby', 'aria-modal', 'role', 'style', 'tabindex', 'teleport', 'type', 'aria-hidden', 'aria-expanded'),
+        remove_prefixes=('data-',),
+        check='check_attributes',
+        after='collapse_div'
+    )
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -30,47 +75,54 @@ class Gitbook(KnowledgeBaseImporter):
         url = self.get_url(url)
         new_url, html_content = self.get_cached_version(url)
         if not html_content:
-            if len(self.browser.contexts) == 0:
-                self.browser.new_context()
-
-            if len(self.browser.contexts[0].pages) == 0:
-                page = self.browser.contexts[0].new_page()
-
-            page = self.browser.contexts[0].pages[0]
-            for i in range(0, 3):
-                try:
-                    page.goto(url, wait_until='networkidle', timeout=60000)
-                    break
-                except TimeoutError:
-                    if i == 2:
-                        raise
-                    continue
-
-            html_content = page.content()
-            new_url = page.url
-            new_url, html_content = self.cache_request(url, new_url, html_content)
-
-        soup = BeautifulSoup(html_content, features='html.parser')
+            # The lock must outlive the slowest render: every attempt timing out
+            with self.cache.lock(url, timeout=self.RENDER_ATTEMPTS * self.RENDER_TIMEOUT + 60):
+                # Another worker sharing the cache may have rendered the page while we were waiting
+                new_url, html_content = self.get_cached_version(url)
+                if not html_content:
+                    assert not self.cache.policy.offline, '{} is not cached and the cache policy is offline'.format(url)
+                    new_url, html_content = self.render(url)
+
+        soup = self.parse(html_content)
         if return_url:
             return new_url, soup
 
         return soup
 
+    def render(self, url):
+        if len(self.browser.contexts) == 0:
+            self.browser.new_context()
+
+        if len(self.browser.contexts[0].pages) == 0:
+            page = self.browser.contexts[0].new_page()
+
+        page = self.browser.contexts[0].pages[0]
+        for i in range(0, self.RENDER_ATTEMPTS):
+            try:
+                page.goto(url, wait_until='networkidle', timeout=self.RENDER_TIMEOUT * 1000)
+                break
+            except TimeoutError:
+                if i == self.RENDER_ATTEMPTS - 1:
+                    raise
+                continue
+
+        return self.cache_request(url, page.url, page.content())
+
     def process_language(self, language, url, soup=None):
         self.add_language(language, url)
 
         if not soup:
             soup = self.retrieve(url)
 
-        header = soup.select_one('body>header div.scroll-nojump>div')
+        header = self.select_one('header', soup)
         it = header.children
 
         # Header
         metadata = {}
 
-        title = next(it).select_one('a')
+        title = self.select_one('title', next(it))
         images = {}
-        logo = title.select_one('img')
+        logo = self.select_one('logo', title)
         if logo:
             if logo.attrs.get('srcset'):
                 for imgset in logo.attrs['srcset'].split(','):
@@ -86,7 +138,7 @@ class Gitbook(KnowledgeBaseImporter):
             else:
                 metadata['logo'] = logo.attrs['src']
 
-        title_text = title.select_one('div')
+        title_text = self.select_one('title_text', title)
         if title_text:
             metadata['title'] = title_text.get_text()
 
@@ -100,13 +152,19 @@ class Gitbook(KnowledgeBaseImporter):
         for link in list(menu.children)[1].find_all('a'):
             self.add_header_link(link.get_text(), link.attrs['href'])
 
-        articles = self.add_submenu(None, soup.select_one('body>div aside>div>div>ul'))
+        articles = self.add_submenu(None, self.select_one('menu', soup))
+        # The menu does not tell when the articles were updated, the server tells which ones need no rendering
+        unchanged = self.unchanged_articles(articles)
 
         for article_url in articles:
+            if article_url in unchanged:
+                self.copy_article(articles[article_url], unchanged[article_url])
+                continue
+
             article = {}
             article['previous_url'], article_soup = self.retrieve(article_url, return_url=True)
 
-            article_main = article_soup.select_one('div>main')
+            article_main = self.select_one('main', article_soup)
 
             childs = list(article_main.children)
             if len(childs) == 3:
@@ -115,17 +173,19 @@ class Gitbook(KnowledgeBaseImporter):
 
             assert len(childs) == 4
 
-            article['title'] = childs[0].select_one('h1').get_text()
-            description = childs[0].select_one('p')
+            article['title'] = self.select_one('article_title', childs[0]).get_text()
+            description = self.select_one('description', childs[0])
             if description:
                 article['description'] = description.get_text()
 
-            try:
-                article['content'] = self.parse_content(childs[1], article_soup)
-            except Exception:
-                print('Error for {}'.format(article['previous_url']))
-                raise
-            article['last_updated'] = datetime.datetime.fromisoformat(childs[3].select_one('p>time').attrs['datetime']).isoformat()
+            article['last_updated'] = datetime.datetime.fromisoformat(self.select_one('updated', childs[3]).attrs['datetime']).isoformat()
+            article['content'] = self.previous_content(article['previous_url'], article['last_updated'])
+            if article['content'] is None:
+                try:
+                    article['content'] = self.parse_content(childs[1], article_soup)
+                except Exception:
+                    print('Error for {}'.format(article['previous_url']))
+                    raise
 
             self.save_article(articles[article_url], article)
 
@@ -177,146 +237,76 @@ class Gitbook(KnowledgeBaseImporter):
         if 'class' in content.attrs:
             del content.attrs['class']
 
-        for item in content.find_all():
-            if item.decomposed:
-                continue
+        return str(self.sanitize(content, soup, self.CONTENT_SANITIZER))
 
-            if item.name == 'template':
-                item.extract()
-                continue
+    def clean_heading(self, item, soup):
+        childs = list(item.children)
+        if len(childs) == 2 and self.select_one('heading_anchor', childs[0]) is not None:
+            childs[0].decompose()
+            childs[1].unwrap()
 
-            if item.name == 'div' and 'scalar-app' in (item.attrs.get('class', []) or []):
-                for i in list(item.descendants)[::]:
-                    if i and not isinstance(i, NavigableString):
-                        i.decompose()
-                item.decompose()
-                continue
+    def clean_picture(self, item, soup):
+        if self.select_one('picture_image', item) is None:
+            figcaption = self.select_one('picture_caption', item)
+            if figcaption:
+                figcaption.name = 'div'
 
-            if item.attrs.get('role') == 'table':
-                item.name = 'table'
-            elif item.attrs.get('role') == 'row':
-                item.name = 'tr'
-            elif item.attrs.get('role') == 'columnheader':
-                item.name = 'th'
-            elif item.attrs.get('role') == 'cell':
-                item.name = 'td'
-            elif item.attrs.get('role') == 'rowgroup':
-                item.unwrap()
-                continue
-            elif item.attrs.get('role') in ('dialog', 'tablist', 'tab', 'tabpanel'):
-                continue
-            elif item.attrs.get('role'):
-                print('-' * 80)
-                print(item)
-                print('unknown role', item.attrs['role'])
-
-            for k in ('aria-busy', 'aria-label', 'aria-labelledby', 'aria-modal', 'role', 'style', 'tabindex', 'teleport', 'type', 'aria-hidden', 'aria-expanded'):
-                if k in item.attrs:
-                    del item.attrs[k]
-
-            for k in list(item.attrs)[::]:
-                if k.startswith('data-'):
-                    del item.attrs[k]
-
-            if item.name in ('p', 'ul', 'strong', 'i', 'ol', 'li', 'span', 'hr', 'figcaption', 'blockquote', 'code', 'table', 'tr', 'td', 'th', 'pre'):
-                if 'class' in item.attrs:
-                    del item.attrs['class']
-                if 'title' in item.attrs:
-                    del item.attrs['title']
-            elif item.name in ('h2', 'h3', 'h4', 'h5', 'h6'):
-                if 'class' in item.attrs:
-                    del item.attrs['class']
-
-                childs = list(item.children)
-                if len(childs) == 2 and childs[0].select_one('a') is not None:
-                    childs[0].decompose()
-                    childs[1].unwrap()
-
-            elif item.name == 'a':
-                del item.attrs['class']
-                item['target'] = '_blank'
-                item['rel'] = 'noopener noreferrer'
-                item['href'] = self.get_url(item['href'])
-            elif item.name in ('svg', 'select', 'button'):
-                for i in list(item.descendants)[::]:
-                    if i and not isinstance(i, NavigableString):
-                        i.decompose()
-                item.decompose()
-                continue
-            elif item.name == 'picture':
-                if item.select_one('img') is None:
-                    figcaption = item.select_one('figcaption')
-                    if figcaption:
-                        figcaption.name = 'div'
+            item.unwrap()
+        else:
+            item.name = 'figure'
+            childs = list(item.children)
+            if childs[0].name == 'div':
+                childs[0].unwrap()
 
-                    item.unwrap()
-                else:
-                    item.name = 'figure'
-                    childs = list(item.children)
-                    if childs[0].name == 'div':
-                        childs[0].unwrap()
-
-            elif item.name == 'img':
-                self.wrap_image_figure(item, soup)
-            elif item.name == 'iframe':
-                self.clean_iframe(item)
-            elif item.name == 'div' and 'hint' in item.get('class', []):
-                classes = ['callout']
-                if ''.join(item.attrs['class']).find('bg-orange') > -1:
-                    classes.append('callout--warning')
-
-                childs = list(item.children)
-                if len(childs) == 2:
-                    # Has icon
-                    classes.append('callout--icon')
-
-                    if ' '.join(childs[0].attrs['class']).find('text-info') > -1:
-                        classes.append('callout--info')
-                    elif ' '.join(childs[0].attrs['class']).find('text-warning') > -1:
-                        classes.append('callout--warning')
-                    elif ' '.join(childs[0].attrs['class']).find('text-danger') > -1:
-                        classes.append('callout--danger')
-                    else:
-                        print(' '.join(childs[0].attrs['class']))
-                        raise AssertionError('Not found class')
-
-                    childs[0].decompose()
-                    # remove the index 0 from the childs array
-                    del childs[0]
-
-                subchilds = list(childs[0].children)
-                if subchilds[0].name == 'svg':
-                    classes.append('callout--icon')
-                    subchilds[0].unwrap()
+    def clean_hint(self, item, soup):
+        classes = ['callout']
+        if ''.join(item.attrs['class']).find('bg-orange') > -1:
+            classes.append('callout--warning')
+
+        childs = list(item.children)
+        if len(childs) == 2:
+            # Has icon
+            classes.append('callout--icon')
+
+            if ' '.join(childs[0].attrs['class']).find('text-info') > -1:
+                classes.append('callout--info')
+            elif ' '.join(childs[0].attrs['class']).find('text-warning') > -1:
+                classes.append('callout--warning')
+            elif ' '.join(childs[0].attrs['class']).find('text-danger') > -1:
+                classes.append('callout--danger')
+            else:
+                print(' '.join(childs[0].attrs['class']))
+                raise AssertionError('Not found class')
 
-                childs[0].unwrap()
-                item.attrs['class'] = classes
+            childs[0].decompose()
+            # remove the index 0 from the childs array
+            del childs[0]
 
-                childs = list(item.children)
-                if childs[0].name == 'p':
-                    childs[0].name = 'div'
+        subchilds = list(childs[0].children)
+        if subchilds[0].name == 'svg':
+            classes.append('callout--icon')
+            subchilds[0].unwrap()
 
-            elif item.name == 'div':
-                if 'class' in item.attrs:
-                    del item.attrs['class']
+        childs[0].unwrap()
+        item.attrs['class'] = classes
 
-                if 'title' in item.attrs:
-                    del item.attrs['title']
-            else:
-                raise AssertionError('Unexpected item {}'.format(item.name))
+        childs = list(item.children)
+        if childs[0].name == 'p':
+            childs[0].name = 'div'
 
-            keys = list(item.attrs.keys())
-            for k in ('class', 'id', 'target', 'href', 'rel', 'alt', 'src', 'allowfullscreen', 'allow', 'scrolling', 'frameborder'):
-                if k in keys:
-                    keys.remove(k)
+    def unexpected_item(self, item, soup):
+        raise AssertionError('Unexpected item {}'.format(item.name))
 
-            if len(keys) > 0:
-                print(item)
-                raise AssertionError('Keys unexpected {}'.format(', '.join(keys)))
+    def check_attributes(self, item, soup):
+        keys = [k for k in item.attrs if k not in ('class', 'id', 'target', 'href', 'rel', 'alt', 'src', 'allowfullscreen', 'allow', 'scrolling', 'frameborder')]
+        if len(keys) > 0:
+            print(item)
+            raise AssertionError('Keys unexpected {}'.format(', '.join(keys)))
 
-        for div in content.find_all('div'):
-            childs = list(div.children)
-            if len(childs) == 1 and childs[0].name == 'div' and 'callout' not in (div.attrs.get('class', []) or []):
-                div.unwrap()
+    def collapse_div(self, item, soup):
+        if item.name != 'div':
+            return
 
-        return str(content)
+        childs = list(item.children)
+        if len(childs) == 1 and childs[0].name == 'div' and 'callout' not in (item.attrs.get('class', []) or []):
+            item.unwrap()
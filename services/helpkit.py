@@ -1,12 +1,67 @@
 # -*- coding:utf-8 -*-
 
+from .base import Rule, Sanitizer
 from .nuxt import Nuxt
-from bs4 import BeautifulSoup, Comment, NavigableString
+from bs4 import BeautifulSoup, Comment
 from slugify import slugify
+from utils.selectors import SiteProfile
 import datetime
 
 
 class Helpkit(Nuxt):
+    PROFILE = SiteProfile(
+        'helpkit', 1,
+        optional=('category_icon', 'article_updated', 'table_headers', 'table_footers', 'callout_icon', 'bookmark_description', 'bookmark_image'),
+        categories='#__layout .helpkit-category-card',
+        category_icon='.helpkit-category-icon-emoji',
+        category_description='.leading-snug',
+        subcollections='#__layout .helpkit-subcollection-wrapper',
+        article_cards='.helpkit-article-card',
+        article_updated='.helpkit-article-meta-wrapper p',
+        article_main='main',
+        table_headers='.notion-simple-table-header',
+        table_footers='.notion-simple-table-footer',
+        callout_icon='.notion-page-icon',
+        bookmark_title='.notion-bookmark-title',
+        bookmark_description='.notion-bookmark-description',
+        bookmark_image='.notion-bookmark-image img',
+        page_link_text='.notion-page-text'
+    )
+
+    CONTENT_SANITIZER = Sanitizer(
+        Rule('b', 'em', 'strong', 'u', 's', remove=('class',), handler='unwrap_nested'),
+        Rule('ul', 'ol', handler='merge_lists'),
+        Rule('li', 'thead', 'tbody', 'tfoot', 'th', 'tr', 'td', 'iframe', remove=('class',)),
+        Rule('table', classes=('notion-simple-table',), handler='move_table_headers'),
+        Rule('div.notion-spacer', 'div.notion-sync-block', 'div.notion-indent', unwrap=True),
+        Rule(
+            'div.notion-row', 'div.notion-column', 'div.notion-simple-table-header', 'div.notion-simple-table-footer',
+            'div.notion-simple-table-wrapper', 'div.notion-simple-table-cell-text',
+            unwrap=True
+        ),
+        Rule('div.notion-blank', drop=True),
+        Rule('div.notion-asset-wrapper', handler='clean_asset'),
+        Rule('div.notion-callout', handler='clean_callout'),
+        Rule('div', handler='unwrap_div'),
+        Rule('span', unwrap=True),
+        Rule('pre', handler='clean_pre'),
+        Rule('code', handler='clean_code'),
+        Rule('hr', classes=('notion-hr',)),
+        Rule('h1', classes=('notion-h1',), rename='h2', handler='_add_id'),
+        *[Rule('h{}'.format(level), classes=('notion-h{}'.format(level),), handler='_add_id') for level in range(2, 7)],
+        Rule('p', classes=('notion-text',)),
+        Rule('figure', remove_classes=('notion-asset-wrapper',)),
+        Rule('figcaption', classes=('notion-image-caption',)),
+        Rule('blockquote', classes=('notion-quote',)),
+        Rule('img', classes=('notion-image-inset',), handler='clean_image'),
+        Rule('a', handler='clean_link'),
+        default=Rule(handler='unknown_element'),
+        remove=('fragment', 'style'),
+        check='report_attributes',
+        after='remove_empty_paragraph',
+        comments=False
+    )
+
     def get_long_uuid(self, short_uuid):
         alphabet = '123456789abcdefghijkmnopqrstuvwxyzABCDEFGHJKLMNPQRSTUVWXYZ'
 
@@ -36,16 +91,16 @@ class Helpkit(Nuxt):
         self.add_language('en', base_url)
         soup = self.retrieve(base_url)
 
-        self.articles_mapping = {}
         articles = []
 
-        for col in soup.select('#__layout .helpkit-category-card'):
+        cols = self.select('categories', soup)
+        for col, col_soup in zip(cols, self.retrieve_many([col.attrs['href'] for col in cols])):
             url = col.attrs['href']  # Should be of format /slug/short_uuid/
             slug, _ = url.split('/')[1:]  # This purposely to fail if the format is not as expected
 
             current_icon = None
             try:
-                current_icon = col.select('.helpkit-category-icon-emoji')[0].text.strip()
+                current_icon = self.select('category_icon', col)[0].text.strip()
             except IndexError:
                 pass
 
@@ -53,12 +108,11 @@ class Helpkit(Nuxt):
                 'icon': current_icon,
                 'title': col.find('h2').text.strip(),
                 'slug': slug,
-                'description': col.select('.leading-snug')[0].text.strip(),
+                'description': self.select('category_description', col)[0].text.strip(),
                 'url': url
             })
 
-            col_soup = self.retrieve(url)
-            sub_collections = list(col_soup.select('#__layout .helpkit-subcollection-wrapper'))
+            sub_collections = list(self.select('subcollections', col_soup))
             for entry in sub_collections:
                 current_collection_id = root_collection_id
 
@@ -70,7 +124,7 @@ class Helpkit(Nuxt):
                     })
 
                 index = 0
-                for card in entry.select('.helpkit-article-card'):
+                for card in self.select('article_cards', entry):
                     url = card.attrs['href']
                     url_sections = url[1:].split('/')
                     short_uuid = url_sections.pop(-1)
@@ -87,28 +141,37 @@ class Helpkit(Nuxt):
                         'index': index
                     }
                     articles.append(article)
-                    self.articles_mapping['/' + article['uuid'].replace('-', '')] = self.base_url + article['previous_url']
+                    # Links between articles point to /<uuid>
+                    self.add_source('/' + article['uuid'].replace('-', ''), article['previous_url'])
                     index += 1
 
-        # Now we load the articles content:
+        # The cards don't tell when the articles were updated, the server tells which ones are unchanged
+        unchanged = self.unchanged_articles([article['previous_url'] for article in articles])
         for article in articles:
-            article_content = self.retrieve(article['previous_url'])
+            if article['previous_url'] in unchanged:
+                self.copy_article(article['collection_id'], unchanged[article['previous_url']], position=article['index'])
+        articles = [article for article in articles if article['previous_url'] not in unchanged]
+
+        # Now we load the articles content:
+        for article, article_content in zip(articles, self.retrieve_many([article['previous_url'] for article in articles])):
             try:
-                last_update_str = article_content.select('.helpkit-article-meta-wrapper p')[0].text.replace('Last updated on', '').strip().lower()
+                last_update_str = self.select('article_updated', article_content)[0].text.replace('Last updated on', '').strip().lower()
                 article['last_updated'] = datetime.datetime.strptime(last_update_str, '%B %d, %Y').isoformat()
             except IndexError as e:
                 pass  # It can happen that there is no date!
 
-            try:
-                content = self.parse_content(article['previous_url'], article_content, article_content.select('#article-{} main'.format(article['short_uuid']))[0])
-            except Exception as e:
-                print('')
-                print('Exception : {}'.format(str(e)))
-                print('While processing {}'.format(self.base_url + url))
-                raise
+            output = self.previous_content(article['previous_url'], article.get('last_updated'))
+            if output is None:
+                try:
+                    content = self.parse_content(article['previous_url'], article_content, self.select('article_main', article_content.find(id='article-{}'.format(article['short_uuid'])))[0])
+                except Exception as e:
+                    print('')
+                    print('Exception : {}'.format(str(e)))
+                    print('While processing {}'.format(self.base_url + url))
+                    raise
 
-            output = str(content)
-            assert output.find('"notion-') == -1
+                output = str(content)
+                assert output.find('"notion-') == -1
 
             self.save_article(
                 article['collection_id'],
@@ -119,7 +182,8 @@ class Helpkit(Nuxt):
                     'previous_url': article['previous_url'],
                     'last_updated': article.get('last_updated'),
                     'content': output
-                }
+                },
+                position=article['index']
             )
 
     def parse_content(self, url, soup, content):
@@ -129,295 +193,219 @@ class Helpkit(Nuxt):
         content.name = 'div'
         content.attrs.pop('class', None)
 
-        for name in ('ul', 'ol'):
-            for ul in content.find_all(name):
-                if ul.name is None:
-                    # it was decomposed, we ignore
-                    continue
+        try:
+            self.sanitize(content, soup, self.CONTENT_SANITIZER)
+        except Exception:
+            print(self.base_url + url)
+            print('')
+            raise
 
-                if ul.attrs and str(ul.attrs.get('start')) == '1':
-                    ul.attrs.pop('start', None)
+        return content
 
-                for sibling in list(ul.next_siblings):
-                    if not sibling or sibling.name != ul.name:
-                        break
+    def merge_lists(self, ul, soup):
+        if ul.attrs and str(ul.attrs.get('start')) == '1':
+            ul.attrs.pop('start', None)
+
+        for sibling in list(ul.next_siblings):
+            if not sibling or sibling.name != ul.name:
+                break
+
+            if sibling and sibling.name == ul.name:
+                for li in sibling.find_all('li', recursive=False):
+                    ul.append(li.extract())
+
+                sibling.extract()
+
+        try:
+            ul.attrs.get('class').remove('notion-list')
+        except ValueError:
+            raise AssertionError('notion-list not found in class')
+
+        self._remove_class(ul, ul.attrs.get('class', []), ['notion-list-disc', 'notion-list-numbered'])
+        ul.attrs.pop('class', None)
+
+    def move_table_headers(self, table, soup):
+        headers = list(self.select('table_headers', table))
+        if len(headers) > 0:
+            assert headers[0].parent.parent.name == 'tr'
+            thead = soup.new_tag('thead')
+            current_tr = headers[0].parent.parent.extract()
+            for td in current_tr.find_all('td'):
+                td.name = 'th'
+            thead.append(current_tr)
+            table.insert(0, thead)
+
+        footers = list(self.select('table_footers', table))
+        if len(footers) > 0:
+            assert footers[0].parent.parent.name == 'tr'
+            tfoot = soup.new_tag('tfoot')
+            current_tr = footers[0].parent.parent.extract()
+            for td in current_tr.find_all('td'):
+                td.name = 'th'
+            tfoot.append(current_tr)
+            table.append(tfoot)
+
+    def unwrap_nested(self, k, soup):
+        # removing inlines
+        childs = list(k.children)
+        if len(childs) == 1 and childs[0].name == k.name:
+            k.unwrap()
+
+    def unwrap_div(self, k, soup):
+        if k.attrs.get('class'):
+            self.unknown_element(k, soup)
+
+        k.unwrap()
+
+    def clean_asset(self, k, soup):
+        classlist = k.attrs['class']
+        first_child = list(k.children)[0]
+        if first_child.name != 'iframe':
+            self.unknown_element(k, soup)
+
+        first_child['src'] = self._video_no_cookie(first_child['src'])
+        self._remove_class(k, classlist, 'notion-asset-wrapper')
+        k.attrs['class'] = 'iframe-wrapper video-embed'
+        self._remove_class(first_child, first_child.attrs.get('class', []) if first_child.attrs else [], ['notion-image-inset', 'notion-embed'])
+
+    def clean_callout(self, k, soup):
+        classlist = k.attrs['class']
+        k.attrs['class'] = ['callout']
+        if len(self.select('callout_icon', k)) > 0:
+            k.attrs['class'].append('callout--icon')
+
+        if 'notion-gray_background' in classlist:
+            k.attrs['class'].append('callout--info')
+        elif 'notion-orange_background':
+            k.attrs['class'].append('callout--warning')
+        else:
+            print('Unknown callout type : {}'.format(classlist))
+
+        for child in k.children:
+            if child.attrs and 'notion-callout-text' in child.attrs.get('class'):
+                child.attrs.pop('class', None)
+                child.name = 'p'
+                child.wrap(soup.new_tag('div'))
+                continue
 
-                    if sibling and sibling.name == ul.name:
-                        for li in sibling.find_all('li', recursive=False):
-                            ul.append(li.extract())
+            child.decompose()
 
-                        sibling.extract()
+    def clean_pre(self, k, soup):
+        childs = list(k.children)
+        if len(childs) == 1 and childs[0].name == k.name:
+            k.unwrap()
+            return
 
-                try:
-                    ul.attrs.get('class').remove('notion-list')
-                except ValueError:
-                    raise AssertionError('notion-list not found in class')
-
-                self._remove_class(ul, ul.attrs.get('class', []), ['notion-list-disc', 'notion-list-numbered'])
-
-        # Cleaning tables
-        for table in content.find_all('table'):
-            headers = list(table.select('.notion-simple-table-header'))
-            if len(headers) > 0:
-                assert headers[0].parent.parent.name == 'tr'
-                thead = soup.new_tag('thead')
-                current_tr = headers[0].parent.parent.extract()
-                for td in current_tr.find_all('td'):
-                    td.name = 'th'
-                thead.append(current_tr)
-                table.insert(0, thead)
-
-            footers = list(table.select('.notion-simple-table-footer'))
-            if len(footers) > 0:
-                assert footers[0].parent.parent.name == 'tr'
-                tfoot = soup.new_tag('tfoot')
-                current_tr = footers[0].parent.parent.extract()
-                for td in current_tr.find_all('td'):
-                    td.name = 'th'
-                tfoot.append(current_tr)
-                table.append(tfoot)
+        # pre > code
+        classlist = k.attrs.get('class') or []
+        if classlist:
+            k.attrs.pop('class', None)
+
+        # We clean what appears to be a shitty integration:
+        if childs[0].name == 'code':
+            for child in childs[0].children:
+                if child.name in ('pre', 'code'):
+                    child.unwrap()
+        else:
+            if 'notion-code' in classlist:
+                classlist.remove('notion-code')
+
+            k.wrap(soup.new_tag('code', attrs={'class': classlist}))
+            # The cleaning will be done in the next section in that case
+
+    def clean_code(self, k, soup):
+        classlist = k.attrs.get('class') or []
+        if 'notion-inline-code' in classlist:
+            # It's an inline ... should be
+            # addition: ... well it's not an inline ...
+
+            self._remove_class(k, classlist, 'notion-inline-code')
+            flatten = True
+            for child in k.children:
+                if child.name in ('pre', 'code'):
+                    child.unwrap()
+                else:
+                    # Contains other unknown tag
+                    flatten = False
 
-        # This is for debugging purpose only
-        for k in content.find_all():
-            if k.name is None or k.decomposed:
-                continue
+            # We test that. It should be only one child but who knows ...
+            if flatten:
+                if child.string:
+                    child.string = child.string.strip()
+                else:
+                    child.string = ''.join(child.strings).strip()
 
-            if k.name in ('b', 'em', 'strong', 'u', 's', 'span', 'pre'):  # removing inlines
-                childs = list(k.children)
-                if len(childs) == 1 and childs[0].name == k.name:
-                    k.unwrap()
-                    continue
-
-            if k.attrs:
-                custom_attrs = list(k.attrs.keys())
-                if 'fragment' in k.attrs:
-                    custom_attrs.remove('fragment')
-                    k.attrs.pop('fragment', None)
-                if 'style' in k.attrs:
-                    custom_attrs.remove('style')
-                    k.attrs.pop('style', None)
-
-                for attr in ('target', 'href', 'src', 'allow', 'class', 'rel', 'start', 'alt'):
-                    if attr in custom_attrs:
-                        custom_attrs.remove(attr)
-
-                if custom_attrs:
-                    print('Remaining attribute :', custom_attrs, k)
-
-            if isinstance(k, NavigableString) and k.string == ' ':
-                k.string = '&nbsp;'
-
-            if k.name in ('ul', 'ol', 'li', 'b', 'strong', 'em', 'u', 's', 'thead', 'tbody', 'tfoot', 'th', 'tr', 'td', 'iframe'):
-                if k.attrs:
-                    k.attrs.pop('class', None)
-                continue
+    def clean_image(self, k, soup):
+        if k.attrs and k.attrs.get('alt') == 'Notion image':
+            k.attrs.pop('alt', None)
 
-            classlist = []
-            if k.attrs and k.attrs.get('class'):
-                classlist = k.attrs['class']
+    def clean_link(self, k, soup):
+        classlist = k.attrs.get('class') or []
+        if 'notion-bookmark' in classlist:
+            # It's a bootmark, we replace with another element
+            self._remove_class(k, classlist, 'notion-bookmark')
 
+            bookmark_url = self._extract_url(k.attrs['href'])
+            bookmark_title = self.select('bookmark_title', k)[0].text.strip()
             try:
-                if k.name == 'div':
-                    if len(classlist) == 0:
-                        k.unwrap()
-                    elif classlist == ['notion-spacer'] or classlist == ['notion-sync-block']:
-                        k.unwrap()
-                    elif classlist == ['notion-indent']:
-                        k.unwrap()
-                    elif 'notion-blank' in classlist:
-                        k.replace_with(BeautifulSoup('<p></p>', 'html.parser'))
-                    elif 'notion-asset-wrapper' in classlist:
-                        first_child = list(k.children)[0]
-                        if first_child.name == 'iframe':
-                            first_child['src'] = self._video_no_cookie(first_child['src'])
-                            self._remove_class(k, classlist, 'notion-asset-wrapper')
-                            k.attrs['class'] = 'iframe-wrapper video-embed'
-                            self._remove_class(first_child, first_child.attrs.get('class', []) if first_child.attrs else [], ['notion-image-inset', 'notion-embed'])
-                        else:
-                            raise KeyError()
-                    elif 'notion-callout' in classlist:
-                        k.attrs['class'] = ['callout']
-                        if len(k.select('.notion-page-icon')) > 0:
-                            k.attrs['class'].append('callout--icon')
-
-                        if 'notion-gray_background' in classlist:
-                            k.attrs['class'].append('callout--info')
-                        elif 'notion-orange_background':
-                            k.attrs['class'].append('callout--warning')
-                        else:
-                            print('Unknown callout type : {}'.format(classlist))
-
-                        for child in k.children:
-                            if child.attrs and 'notion-callout-text' in child.attrs.get('class'):
-                                child.attrs.pop('class', None)
-                                child.name = 'p'
-                                child.wrap(soup.new_tag('div'))
-                                continue
-
-                            child.decompose()
-
-                    elif len(classlist) == 1 and classlist[0] in ('notion-row', 'notion-column', 'notion-simple-table-header', 'notion-simple-table-footer', 'notion-simple-table-wrapper', 'notion-simple-table-cell-text'):
-                        k.unwrap()
-                    else:
-                        raise KeyError()
-                elif k.name == 'span':
-                    k.unwrap()
-                elif k.name == 'pre':
-                    # pre > code
-                    if classlist:
-                        k.attrs.pop('class', None)
-
-                    # We clean what appears to be a shitty integration:
-                    childs = list(k.children)
-                    if childs[0].name == 'code':
-                        for child in childs[0].children:
-                            if child.name in ('pre', 'code'):
-                                child.unwrap()
-                    else:
-                        if 'notion-code' in classlist:
-                            classlist.remove('notion-code')
-
-                        k.wrap(soup.new_tag('code', attrs={'class': classlist}))
-                        # The cleaning will be done in the next section in that case
-                elif k.name == 'code':
-                    if 'notion-inline-code' in classlist:
-                        # It's an inline ... should be
-                        # addition: ... well it's not an inline ...
-
-                        self._remove_class(k, classlist, 'notion-inline-code')
-                        flatten = True
-                        for child in k.children:
-                            if child.name in ('pre', 'code'):
-                                child.unwrap()
-                            else:
-                                # Contains other unknown tag
-                                flatten = False
-
-                        # We test that. It should be only one child but who knows ...
-                        if flatten:
-                            if child.string:
-                                child.string = child.string.strip()
-                            else:
-                                child.string = ''.join(child.strings).strip()
-
-                elif k.name == 'hr':
-                    self._remove_class(k, classlist, 'notion-hr')
-                elif k.name == 'h1':
-                    self._remove_class(k, classlist, 'notion-h1')
-                    k.name = 'h2'
-                    self._add_id(k)
-                elif k.name == 'h2':
-                    self._remove_class(k, classlist, 'notion-h2')
-                    self._add_id(k)
-                elif k.name == 'h3':
-                    self._remove_class(k, classlist, 'notion-h3')
-                    self._add_id(k)
-                elif k.name == 'h4':
-                    self._remove_class(k, classlist, 'notion-h4')
-                    self._add_id(k)
-                elif k.name == 'h5':
-                    self._remove_class(k, classlist, 'notion-h5')
-                    self._add_id(k)
-                elif k.name == 'h6':
-                    self._remove_class(k, classlist, 'notion-h6')
-                    self._add_id(k)
-                elif k.name == 'p':
-                    self._remove_class(k, classlist, 'notion-text')
-                elif k.name == 'figure':
-                    if 'notion-asset-wrapper' in classlist:
-                        k.attrs.get('class').remove('notion-asset-wrapper')
-                        if len(k.attrs.get('class', [])) == 0:
-                            k.attrs.pop('class', None)
-                elif k.name == 'figcaption':
-                    self._remove_class(k, classlist, 'notion-image-caption')
-                elif k.name == 'table':
-                    self._remove_class(k, classlist, 'notion-simple-table')
-                elif k.name == 'tr':
-                    self._remove_class(k, classlist, 'notion-simple-table-row')
-                elif k.name == 'td':
-                    self._remove_class(k, classlist, 'notion-simple-table-data')
-                elif k.name == 'blockquote':
-                    self._remove_class(k, classlist, 'notion-quote')
-                elif k.name == 'img':
-                    self._remove_class(k, classlist, 'notion-image-inset')
-                    if k.attrs and k.attrs.get('alt') == 'Notion image':
-                        k.attrs.pop('alt', None)
-                elif k.name == 'a':
-                    if 'notion-bookmark' in classlist:
-                        # It's a bootmark, we replace with another element
-                        self._remove_class(k, classlist, 'notion-bookmark')
-
-                        bookmark_url = self._extract_url(k.attrs['href'])
-                        bookmark_title = k.select('.notion-bookmark-title')[0].text.strip()
-                        try:
-                            bookmark_description = k.select('.notion-bookmark-description')[0].text.strip()
-                        except IndexError:
-                            bookmark_description = None
-
-                        try:
-                            bookmark_image = k.select('.notion-bookmark-image img')[0].attrs['src']
-                        except IndexError:
-                            bookmark_image = None
-
-                        for child in k.children:
-                            if not isinstance(child, Comment):
-                                child.decompose()
-                            else:
-                                child.extract()
-
-                        k.attrs['url'] = bookmark_url
-                        k.attrs['title'] = bookmark_title
-                        k.attrs['target'] = '_blank'
-                        k.attrs['rel'] = 'noopener noreferrer'
-
-                        if bookmark_image:
-                            k.append(BeautifulSoup(
-                                '<figure><img src="{image_url}" title="{title}" /><figcaption>{description}</figcaption></figure>'.format(
-                                    title=bookmark_title,
-                                    description=bookmark_description or bookmark_title,
-                                    image_url=bookmark_image
-                                ),
-                                'html.parser'
-                            ))
-                        else:
-                            k.string = bookmark_description or bookmark_title
-
-                    if 'notion-page-link' in classlist:
-                        title = k.select('.notion-page-text')[0].text.strip()
-                        for child in k.children:
-                            child.decompose()
-
-                        k.clear()
-                        k.string = title
-                    self._remove_class(k, classlist, ['notion-link', 'notion-page-link'])
-                    k.attrs['rel'] = 'noopener noreferrer'
-                    k.attrs['href'] = self._extract_url(k.attrs['href'])
+                bookmark_description = self.select('bookmark_description', k)[0].text.strip()
+            except IndexError:
+                bookmark_description = None
+
+            try:
+                bookmark_image = self.select('bookmark_image', k)[0].attrs['src']
+            except IndexError:
+                bookmark_image = None
+
+            for child in k.children:
+                if not isinstance(child, Comment):
+                    child.decompose()
                 else:
-                    raise KeyError()
-            except KeyError as e:
-                print('Unknown element')
-                print(self.base_url + url)
-                print(k)
-                print(k.name, k.attrs)
-                print('')
-                raise
-            except AssertionError as e:
-                print('ASSERTION ERROR: {}'.format(str(e)))
-                print(self.base_url + url)
-                print(k.name, k.attrs, k)
-                print('')
-                raise
-
-        for comment in content.find_all(text=True):
-            if isinstance(comment, Comment):
-                comment.extract()
-
-        for paragraph in content.find_all('p'):
-            # Remove the paragraph if it is empty:
-            if len(paragraph.contents) == 0:
-                paragraph.extract()
+                    child.extract()
+
+            k.attrs['url'] = bookmark_url
+            k.attrs['title'] = bookmark_title
+            k.attrs['target'] = '_blank'
+            k.attrs['rel'] = 'noopener noreferrer'
+
+            if bookmark_image:
+                k.append(BeautifulSoup(
+                    '<figure><img src="{image_url}" title="{title}" /><figcaption>{description}</figcaption></figure>'.format(
+                        title=bookmark_title,
+                        description=bookmark_description or bookmark_title,
+                        image_url=bookmark_image
+                    ),
+                    'html.parser'
+                ))
+            else:
+                k.string = bookmark_description or bookmark_title
+
+        if 'notion-page-link' in classlist:
+            title = self.select('page_link_text', k)[0].text.strip()
+            for child in k.children:
+                child.decompose()
+
+            k.clear()
+            k.string = title
+        self._remove_class(k, classlist, ['notion-link', 'notion-page-link'])
+        k.attrs['rel'] = 'noopener noreferrer'
+        k.attrs['href'] = self._extract_url(k.attrs['href'])
+
+    def unknown_element(self, k, soup):
+        print('Unknown element')
+        print(k)
+        raise AssertionError('Unknown element <{}> {}'.format(k.name, k.attrs))
+
+    def report_attributes(self, k, soup):
+        # This is for debugging purpose only
+        custom_attrs = [attr for attr in k.attrs if attr not in ('target', 'href', 'src', 'allow', 'class', 'rel', 'start', 'alt', 'id', 'url', 'title')]
+        if custom_attrs:
+            print('Remaining attribute :', custom_attrs, k)
 
-        return content
+    def remove_empty_paragraph(self, paragraph, soup):
+        # Remove the paragraph if it is empty:
+        if paragraph.name == 'p' and len(paragraph.contents) == 0:
+            paragraph.extract()
 
     def _remove_class(self, soup, classlist, name, empty=True):
         if len(classlist) == 0:
@@ -438,8 +426,9 @@ class Helpkit(Nuxt):
         if not url.startswith('/'):
             return url
 
-        if url in self.articles_mapping:
-            return self.articles_mapping.get(url, url)
+        target = self.source_url(url)
+        if target:
+            return target
         elif len(url) == 33 and url[1:].isalnum():
             # It's a UUID mapping that doesn't exists anymore, we replace with a hashtag
             return '#'
@@ -447,8 +436,8 @@ class Helpkit(Nuxt):
         print('URL NOT FOUND: {}'.format(url))
         return url
 
-    def _add_id(self, soup):
-        if soup.attrs and soup.attrs.id:
+    def _add_id(self, item, soup=None):
+        if item.attrs and item.attrs.id:
             return
 
-        soup.attrs['id'] = slugify(soup.get_text())
+        item.attrs['id'] = slugify(item.get_text())
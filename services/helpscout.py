@@ -1,20 +1,42 @@
 # -*- coding:utf-8 -*-
 
-from .base import KnowledgeBaseImporter
+from .base import KnowledgeBaseImporter, Rule, Sanitizer, is_blank
+from utils.parsers import Regions
+from utils.selectors import SiteProfile
 
 
 class Helpscout(KnowledgeBaseImporter):
+    PROFILE = SiteProfile(
+        'helpscout', 1,
+        categories='#contentArea .category-list>a.category',
+        category_articles='.articleList a',
+        article_title='#main-content article#fullArticle h1'
+    )
+
+    # Category and article pages are only parsed within their main section
+    CATEGORY_REGIONS = Regions(('section', {'id': 'main-content'}), required='#main-content hgroup#categoryHead')
+    ARTICLE_REGIONS = Regions(('section', {'id': 'main-content'}), required='#main-content article#fullArticle')
+
+    VIDEO_CLASSES = ('u-centralize', 'video', 'video-vimeo', 'video-responsive')
+    CONTENT_SANITIZER = Sanitizer(
+        Rule('a.printArticle', drop=True),
+        Rule('b', rename='strong'),
+        Rule('img', handler='clean_image'),
+        Rule('div.callout-blue', classes=VIDEO_CLASSES + ('callout-blue',), callout='callout--info'),
+        Rule('div', classes=VIDEO_CLASSES),
+        Rule('iframe', handler='clean_iframe'),
+        remove=('style',)
+    )
+
     def load(self, base_url: str, language=None):
         if not base_url.endswith('/'):
             base_url += '/'
 
         self.add_language('en', base_url)
-        articles = {}
 
         page = self.retrieve(base_url)
-        for cat in page.select('#contentArea .category-list>a.category'):
-            cat_page = self.retrieve(cat.attrs['href'])
-
+        cat_urls = [cat.attrs['href'] for cat in self.select('categories', page)]
+        for cat_page in self.retrieve_many(cat_urls, regions=self.CATEGORY_REGIONS):
             category = cat_page.find('section', {'id': 'main-content'})
             categoryHead = category.find('hgroup', {'id': 'categoryHead'})
 
@@ -23,74 +45,48 @@ class Helpscout(KnowledgeBaseImporter):
                 'description': categoryHead.find('p', {'class': 'descrip'}).text.strip()
             })
 
-            for art in category.select('.articleList a'):
-                if art.attrs['href'] in articles:
-                    self.add_article_to_category(articles[art.attrs['href']], current_col)
+            art_urls = [art.attrs['href'] for art in self.select('category_articles', category)]
+            to_fetch = list(dict.fromkeys([url for url in art_urls if self.find_article(url) is None]))
+            fetched = dict(zip(to_fetch, self.retrieve_many(to_fetch, regions=self.ARTICLE_REGIONS)))
+
+            for art_url in art_urls:
+                existing = self.find_article(art_url)
+                if existing:
+                    self.add_article_to_category(existing, current_col)
                     continue
 
-                art_page = self.retrieve(art.attrs['href'])
-                title = art_page.select_one('#main-content article#fullArticle h1').text.strip()
+                art_page = fetched.pop(art_url)
+                title = self.select_one('article_title', art_page).text.strip()
                 try:
                     content = self.parse_content(art_page)
                 except AssertionError:
-                    print(art.attrs['href'])
+                    print(art_url)
                     raise
 
-                articles[art.attrs['href']] = self.save_article(
+                self.save_article(
                     current_col,
                     {
                         'title': title,
-                        'previous_url': self.get_url(art.attrs['href']),
+                        'previous_url': self.get_url(art_url),
                         'content': content
                     }
                 )
 
-    async def parse_content(self, soup):
+    def parse_content(self, soup):
         full_article = soup.find('article', {'id': 'fullArticle'})
         full_article.find('h1').decompose()
         full_article.name = 'div'
         del full_article.attrs['id']
-        full_article.find('a', {'class': 'printArticle'}).decompose()
-
-        for item in full_article.find_all():
-            if 'style' in item.attrs:
-                del item.attrs['style']
-
-        for bold in full_article.find_all('b'):
-            bold.name = 'strong'
-
-        for img in full_article.find_all('img'):
-            # If the parent is a p or div that is empty, we unwrap it
-            if img.parent.name in ('p', 'div') and not img.parent.text.strip():
-                img.parent.unwrap()
-
-            # If the parent is a heading, we unwrap it
-            if img.parent.name in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6'):
-                img.parent.unwrap()
-
-            # If the parent is not a figure, we need to wrap it in one
-            self.wrap_image_figure(img, soup)
-
-        # Now treating the videos:
-        for div in full_article.find_all('div'):
-            if 'class' not in div.attrs:
-                continue
-
-            for classname in div.attrs['class'][:]:
-                if classname in ('u-centralize', 'video', 'video-vimeo', 'video-responsive'):
-                    div.attrs['class'].remove(classname)
-                elif classname.startswith('callout-'):
-                    style = classname[8:]
-                    assert style in ('blue'), "Unknown callout style: {}".format(style)
-                    # Wrap the div inside a div
-                    div.attrs['class'].remove(classname)
-                    if style == 'blue':
-                        print('Has callout !')
-                        div.wrap(soup.new_tag('div', **{'class': 'callout callout--info'}))
-                else:
-                    raise AssertionError('Unexpected class name: {}'.format(classname))
-
-        for iframe in full_article.find_all('iframe'):
-            self.clean_iframe(iframe)
-
-        return str(full_article)
+        return str(self.sanitize(full_article, soup, self.CONTENT_SANITIZER))
+
+    def clean_image(self, img, soup):
+        # If the parent is a p or div that is empty, we unwrap it
+        if img.parent.name in ('p', 'div') and is_blank(img.parent):
+            img.parent.unwrap()
+
+        # If the parent is a heading, we unwrap it
+        if img.parent.name in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6'):
+            img.parent.unwrap()
+
+        # If the parent is not a figure, we need to wrap it in one
+        self.wrap_image_figure(img, soup)
@@ -1,14 +1,33 @@
 # -*- coding:utf-8 -*-
 
 from .base import KnowledgeBaseImporter
-from bs4 import BeautifulSoup
 from slugify import slugify
-import json
+from html import unescape
+from urllib.parse import urlsplit
+from utils.parsers import extract_next_data, load_json, start_tag, write_html
+import json, logging, re
 
 HEADING_MAPPER = {'heading': 'h2', 'subheading': 'h3', 'subheading3': 'h4', 'subheading4': 'h5'}
 
 
 class Next(KnowledgeBaseImporter):
+    """
+    Importer of the help centers built with Next.js.
+
+    Pages are read from their __NEXT_DATA__. Once the home page gave us the build id, the props of the other pages
+    are fetched from the JSON data routes (/_next/data/<build id>/<path>.json), a fraction of the size of the
+    pages. A page whose route is missing (404, redirect) is read from its HTML instead, and the data routes are
+    not used at all when the first one fails.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.build_id = None
+        self.base_path = None
+        self.locales = None
+        self.default_locale = None
+        self.data_routes = None  # None until a data route worked, False once they failed
+
     def load(self, base_url: str, language=None):
         if not base_url.endswith('/'):
             base_url += '/'
@@ -63,30 +82,148 @@ class Next(KnowledgeBaseImporter):
 
         self.set_metadata(metadata)
 
-        for item in data['props']['pageProps']['home']['collections']:
-            self.get_collections(item, None)
+        collections = data['props']['pageProps']['home']['collections']
+        for item, childs in zip(collections, self.retrieve_many([item['url'] for item in collections])):
+            self.get_collections(item, None, childs)
 
-    def retrieve(self, url):
+    def retrieve(self, url, data_route=True):
+        """Returns the data of a page, from its data route unless `data_route` is False (see `retrieve_many`)."""
         url = self.get_url(url)
-        soup = super().retrieve(url)
-        d = soup.find('script', {'id': '__NEXT_DATA__'})
 
-        if not d:
-            self.remove_cache(url)
-            raise AssertionError('Could not find __NEXT_DATA__ script tag.')
+        data_url = self.get_data_url(url) if data_route else None
+        if data_url:
+            page_props = self.get_page_props(self.retrieve_data_route(data_url))
+            if page_props is not None:
+                self.data_routes = True
+                return {'buildId': self.build_id, 'props': {'pageProps': page_props}}
+
+            self.on_missing_data_route()
+
+        entry = self.retrieve_entry(url)
+        if entry.content_type == 'application/json':
+            # Extracted from the page during a previous retrieval
+            data = load_json(entry.body)
+        else:
+            raw = extract_next_data(entry.body)
+            if raw is None:
+                self.remove_cache(url)
+                raise AssertionError('Could not find __NEXT_DATA__ script tag.')
 
-        data = json.loads(d.string)
-        if data['page'] == '/404':
-            self.remove_cache(url)
-            raise AssertionError('Page not found')
+            data = load_json(raw)
+            if data['page'] == '/404':
+                self.remove_cache(url)
+                raise AssertionError('Page not found')
+
+            # Only the data is used, it replaces the page in the cache
+            self.cache.replace(entry, raw, 'application/json')
+
+        if self.build_id is None:
+            self.set_build(entry.final_url or url, data)
 
         return data
 
-    def get_article(self, url, collection_id):
+    def retrieve_data_route(self, data_url):
+        """Returns the cache entry of a data route, or None when it is missing."""
+        try:
+            return self.retrieve_entry(data_url)
+        except AssertionError:
+            # A cache filled before the data routes were used only holds the pages
+            if not self.cache.policy.offline:
+                raise
+            return None
+
+    def get_page_props(self, entry):
+        """Returns the props of the page from the entry of its data route, or None when the route is missing."""
+        page_props = load_json(entry.body).get('pageProps') if entry else None
+        if page_props is None or '__N_REDIRECT' in page_props:
+            return None
+        return page_props
+
+    def on_missing_data_route(self):
+        if not self.data_routes:
+            logging.getLogger('knowledge-base-exporter').info('Next.js data routes are not available, reading the pages')
+            self.data_routes = False
+
+    def retrieve_many(self, urls, **kwargs):
+        if not self.build_id or self.data_routes is False:
+            return super().retrieve_many(urls, **kwargs)
+
+        # Prefetches the data routes, then the pages of the routes missing
+        urls = [self.get_url(url) for url in urls]
+        data_urls = [self.get_data_url(url) for url in urls]
+        offline = self.cache.policy.offline
+        missing = [data_url for data_url in dict.fromkeys(data_urls) if data_url and not self.cache.get(data_url)]
+        if missing and not offline:
+            self.crawler.run(missing)
+
+        failed = {data_url for data_url in dict.fromkeys(data_urls) if data_url and self.get_page_props(self.cache.get(data_url)) is None}
+        if failed:
+            self.on_missing_data_route()
+
+        # The pages without a data route are downloaded together too
+        pages = [url for url, data_url in zip(urls, data_urls) if not data_url or data_url in failed]
+        pages = [url for url in dict.fromkeys(pages) if not self.cache.get(url)]
+        if pages and not offline:
+            self.crawler.run(pages)
+
+        return [self.retrieve(url, data_url not in failed) for url, data_url in zip(urls, data_urls)]
+
+    def download(self, url, **kwargs):
+        try:
+            return super().download(url, **kwargs)
+        except Exception as e:
+            if '/_next/data/' in url and getattr(getattr(e, 'response', None), 'status_code', None) == 404:
+                # retrieve falls back to the page
+                return None, None
+            raise
+
+    def set_build(self, url, data):
+        """Finds the base path of the site from the url and the route of a page, so we can build its data routes."""
+        if not data.get('buildId') or not data.get('page'):
+            return
+
+        # Renders the route of the page (/[locale]/articles/[slug]) with its parameters
+        query = data.get('query', {})
+
+        def render(match):
+            value = query.get(match.group(2), '')
+            return '/'.join(value) if isinstance(value, list) else str(value)
+
+        route = re.sub(r'\[(\.\.\.)?([^\]]+)\]', render, data['page'])
+        route = '' if route == '/' else route.rstrip('/')
+
+        path = urlsplit(url).path.rstrip('/')
+        for suffix in ('/{}{}'.format(data.get('locale'), route) if data.get('locale') else None, route):
+            if suffix is not None and path.endswith(suffix):
+                self.build_id = data['buildId']
+                self.base_path = path[0:len(path) - len(suffix)]
+                # With i18n, data routes always start with the locale, even for the default one
+                self.locales = data.get('locales')
+                self.default_locale = data.get('defaultLocale')
+                return
+
+    def get_data_url(self, url):
+        """Returns the data route of a page of the site, or None when data routes can't be used."""
+        if not self.build_id or self.data_routes is False:
+            return None
+
+        parts = urlsplit(url)
+        if not parts.path.startswith(self.base_path):
+            return None
+
+        path = parts.path[len(self.base_path):].rstrip('/')
+        if self.locales and self.default_locale and path.split('/')[1:2] not in [[locale] for locale in self.locales]:
+            path = '/' + self.default_locale + path
+
+        path = path or '/index'
+        return '{}://{}{}/_next/data/{}{}.json'.format(parts.scheme, parts.netloc, self.base_path, self.build_id, path)
+
+    def get_article(self, url, collection_id, data=None):
         slug = url[url.rfind('/') + 1:]
         slug = '-'.join(slug.split('-')[1:])
 
-        data = self.retrieve(url)
+        if data is None:
+            data = self.retrieve(url)
 
         # Intercom does not have created/updated properties
         self.save_article(
@@ -100,173 +237,214 @@ class Next(KnowledgeBaseImporter):
             }
         )
 
-    def get_collections(self, entry, parent_id=None):
+    def get_collections(self, entry, parent_id=None, childs=None):
         collection_id = self.save_category(parent_id, {
             'title': entry['name'],
             'slug': entry['slug'],
             'description': entry['description']
         })
 
-        childs = self.retrieve(entry['url'])
-        if len(childs['props']['pageProps']['collection'].get('articleSummaries', [])) > 0:
-            for article in childs['props']['pageProps']['collection']['articleSummaries']:
-                self.get_article(article['url'], collection_id)
+        if childs is None:
+            childs = self.retrieve(entry['url'])
+
+        articles = childs['props']['pageProps']['collection'].get('articleSummaries', [])
+        if len(articles) > 0:
+            urls = [article['url'] for article in articles]
+            for url, data in zip(urls, self.retrieve_many(urls)):
+                self.get_article(url, collection_id, data)
 
-        if len(childs['props']['pageProps']['collection'].get('subcollections', [])) > 0:
-            subindex = 0
-            for col in childs['props']['pageProps']['collection']['subcollections']:
-                self.get_collections(col, collection_id)
-                subindex += 1
+        subcollections = childs['props']['pageProps']['collection'].get('subcollections', [])
+        if len(subcollections) > 0:
+            for col, col_childs in zip(subcollections, self.retrieve_many([col['url'] for col in subcollections])):
+                self.get_collections(col, collection_id, col_childs)
 
     def clean_text(self, text):
         return text.replace('<b>', '<strong>').replace('</b>', '</strong>')
 
-    def parse_block(self, block):
-        content = ''
-        classes = []
-        if 'align' in block:
-            classes.append('align--{}'.format(block['align']))
-
-        if block['type'] == 'paragraph':
-            assert block.get('class', 'no-margin') == 'no-margin', 'Unexpected class name!'
-            assert len([x for x in block.keys() if x not in ('type', 'text', 'class', 'align')]) == 0, 'Unexpected property'
-
-            if block['text'].strip() != '':
-                if classes:
-                    content = '<p class="{}">'.format(' '.join(classes))
-                else:
-                    content = '<p>'
-                content += '{}</p>'.format(self.clean_text(block['text']))
-        elif block['type'] == 'image':
-            assert len([x for x in block.keys() if x not in ('type', 'url', 'width', 'height', 'displayWidth', 'text', 'align', 'linkUrl')]) == 0, 'Unexpected property'
-            content = ''
-            attributes = {}
-
-            if 'linkUrl' in block:
-                content = '<a href="{}" target="_blank" rel="noopener noreferrer">'.format(block['linkUrl'])
-
-            if classes:
-                content += '<figure class="{}">'.format(' '.join(classes))
-            else:
-                content += '<figure>'
-
-            filename = block['url'][block['url'].rfind('/') + 1:]
-            attributes['src'] = block['url']
-            attributes['width'] = block.get('displayWidth') or block.get('width')
-            attributes['height'] = block.get('height')
-            attributes['alt'] = block.get('text') or filename
-
-            content += '<img {}>'.format(' '.join(['{}="{}"'.format(k, attributes[k]) for k in attributes.keys() if attributes[k] is not None]))
-            content += '</figure>'
-            if 'linkUrl' in block:
-                content += '</a>'
-        elif block['type'] in ('heading', 'subheading', 'subheading3', 'subheading4'):
-            assert len([x for x in block.keys() if x not in ('type', 'idAttribute', 'text', 'tag', 'align')]) == 0, 'Unexpected property'
-            attributes = {}
-            if classes:
-                attributes['class'] = classes
-
-            if block.get('idAttribute') and not block.get('idAttribute').startswith('h_'):
-                attributes['id'] = block['idAttribute']
-
-            if 'id' not in attributes:
-                attributes['id'] = slugify(block['text'])
-
-            return '<{tag} {attributes}>{text}</{tag}>'.format(**{
-                'tag': HEADING_MAPPER[block['type']],
-                'text': self.clean_text(block['text']),
-                'attributes': ' '.join(['{}="{}"'.format(k, attributes[k]) for k in attributes.keys() if attributes[k] is not None])
-            })
-        elif block['type'] == 'button':
-            assert block['buttonStyle'] == 'solid', 'Unexpected button style'
-            assert len([x for x in block.keys() if x not in ('type', 'text', 'linkUrl', 'buttonStyle', 'align')]) == 0, 'Unexpected property'
-
-            if classes:
-                content = '<p class="{}">'.format(' '.join(classes))
-            else:
-                content = '<p>'
-
-            content += '<a href="{linkUrl}" title="{text}" class="action" rel="noopener noreferrer">{text}</a></p>'.format(
-                linkUrl=block['linkUrl'],
-                text=self.clean_text(block['text'])
-            )
-        elif block['type'] in ('unorderedNestedList', 'orderedNestedList'):
-            content += '<div><{}l>'.format(block['type'][0:1])
-            for item in block['items']:
-                content += '<li>'
-                for itemContent in item['content']:
-                    content += self.parse_block(itemContent)
-                content += '</li>'
-
-            content += '</{}l></div>'.format(block['type'][0:1])
-        elif block['type'] == 'collapsibleSection':
-            return '''<div class="collapsible">
-                    <div class="collapsible__header">{summary}</div>
-                    <div class="collapsible__content">{content}</div>
-                </div>'''.format(
-                summary=self.parse_block(block['summary']),
-                content=''.join([self.parse_block(x) for x in block['content']])
-            )
-        elif block['type'] == 'horizontalRule':
-            return '<hr>'
-        elif block['type'] == 'code':
-            return '<pre><code>{}</code></pre>'.format(block['text'].strip())
-        elif block['type'] == 'video':
-            assert block['provider'] == 'wistia'
-            assert len([x for x in block.keys() if x not in ('type', 'provider', 'id')]) == 0, 'Unexpected property'
-            return '<div class="iframe-wrapper video-embed"><iframe src="https://fast.wistia.net/emed/iframe/{}" frameborder="0" allowfullscreen="allowfullscreen" allow="fullscreen; picture-in-picture"></iframe></div>'.format(block['id'])
-        elif block['type'] == 'callout':
-            assert len([x for x in block.keys() if x not in ('type', 'content', 'style')]) == 0, 'Unexpected property'
-            assert len(classes) == 0, 'Unknown classes {}'.format(classes)
-            if block['style']['backgroundColor'] == '#e3e7fa80':  # blue
-                state = ' callout--info'
-            elif block['style']['backgroundColor'] == '#feedaf80':  # yellow
-                state = ' callout--warning'
-            elif block['style']['backgroundColor'] == '#fed9db80':  # red
-                state = ' callout--danger'
-            elif block['style']['backgroundColor'] == '#d7efdc80':  # green
-                state = ' callout--success'
-            elif block['style']['backgroundColor'] == '#e8e8e880':  # grey
-                state = ' callout--info'
-            else:
-                raise AssertionError('Unknown color style {}'.format(block['style']))
-
-            content += '<div class="callout{}">'.format(state)
-            for sub in block['content']:
-                content += self.parse_block(sub)
-            content += '</div>'
-
-        elif block['type'] == 'table':
-            assert block['responsive'] is False
-            assert block['container'] is False
-            assert block['stacked'] is True
-            content += '<table>'
-            for row in block['rows']:
-                content += '<tr>'
-                for cell in row['cells']:
-                    content += '<td>'
-                    for sub in cell['content']:
-                        content += self.parse_block(sub)
-                    content += '</td>'
-                content += '</tr>'
-            content += '</table>'
-        else:
+    # Renderer of each type of block, see render_block
+    BLOCK_RENDERERS = {
+        'paragraph': 'render_paragraph',
+        'image': 'render_image',
+        'heading': 'render_heading',
+        'subheading': 'render_heading',
+        'subheading3': 'render_heading',
+        'subheading4': 'render_heading',
+        'button': 'render_button',
+        'unorderedNestedList': 'render_list',
+        'orderedNestedList': 'render_list',
+        'collapsibleSection': 'render_collapsible_section',
+        'horizontalRule': 'render_horizontal_rule',
+        'code': 'render_code',
+        'video': 'render_video',
+        'callout': 'render_callout',
+        'table': 'render_table',
+    }
+
+    def tag(self, name, attributes=None):
+        # Values are HTML attribute values, their entities are decoded before being escaped again
+        return start_tag(name, {k: unescape(str(v)) for k, v in (attributes or {}).items() if v is not None})
+
+    def render_block(self, block, out):
+        """
+        Appends the HTML of a block to `out`, a list of strings joined once the whole article is rendered.
+        The HTML is written as BeautifulSoup would serialize it, so it doesn't need to be parsed again.
+        """
+        renderer = self.BLOCK_RENDERERS.get(block['type'])
+        if renderer is None:
             raise AssertionError('Unknown block type: {}'.format(block['type']))
 
-        return content
+        classes = ['align--{}'.format(block['align'])] if 'align' in block else []
+        getattr(self, renderer)(block, out, classes)
+
+    def render_paragraph(self, block, out, classes):
+        assert block.get('class', 'no-margin') == 'no-margin', 'Unexpected class name!'
+        assert len([x for x in block.keys() if x not in ('type', 'text', 'class', 'align')]) == 0, 'Unexpected property'
+
+        if block['text'].strip() != '':
+            out.append(self.tag('p', {'class': ' '.join(classes) or None}))
+            write_html(self.clean_text(block['text']), out)
+            out.append('</p>')
+
+    def render_image(self, block, out, classes):
+        assert len([x for x in block.keys() if x not in ('type', 'url', 'width', 'height', 'displayWidth', 'text', 'align', 'linkUrl')]) == 0, 'Unexpected property'
+
+        if 'linkUrl' in block:
+            out.append(self.tag('a', {'href': block['linkUrl'], 'target': '_blank', 'rel': 'noopener noreferrer'}))
+
+        filename = block['url'][block['url'].rfind('/') + 1:]
+        out.append(self.tag('figure', {'class': ' '.join(classes) or None}))
+        out.append(self.tag('img', {
+            'src': block['url'],
+            'width': block.get('displayWidth') or block.get('width'),
+            'height': block.get('height'),
+            'alt': block.get('text') or filename
+        }))
+        out.append('</figure>')
+
+        if 'linkUrl' in block:
+            out.append('</a>')
+
+    def render_heading(self, block, out, classes):
+        assert len([x for x in block.keys() if x not in ('type', 'idAttribute', 'text', 'tag', 'align')]) == 0, 'Unexpected property'
+        attributes = {}
+        if classes:
+            attributes['class'] = classes
+
+        if block.get('idAttribute') and not block.get('idAttribute').startswith('h_'):
+            attributes['id'] = block['idAttribute']
+
+        if 'id' not in attributes:
+            attributes['id'] = slugify(block['text'])
+
+        tag = HEADING_MAPPER[block['type']]
+        out.append(self.tag(tag, attributes))
+        write_html(self.clean_text(block['text']), out)
+        out.append('</{}>'.format(tag))
+
+    def render_button(self, block, out, classes):
+        assert block['buttonStyle'] == 'solid', 'Unexpected button style'
+        assert len([x for x in block.keys() if x not in ('type', 'text', 'linkUrl', 'buttonStyle', 'align')]) == 0, 'Unexpected property'
+
+        text = self.clean_text(block['text'])
+        out.append(self.tag('p', {'class': ' '.join(classes) or None}))
+        out.append(self.tag('a', {'href': block['linkUrl'], 'title': text, 'class': 'action', 'rel': 'noopener noreferrer'}))
+        write_html(text, out)
+        out.append('</a></p>')
+
+    def render_list(self, block, out, classes):
+        tag = '{}l'.format(block['type'][0:1])
+        out.append('<div><{}>'.format(tag))
+        for item in block['items']:
+            out.append('<li>')
+            for item_content in item['content']:
+                self.render_block(item_content, out)
+            out.append('</li>')
+
+        out.append('</{}></div>'.format(tag))
+
+    def render_collapsible_section(self, block, out, classes):
+        out.append('<div class="collapsible">\n<div class="collapsible__header">')
+        self.render_block(block['summary'], out)
+        out.append('</div>\n<div class="collapsible__content">')
+        for sub in block['content']:
+            self.render_block(sub, out)
+        out.append('</div>\n</div>')
+
+    def render_horizontal_rule(self, block, out, classes):
+        out.append('<hr/>')
+
+    def render_code(self, block, out, classes):
+        out.append('<pre><code>')
+        write_html(block['text'].strip(), out, preserve_whitespace=True)
+        out.append('</code></pre>')
+
+    def render_video(self, block, out, classes):
+        assert block['provider'] == 'wistia'
+        assert len([x for x in block.keys() if x not in ('type', 'provider', 'id')]) == 0, 'Unexpected property'
+        out.append('<div class="iframe-wrapper video-embed">')
+        out.append(self.tag('iframe', {
+            'src': 'https://fast.wistia.net/emed/iframe/{}'.format(block['id']),
+            'frameborder': '0',
+            'allowfullscreen': 'allowfullscreen',
+            'allow': 'fullscreen; picture-in-picture'
+        }))
+        out.append('</iframe></div>')
+
+    def render_callout(self, block, out, classes):
+        assert len([x for x in block.keys() if x not in ('type', 'content', 'style')]) == 0, 'Unexpected property'
+        assert len(classes) == 0, 'Unknown classes {}'.format(classes)
+        if block['style']['backgroundColor'] == '#e3e7fa80':  # blue
+            state = ' callout--info'
+        elif block['style']['backgroundColor'] == '#feedaf80':  # yellow
+            state = ' callout--warning'
+        elif block['style']['backgroundColor'] == '#fed9db80':  # red
+            state = ' callout--danger'
+        elif block['style']['backgroundColor'] == '#d7efdc80':  # green
+            state = ' callout--success'
+        elif block['style']['backgroundColor'] == '#e8e8e880':  # grey
+            state = ' callout--info'
+        else:
+            raise AssertionError('Unknown color style {}'.format(block['style']))
+
+        out.append('<div class="callout{}">'.format(state))
+        for sub in block['content']:
+            self.render_block(sub, out)
+        out.append('</div>')
+
+    def render_table(self, block, out, classes):
+        assert block['responsive'] is False
+        assert block['container'] is False
+        assert block['stacked'] is True
+        out.append('<table>')
+        for row in block['rows']:
+            out.append('<tr>')
+            for cell in row['cells']:
+                out.append('<td>')
+                for sub in cell['content']:
+                    self.render_block(sub, out)
+                out.append('</td>')
+            out.append('</tr>')
+        out.append('</table>')
+
+    def parse_block(self, block):
+        out = []
+        self.render_block(block, out)
+        return ''.join(out)
 
     def build_blocks(self, url, blocks):
-        content = '<div>'
+        out = ['<div>']
         for block in blocks:
+            rendered = len(out)
             try:
-                content += self.parse_block(block)
+                self.render_block(block, out)
             except AssertionError as e:
+                # Drops what was written of the block before the error
+                del out[rendered:]
                 print('')
                 print(str(e))
                 print('> for url: {}'.format(url))
                 print(json.dumps(block, indent=4))
                 print('')
-        content += '</div>'
+        out.append('</div>')
 
-        soup = BeautifulSoup(content, features='html.parser')
-        return str(soup)
+        return ''.join(out)
@@ -2,7 +2,6 @@
 
 from .base import KnowledgeBaseImporter
 from slugify import slugify
-from utils import requests
 import urllib.parse
 import datetime, uuid, json
 
@@ -14,7 +13,7 @@ class Notion(KnowledgeBaseImporter):
 
         base_url = url[0:url.find('/', 9)]
         url = base_url + '/api/v3/loadCachedPageChunk'
-        r = requests.post(
+        r = self.http.post(
             url,
             json={
                 'page': {
@@ -30,7 +29,7 @@ class Notion(KnowledgeBaseImporter):
         )
 
         assert r.status_code == 200
-        return url, r.json['recordMap']
+        return url, r.json()['recordMap']
 
     def load(self, base_url: str, language=None):
         self.add_language('en', base_url[0:base_url.find('/', 9)])
@@ -91,12 +90,14 @@ class Notion(KnowledgeBaseImporter):
                                 page_id
                             )
 
-                            content = ['<div>']
-                            for block_id in page['block'][page_id]['value']['content']:
-                                self.parse_block(page['block'], block_id, content)
-                            content.append('</div>')
+                            entry['content'] = self.previous_content(entry['previous_url'], entry['last_updated'])
+                            if entry['content'] is None:
+                                content = ['<div>']
+                                for block_id in page['block'][page_id]['value']['content']:
+                                    self.parse_block(page['block'], block_id, content)
+                                content.append('</div>')
 
-                            entry['content'] = ''.join(content)
+                                entry['content'] = ''.join(content)
 
                             self.save_article(current_collection_id or root_collection_id, entry)
 
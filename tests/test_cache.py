@@ -0,0 +1,16 @@
+# -*- coding:utf-8 -*-
+
+from utils.cache import PageCache
+
+
+def test_gc_keeps_the_entries_served_fresh_during_the_run(tmp_path):
+    PageCache(str(tmp_path)).put('https://help.example.com/a', 'https://help.example.com/a', 'A' * 1000)
+    PageCache(str(tmp_path)).put('https://help.example.com/b', 'https://help.example.com/b', 'B' * 1000)
+
+    cache = PageCache(str(tmp_path), 'forever')
+    assert cache.get('https://help.example.com/a') is not None
+    removed, _ = cache.gc(max_size=1)
+
+    assert removed == 1
+    assert cache.load('https://help.example.com/a') is not None
+    assert cache.load('https://help.example.com/b') is None
@@ -0,0 +1,131 @@
+# -*- coding:utf-8 -*-
+
+from utils.cache_backends import FilesystemBackend, HttpBackend, SQLiteBackend
+from utils.cache_server import CacheServer
+import sqlite3, threading, time, pytest
+
+
+@pytest.fixture
+def cache_server(tmp_path):
+    server = CacheServer(('127.0.0.1', 0), str(tmp_path / 'server'))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}'.format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(params=['filesystem', 'sqlite', 'http'])
+def backend(request, tmp_path):
+    if request.param == 'filesystem':
+        backend = FilesystemBackend(str(tmp_path / 'cache'))
+    elif request.param == 'sqlite':
+        backend = SQLiteBackend(str(tmp_path / 'cache.db'))
+    else:
+        backend = HttpBackend(request.getfixturevalue('cache_server'))
+
+    yield backend
+    backend.close()
+
+
+def test_lock_excludes_threads_of_the_same_backend(backend):
+    holders, overlaps = [], []
+
+    def hold():
+        with backend.lock('key'):
+            holders.append(1)
+            if len(holders) > 1:
+                overlaps.append(len(holders))
+            time.sleep(0.2)
+            holders.pop()
+
+    threads = [threading.Thread(target=hold) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert overlaps == []
+
+
+def test_lock_is_released(backend):
+    with backend.lock('key'):
+        pass
+
+    acquired = []
+
+    def acquire():
+        with backend.lock('key'):
+            acquired.append(True)
+
+    thread = threading.Thread(target=acquire, daemon=True)
+    thread.start()
+    thread.join(5)
+    assert acquired == [True]
+
+
+def test_expired_lock_release_does_not_free_the_next_holder(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'cache.db'))
+    first = backend.lock('key', timeout=0.1)
+    first.__enter__()
+    time.sleep(0.2)
+
+    with backend.lock('key', timeout=60):
+        # The first holder's lock expired: releasing it must not release ours
+        first.__exit__(None, None, None)
+        rows = backend.connection.execute('SELECT COUNT(*) FROM locks WHERE key = ?', ('key',)).fetchone()
+        assert rows[0] == 1
+
+    backend.close()
+
+
+def test_server_locks_are_not_reentrant(tmp_path):
+    server = CacheServer(('127.0.0.1', 0), str(tmp_path / 'server'))
+    try:
+        assert server.acquire('key', 'owner', 60)
+        assert not server.acquire('key', 'owner', 60)
+        server.release('key', 'other')
+        assert not server.acquire('key', 'another', 60)
+        server.release('key', 'owner')
+        assert server.acquire('key', 'another', 60)
+    finally:
+        server.server_close()
+
+
+def test_local_locks_are_dropped_once_released(tmp_path):
+    backend = FilesystemBackend(str(tmp_path / 'cache'))
+    def hold(key):
+        with backend.lock(key):
+            time.sleep(0.05)
+
+    threads = [threading.Thread(target=hold, args=('key-{}'.format(index % 3),)) for index in range(9)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert backend._local_locks == {}
+
+
+def test_sqlite_close_closes_the_connections_of_every_thread(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'cache.db'))
+    connections = []
+
+    def read():
+        backend.read('key')
+        connections.append(backend.connection)
+
+    threads = [threading.Thread(target=read) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    backend.close()
+    for connection in connections:
+        with pytest.raises(sqlite3.ProgrammingError, match='closed'):
+            connection.execute('SELECT 1')
+
+    # The backend opens new connections when used after being closed
+    assert backend.read('key') is None
+    backend.close()
@@ -0,0 +1,157 @@
+# -*- coding:utf-8 -*-
+
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import format_datetime
+from utils.crawler import Crawler, HostState, Throttled, parse_retry_after
+import datetime, threading, time, pytest
+
+
+def test_get_host_returns_one_state_per_host():
+    crawler = Crawler(lambda url: url)
+    barrier = threading.Barrier(8)
+
+    def get_host(_):
+        barrier.wait()
+        return crawler.get_host('https://help.example.com/{}'.format(time.monotonic()))
+
+    with ThreadPoolExecutor(8) as executor:
+        hosts = list(executor.map(get_host, range(8)))
+
+    assert len({id(host) for host in hosts}) == 1
+
+
+def test_fetch_respects_the_host_concurrency():
+    lock = threading.Lock()
+    in_flight, peak = [0], [0]
+
+    def fetch(url):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.05)
+        with lock:
+            in_flight[0] -= 1
+        return url
+
+    crawler = Crawler(fetch, rate=1000, burst=1000, max_concurrency=4)
+    with ThreadPoolExecutor(16) as executor:
+        results = list(executor.map(crawler.fetch, ['https://help.example.com/{}'.format(i) for i in range(32)]))
+
+    assert len(results) == 32
+    # The limit grows with the successes, up to max_concurrency
+    assert 1 < peak[0] <= 4
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('') is None
+    assert parse_retry_after(' 120 ') == 120
+    assert parse_retry_after('soon') is None
+
+    in_a_minute = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=60)
+    assert 55 <= parse_retry_after(format_datetime(in_a_minute, usegmt=True)) <= 60
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0
+
+
+class FlakyFetch:
+    """Throttles the first `throttles` requests of each url, then returns the url."""
+
+    def __init__(self, throttles, retry_after=0):
+        self.throttles = throttles
+        self.retry_after = retry_after
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, url):
+        with self._lock:
+            self.calls.append(url)
+            attempts = self.calls.count(url)
+        if attempts <= self.throttles:
+            raise Throttled(url, self.retry_after)
+        return url
+
+
+def test_fetch_retries_after_a_throttle():
+    fetch = FlakyFetch(throttles=2)
+    crawler = Crawler(fetch, rate=1000, burst=1000, max_retries=5)
+
+    assert crawler.fetch('https://help.example.com/a') == 'https://help.example.com/a'
+    assert len(fetch.calls) == 3
+
+
+def test_fetch_waits_for_retry_after():
+    fetch = FlakyFetch(throttles=1, retry_after=0.3)
+    crawler = Crawler(fetch, rate=1000, burst=1000)
+
+    started = time.monotonic()
+    crawler.fetch('https://help.example.com/a')
+    assert time.monotonic() - started >= 0.3
+
+
+def test_fetch_fails_after_max_retries():
+    fetch = FlakyFetch(throttles=10)
+    crawler = Crawler(fetch, rate=1000, burst=1000, max_retries=2, max_backoff=0)
+
+    with pytest.raises(Throttled):
+        crawler.fetch('https://help.example.com/a')
+    assert len(fetch.calls) == 3
+
+
+def test_concurrency_decreases_on_failures_and_recovers():
+    host = HostState(1000, 1000, concurrency=8, min_concurrency=1, max_concurrency=8)
+
+    host.on_failure()
+    assert host.limit == 4
+    # A burst of failures from the same congestion only counts once
+    host.on_failure()
+    assert host.limit == 4
+
+    host.last_decrease -= 1
+    host.on_success(20)
+    assert host.limit == 2, 'A slow response decreases the concurrency too'
+
+    host.latency = 0
+    while host.limit < 8:
+        host.on_success(0.01)
+    assert host.concurrency == 8
+    for _ in range(100):
+        host.on_success(0.01)
+    assert host.concurrency == 8
+
+
+def test_concurrency_does_not_go_below_the_minimum():
+    host = HostState(1000, 1000, concurrency=2, min_concurrency=1, max_concurrency=8)
+    for _ in range(5):
+        host.last_decrease = 0
+        host.on_failure()
+    assert host.limit == 1
+
+
+def test_run_returns_the_results_in_order():
+    def fetch(url):
+        # The first urls answer last
+        time.sleep(0.01 * (10 - int(url.rsplit('/', 1)[1])))
+        return url
+
+    urls = ['https://help.example.com/{}'.format(i) for i in range(10)]
+    assert Crawler(fetch, rate=1000, burst=1000).run(urls) == urls
+
+
+def test_run_retries_throttled_urls():
+    fetch = FlakyFetch(throttles=1)
+    urls = ['https://help.example.com/{}'.format(i) for i in range(4)]
+
+    assert Crawler(fetch, rate=1000, burst=1000).run(urls) == urls
+    assert len(fetch.calls) == 8
+
+
+def test_run_raises_the_error_of_the_first_failed_url():
+    def fetch(url):
+        index = int(url.rsplit('/', 1)[1])
+        if index in (3, 6):
+            raise ValueError(index)
+        return url
+
+    with pytest.raises(ValueError) as error:
+        Crawler(fetch, rate=1000, burst=1000).run(['https://help.example.com/{}'.format(i) for i in range(8)])
+    assert error.value.args == (3,)
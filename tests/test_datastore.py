@@ -0,0 +1,84 @@
+# -*- coding:utf-8 -*-
+
+from utils.datastore import KnowledgeData
+from utils.output import iterencode
+import json
+
+
+def make_store():
+    store = KnowledgeData('en', 'https://help.example.com/', service='test')
+    category = store.add_category(None, 'Category')
+    store.add_article_to_category(store.add_article('Article', '<p>Content</p>', 'https://help.example.com/a'), category)
+    return store
+
+
+def test_records_are_encoded_by_every_accessor():
+    articles = make_store().serialize()['articles']
+    identifier = next(iter(articles))
+
+    for copy in (dict(articles), {**articles}, dict(articles.items())):
+        assert copy[identifier]['title'] == 'Article'
+    assert articles == {identifier: articles[identifier]}
+    assert articles.get(identifier)['content'] == '<p>Content</p>'
+    assert "'title': 'Article'" in repr(articles)
+
+
+def test_serialized_store_encodes_as_json():
+    serialized = make_store().serialize()
+    expected = json.dumps({key: dict(value) if key in ('categories', 'articles') else value for key, value in serialized.items()})
+
+    assert ''.join(iterencode(serialized)) == expected
+    assert ''.join(iterencode(serialized, depth=0)) == expected
+
+
+def test_source_ids_are_looked_up_per_language(tmp_path):
+    from services.base import KnowledgeBaseImporter
+
+    importer = KnowledgeBaseImporter(cache_backend=str(tmp_path))
+    importer.add_language('en', 'https://help.example.com/en/')
+    english = importer.save_article(None, {'title': 'A', 'content': 'c', 'previous_url': '/en/article/a-1x', 'source_id': '1x'})
+    importer.add_language('fr', 'https://help.example.com/fr/')
+
+    assert importer.find_article(source_id='1x', language='en') == english
+    assert importer.find_article(source_id='1x') is None
+    importer.close()
+
+
+def test_articles_are_ordered_by_category_then_position():
+    store = KnowledgeData('en', 'https://help.example.com/', service='test')
+    categories = {'B': store.add_category(None, 'B', position=1), 'A': store.add_category(None, 'A', position=0)}
+    # Saved as concurrent workers would, in no particular order
+    for title, position in (('B1', 1), ('A1', 1), ('B0', 0), ('A0', 0)):
+        article = store.add_article(title, '<p>{}</p>'.format(title), 'https://help.example.com/{}'.format(title))
+        store.add_article_to_category(article, categories[title[0]], position)
+    store.add_article('Orphan', '<p>Orphan</p>', 'https://help.example.com/orphan')
+
+    serialized = store.serialize()
+    assert [category['title'] for category in serialized['categories'].values()] == ['A', 'B']
+    assert [article['title'] for article in serialized['articles'].values()] == ['A0', 'A1', 'B0', 'B1', 'Orphan']
+
+
+def test_duplicate_keys_are_ranked_in_export_order():
+    def export(order):
+        store = KnowledgeData('en', 'https://help.example.com/', service='test')
+        for position in order:
+            category = store.add_category(None, 'FAQ', description=str(position), position=position)
+            article = store.add_article('FAQ', '<p>{}</p>'.format(position), 'https://help.example.com/faq')
+            store.add_article_to_category(article, category)
+        serialized = store.serialize()
+        categories = {identifier: category['description'] for identifier, category in serialized['categories'].items()}
+        articles = {identifier: article['content'] for identifier, article in serialized['articles'].items()}
+        return categories, articles, [category['articles'] for category in serialized['categories'].values()]
+
+    assert export([0, 1, 2]) == export([2, 0, 1])
+
+
+def test_uncategorized_articles_come_after_the_categories():
+    store = KnowledgeData('en', 'https://help.example.com/', service='test')
+    category = store.add_category(None, 'Category')
+    store.add_article_to_category(store.add_article('Top', '<p>Top</p>', 'https://help.example.com/top'), None)
+    store.add_article_to_category(store.add_article('Article', '<p>Article</p>', 'https://help.example.com/article'), category)
+
+    serialized = store.serialize()
+    assert list(serialized['categories']) == [category, None]
+    assert [article['title'] for article in serialized['articles'].values()] == ['Article', 'Top']
@@ -0,0 +1,75 @@
+# -*- coding:utf-8 -*-
+
+from services.base import KnowledgeBaseImporter
+from utils.delta import KINDS
+from utils.output import read_json
+import export as exporter
+
+
+class Service(KnowledgeBaseImporter):
+    """Saves the given articles, by title, under a single category."""
+
+    ARTICLES = {}
+
+    def load(self, base_url, language=None):
+        self.add_language('en', base_url)
+        category = self.save_category(None, {'title': 'Category', 'url': base_url + 'category'})
+        for position, (title, (content, last_updated)) in enumerate(sorted(self.ARTICLES.items())):
+            self.save_article(category, {
+                'title': title,
+                'previous_url': '/{}'.format(title.lower()),
+                'content': self.previous_content('/{}'.format(title.lower()), last_updated) or content,
+                'last_updated': last_updated
+            }, position=position)
+
+
+def run(monkeypatch, tmp_path, name, articles, since=None, delta=None):
+    monkeypatch.setattr(Service, 'ARTICLES', articles)
+    monkeypatch.setattr(exporter, 'get_importer', lambda service, **kwargs: Service(**kwargs))
+    output = str(tmp_path / name)
+    exporter.export('https://help.example.com/', 'service', output, cache_backend=str(tmp_path / 'cache'), since=since, delta=delta)
+    return output
+
+
+def apply_delta(previous, changes):
+    """The previous export with the changes applied, which must give the new export back."""
+    result = {}
+    for language, kinds in changes.items():
+        result[language] = {}
+        for kind in KINDS:
+            records = {key: record for key, record in previous.get(language, {}).get(kind, {}).items() if key not in kinds[kind]['removed']}
+            records.update(kinds[kind]['added'])
+            records.update(kinds[kind]['updated'])
+            result[language][kind] = records
+    return result
+
+
+def test_delta_round_trip(monkeypatch, tmp_path):
+    since = run(monkeypatch, tmp_path, 'previous.json', {
+        'Same': ('<p>Same</p>', '2024-01-01T00:00:00'),
+        'Updated': ('<p>Before</p>', '2024-01-01T00:00:00'),
+        'Removed': ('<p>Removed</p>', '2024-01-01T00:00:00')
+    })
+    read = []
+    counting = lambda path: read.append(path) or read_json(path)
+    monkeypatch.setattr('services.base.read_json', counting)
+    monkeypatch.setattr(exporter, 'read_json', counting, raising=False)
+    output = run(monkeypatch, tmp_path, 'export.json', {
+        'Same': ('<p>Parsed again</p>', '2024-01-01T00:00:00'),
+        'Updated': ('<p>After</p>', '2024-02-01T00:00:00'),
+        'Added': ('<p>Added</p>', '2024-02-01T00:00:00')
+    }, since=since, delta=str(tmp_path / 'delta.json'))
+
+    previous, current, changes = read_json(since), read_json(output), read_json(str(tmp_path / 'delta.json'))
+    # The previous export is only read once, by the importer
+    assert read == [since]
+
+    articles = changes['en']['articles']
+    assert [article['title'] for article in articles['added'].values()] == ['Added']
+    assert [article['content'] for article in articles['updated'].values()] == ['<p>After</p>']
+    assert [previous['en']['articles'][key]['title'] for key in articles['removed']] == ['Removed']
+    # The unchanged article was reused from the previous export, it is not part of the delta
+    assert [article['content'] for article in current['en']['articles'].values() if article['title'] == 'Same'] == ['<p>Same</p>']
+    assert 'Same' not in [article['title'] for article in list(articles['added'].values()) + list(articles['updated'].values())]
+
+    assert apply_delta(previous, changes) == {language: {kind: store[kind] for kind in KINDS} for language, store in current.items()}
@@ -0,0 +1,18 @@
+# -*- coding:utf-8 -*-
+
+from services.base import KnowledgeBaseImporter
+import pytest
+
+Gitbook = pytest.importorskip('services.gitbook').Gitbook
+
+
+def test_gitbook_does_not_render_offline(tmp_path):
+    importer = Gitbook.__new__(Gitbook)
+    KnowledgeBaseImporter.__init__(importer, cache_backend=str(tmp_path), cache_policy='offline')
+    importer.add_language('en', 'https://help.example.com/en/')
+    importer.render = lambda url: pytest.fail('{} was rendered offline'.format(url))
+    try:
+        with pytest.raises(AssertionError, match='cache policy is offline'):
+            importer.retrieve('https://help.example.com/en/missing')
+    finally:
+        importer.close()
@@ -0,0 +1,79 @@
+# -*- coding:utf-8 -*-
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from services.next import Next
+import json, threading, pytest
+
+
+@pytest.fixture
+def server():
+    """A Next.js site whose data routes are gone, as after a redeploy."""
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(self.path)
+            if self.path.startswith('/_next/data/'):
+                self.send_response(404)
+                self.end_headers()
+                return
+
+            slug = self.path.rsplit('/', 1)[1]
+            data = {'buildId': 'build', 'page': '/articles/[slug]', 'query': {'slug': slug}, 'props': {'pageProps': {'title': slug}}}
+            body = '<html><body><script id="__NEXT_DATA__" type="application/json">{}</script></body></html>'.format(json.dumps(data))
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.end_headers()
+            self.wfile.write(body.encode())
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}'.format(httpd.server_address[1]), requests
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def make_importer(base_url, tmp_path, **kwargs):
+    importer = Next(cache_backend=str(tmp_path / 'cache'), **kwargs)
+    importer.add_language('en', base_url + '/')
+    importer.build_id, importer.base_path = 'build', ''
+    return importer
+
+
+def test_pages_of_missing_data_routes_are_prefetched_together(server, tmp_path):
+    base_url, requests = server
+    importer = make_importer(base_url, tmp_path)
+    importer.data_routes = True
+    runs = []
+    run = importer.crawler.run
+    importer.crawler.run = lambda urls, **kwargs: runs.append(list(urls)) or run(urls, **kwargs)
+    try:
+        pages = importer.retrieve_many(['/articles/a', '/articles/b'])
+    finally:
+        importer.close()
+
+    assert [page['props']['pageProps']['title'] for page in pages] == ['a', 'b']
+    assert runs[1] == [base_url + '/articles/a', base_url + '/articles/b']
+    # Each data route and page is only requested once
+    assert sorted(requests) == ['/_next/data/build/articles/a.json', '/_next/data/build/articles/b.json', '/articles/a', '/articles/b']
+
+
+def test_offline_falls_back_to_the_cached_pages(server, tmp_path):
+    base_url, requests = server
+    # A cache filled without the data routes
+    importer = Next(cache_backend=str(tmp_path / 'cache'))
+    importer.add_language('en', base_url + '/')
+    importer.retrieve(base_url + '/articles/a')
+    importer.close()
+
+    importer = make_importer(base_url, tmp_path, cache_policy='offline')
+    try:
+        assert importer.retrieve('/articles/a')['props']['pageProps']['title'] == 'a'
+        assert importer.retrieve_many(['/articles/a'])[0]['props']['pageProps']['title'] == 'a'
+    finally:
+        importer.close()
+    assert requests == ['/articles/a']
@@ -0,0 +1,70 @@
+# -*- coding:utf-8 -*-
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from services.base import KnowledgeBaseImporter
+from utils.output import write_json
+import os, threading, pytest
+
+
+@pytest.fixture
+def server():
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_HEAD(self):
+            requests.append((self.command, self.path, self.headers.get('If-Modified-Since')))
+            self.send_response(304 if self.path == '/same' else 200)
+            self.end_headers()
+
+        do_GET = do_HEAD
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}'.format(httpd.server_address[1]), requests
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def make_importer(tmp_path, base_url):
+    articles = {
+        name: {'title': name, 'content': '<p>{}</p>'.format(name), 'previous_url': '{}/{}'.format(base_url, name), 'last_updated': '2024-01-02T00:00:00'}
+        for name in ('same', 'changed')
+    }
+    write_json(str(tmp_path / 'previous.json'), {'en': {'base_url': base_url + '/', 'language': 'en', 'articles': articles}})
+
+    importer = KnowledgeBaseImporter(cache_backend=str(tmp_path / 'cache'), since=str(tmp_path / 'previous.json'))
+    importer.add_language('en', base_url + '/')
+    return importer
+
+
+def test_previous_articles_are_read_back_when_reused(tmp_path):
+    importer = make_importer(tmp_path, 'https://help.example.com')
+    try:
+        last_updated, _ = importer.previous['en']['https://help.example.com/same']
+        assert last_updated == '2024-01-02T00:00:00'
+        assert importer.previous_article('/same', '2024-01-02T00:00:00')['content'] == '<p>same</p>'
+        assert importer.previous_article('/same', '2024-03-04T00:00:00') is None
+    finally:
+        importer.close()
+
+
+def test_unchanged_articles_are_not_downloaded(tmp_path, server):
+    base_url, requests = server
+    importer = make_importer(tmp_path, base_url)
+    try:
+        unchanged = importer.unchanged_articles(['/same', '/changed', '/new'])
+    finally:
+        importer.close()
+    # The previous articles are removed with the importer
+    assert not os.path.exists(importer.previous_blobs.directory)
+
+    assert list(unchanged) == ['/same']
+    assert unchanged['/same']['content'] == '<p>same</p>'
+    assert sorted(requests) == [
+        ('HEAD', '/changed', 'Tue, 02 Jan 2024 00:00:00 GMT'),
+        ('HEAD', '/same', 'Tue, 02 Jan 2024 00:00:00 GMT')
+    ]
@@ -0,0 +1,69 @@
+# -*- coding:utf-8 -*-
+
+"""
+Sanitizes the article of each service in tests/fixtures/sanitizers and compares it with the expected output next to
+it, so that a change to a rule can't silently change the exports.
+"""
+
+from services.base import KnowledgeBaseImporter
+import os, pytest
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'sanitizers')
+
+
+def make_importer(cls, tmp_path):
+    # Services such as Gitbook need a browser when created, the sanitizer only needs the base importer
+    importer = cls.__new__(cls)
+    KnowledgeBaseImporter.__init__(importer, cache_backend=str(tmp_path))
+    importer.add_language('en', 'https://help.example.com/en/')
+    return importer
+
+
+def sanitize_crisp(importer, html):
+    soup = importer.parse(html, importer.ARTICLE_REGIONS)
+    return importer.parse_content(importer.select_one('article_content', importer.select_one('article', soup)), soup)
+
+
+def sanitize_helpscout(importer, html):
+    return importer.parse_content(importer.parse(html, importer.ARTICLE_REGIONS))
+
+
+def sanitize_helpkit(importer, html):
+    soup = importer.parse(html)
+    return str(importer.parse_content('/intro', soup, importer.select('article_main', soup.find(id='article-abcDEF'))[0]))
+
+
+def sanitize_gitbook(importer, html):
+    soup = importer.parse(html)
+    return importer.parse_content([child for child in importer.select_one('main', soup).children if child.name][1], soup)
+
+
+def sanitize_clickconnector(importer, html):
+    return importer.parse_content('https://help.example.com/en/articles/1', html)
+
+
+SERVICES = {
+    'crisp': ('services.crisp', 'Crisp', sanitize_crisp),
+    'helpscout': ('services.helpscout', 'Helpscout', sanitize_helpscout),
+    'helpkit': ('services.helpkit', 'Helpkit', sanitize_helpkit),
+    'gitbook': ('services.gitbook', 'Gitbook', sanitize_gitbook),
+    'clickconnector': ('services.clickconnector', 'Clickconnector', sanitize_clickconnector)
+}
+
+
+def read(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('service', SERVICES)
+def test_sanitized_article_matches_the_fixture(service, tmp_path):
+    module, name, sanitize = SERVICES[service]
+    cls = getattr(pytest.importorskip(module), name)
+    importer = make_importer(cls, tmp_path)
+    try:
+        output = sanitize(importer, read('{}.html'.format(service)))
+    finally:
+        importer.close()
+
+    assert output.strip() == read('{}.expected.html'.format(service)).strip()
@@ -0,0 +1,43 @@
+# -*- coding:utf-8 -*-
+
+"""
+Content-addressed store of the article contents, kept on disk during the export so that the memory used does not
+grow with the size of the knowledge base. Contents are stored once per sha256 digest: articles shared by several
+languages, or exported again, are only written once.
+"""
+
+import hashlib, os, tempfile
+
+
+class BlobStore:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, digest):
+        return os.path.join(self.directory, digest[0:2], digest)
+
+    def put(self, content):
+        """Stores `content` and returns its digest."""
+        data = content.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if os.path.exists(path):
+            return digest
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_fp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_fp, path)
+        except BaseException:
+            os.remove(tmp_fp)
+            raise
+
+        return digest
+
+    def get(self, digest):
+        with open(self._path(digest), 'rb') as f:
+            return f.read().decode('utf-8')
+
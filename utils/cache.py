@@ -0,0 +1,457 @@
+# -*- coding:utf-8 -*-
+
+from urllib.parse import urlparse
+from utils.cache_backends import open_backend
+from utils.compression import Dictionary, check_codec, compress, decompress
+from utils.urls import canonicalize_url
+from utils.warc import WarcArchive, WarcWriter
+import hashlib, json, logging, re, threading, time
+
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+
+
+def parse_duration(value):
+    """Parses a duration in seconds, optionally suffixed by s, m, h or d (e.g. 3600, 30m, 12h, 7d)."""
+    match = re.fullmatch(r'(\d+)([smhd]?)', str(value).strip().lower())
+    assert match, 'Invalid duration "{}"'.format(value)
+    return int(match.group(1)) * DURATION_UNITS[match.group(2) or 's']
+
+
+def parse_size(value):
+    """Parses a size in bytes, optionally suffixed by K, M, G or T (e.g. 500M, 2G)."""
+    match = re.fullmatch(r'(\d+)([kmgt]?)b?', str(value).strip().lower())
+    assert match, 'Invalid size "{}"'.format(value)
+    return int(match.group(1)) * SIZE_UNITS[match.group(2)]
+
+
+class CachePolicy:
+    """
+    Decides whether a cached page can be used without contacting the server.
+
+    Supported policies are:
+        * forever: cached pages are always used (default)
+        * offline: cached pages are always used, and a page missing from the cache is an error
+        * ttl=<duration>: pages younger than the duration (3600, 30m, 12h, 7d, ...) are used, older ones are revalidated
+        * revalidate: pages are revalidated with If-None-Match/If-Modified-Since the first time they are used
+        * refresh: pages are downloaded again the first time they are used
+    """
+
+    def __init__(self, policy=None):
+        policy = (policy or 'forever').strip().lower()
+        self.name, _, value = policy.partition('=')
+        self.ttl = None
+
+        if self.name == 'ttl':
+            self.ttl = parse_duration(value)
+        else:
+            assert self.name in ('forever', 'offline', 'revalidate', 'refresh') and not value, 'Unknown cache policy "{}"'.format(policy)
+
+    def __str__(self):
+        return self.name if self.ttl is None else '{}={}'.format(self.name, self.ttl)
+
+    @property
+    def offline(self):
+        return self.name == 'offline'
+
+    @property
+    def conditional(self):
+        return self.name in ('ttl', 'revalidate')
+
+    def is_fresh(self, entry):
+        if self.name in ('forever', 'offline'):
+            return True
+
+        if self.name == 'ttl':
+            return time.time() - entry.fetched_at < self.ttl
+
+        return False
+
+
+class CacheEntry:
+    def __init__(self, url, final_url, body, headers=None, fetched_at=None):
+        self.url = url
+        self.final_url = final_url
+        self.body = body if isinstance(body, bytes) else body.encode()
+        self.headers = dict(headers or {})
+        self.fetched_at = fetched_at or time.time()
+
+    @property
+    def content(self):
+        return self.body.decode()
+
+    @property
+    def content_type(self):
+        return self.headers.get('content-type', '').split(';')[0].strip().lower()
+
+    @property
+    def etag(self):
+        return self.headers.get('etag')
+
+    @property
+    def last_modified(self):
+        return self.headers.get('last-modified')
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+
+        return headers
+
+    def metadata(self):
+        return {
+            'url': self.url,
+            'final_url': self.final_url,
+            'headers': self.headers,
+            'fetched_at': self.fetched_at
+        }
+
+
+class PageCache:
+    """
+    Cache of the pages retrieved by the importers, kept in a CacheBackend (a local directory by default).
+
+    Entries are stored under the sha256 of their canonical url (see `canonicalize_url`), so the variants of an url
+    (trailing slash, fragment, tracking parameters) share the same entry. Once a page redirected, its final url
+    is an alias of the requested one and is served from the same entry. Each entry holds one line of JSON metadata (urls, response
+    headers, fetch time, codec) followed by the compressed body.
+
+    Bodies are compressed with zlib, or zstd when `compression` is zstd. With zstd-dict, the first pages of each
+    host are used to train a zstd dictionary, stored in the backend, which is then used for all the following
+    entries of that host: pages of a help center share most of their markup, which per-entry compression
+    can't take advantage of.
+
+    The policy uses the validators (ETag, Last-Modified) and the fetch time to decide if an entry can be
+    reused. An entry fetched or revalidated during the current run is always fresh.
+
+    The cache is bounded by `max_size` (in bytes) and `max_age` (in seconds without being used): entries are
+    evicted least recently used first.
+
+    Pages missing from the backend are looked up in the `warc_in` archive, if any, so a crawl archived once can be
+    exported again offline. Every page used during the run (fetched, revalidated or read from the cache) is
+    written to `warc_out`.
+    """
+
+    DICTIONARY_PREFIX = 'zdict-'
+    DICTIONARY_SAMPLES = 64
+
+    def __init__(self, backend=None, policy=None, max_size=None, max_age=None, compression=None, warc_in=None, warc_out=None):
+        self.backend = open_backend(backend)
+        self.archive = WarcArchive(warc_in) if warc_in else None
+        self.recorder = WarcWriter(warc_out) if warc_out else None
+        self.compression = check_codec(compression)
+        self.dictionaries = {}
+        self.samples = {}
+        self.policy = policy if isinstance(policy, CachePolicy) else CachePolicy(policy)
+        self.max_size = max_size
+        self.max_age = max_age
+        self.aliases = {}
+        self.validated = set()
+        # Keys of the entries used during the run, whatever the policy, which gc must keep
+        self.used = set()
+        self.lookups = {}
+        self.written = 0
+        self._lock = threading.Lock()
+
+    def canonical(self, url):
+        url = canonicalize_url(url)
+        return self.aliases.get(url, url)
+
+    def add_alias(self, url, final_url):
+        """Serves `final_url` from the entry of `url`, which redirected to it."""
+        final_url = canonicalize_url(final_url)
+        if final_url != url:
+            with self._lock:
+                self.aliases.setdefault(final_url, url)
+
+    def key(self, url):
+        return hashlib.sha256(self.canonical(url).encode()).hexdigest()
+
+    def get_dictionary(self, host, dictionary_id=None):
+        """Returns the trained dictionary of `host`, reloading it from the backend if `dictionary_id` is not the one we know."""
+        dictionary = self.dictionaries.get(host)
+        if host not in self.dictionaries or (dictionary_id is not None and (dictionary is None or dictionary.id != dictionary_id)):
+            data = self.backend.read(self.DICTIONARY_PREFIX + host)
+            dictionary = self.dictionaries[host] = Dictionary(data) if data else None
+
+        return dictionary
+
+    def _get_codec(self, entry):
+        if self.compression != 'zstd-dict':
+            return self.compression, None
+
+        host = urlparse(entry.url).netloc.lower()
+        dictionary = self.get_dictionary(host)
+        if dictionary is None:
+            with self._lock:
+                samples = self.samples.setdefault(host, [])
+                samples.append(entry.body)
+                if len(samples) >= self.DICTIONARY_SAMPLES:
+                    dictionary = self._train(host, samples)
+
+        return 'zstd', dictionary
+
+    def _train(self, host, samples):
+        try:
+            dictionary = Dictionary.train(samples)
+        except Exception as e:
+            logging.getLogger('knowledge-base-exporter').debug('Could not train a dictionary for {}: {}'.format(host, e))
+            return None
+        finally:
+            del self.samples[host]
+
+        self.backend.write(self.DICTIONARY_PREFIX + host, dictionary.data)
+        self.dictionaries[host] = dictionary
+        return dictionary
+
+    def _decode(self, url, data):
+        header, compressed = data.split(b'\n', 1)
+        metadata = json.loads(header)
+
+        dictionary = None
+        if metadata.get('dictionary'):
+            dictionary = self.get_dictionary(urlparse(url).netloc.lower(), metadata['dictionary'])
+            if dictionary is None or dictionary.id != metadata['dictionary']:
+                # The dictionary was removed, the entry can't be read anymore
+                return None
+
+        try:
+            body = decompress(compressed, metadata.get('codec', 'zlib'), dictionary)
+        except Exception:
+            return None
+
+        return CacheEntry(url, metadata['final_url'], body, metadata['headers'], metadata['fetched_at'])
+
+    def _write_entry(self, entry):
+        codec, dictionary = self._get_codec(entry)
+        metadata = entry.metadata()
+        metadata['codec'] = codec
+        if dictionary is not None:
+            metadata['dictionary'] = dictionary.id
+
+        data = json.dumps(metadata).encode() + b'\n' + compress(entry.body, codec, dictionary)
+        self.backend.write(self.key(entry.url), data)
+
+        if self.max_size:
+            with self._lock:
+                self.written += len(data)
+                collect = self.written > self.max_size / 10
+
+            if collect:
+                self.gc()
+
+    def _load_archived(self, url):
+        if self.archive is None:
+            return None
+
+        final_url, record = self.archive.resolve(url)
+        if record is None or record.status != 200:
+            return None
+
+        return CacheEntry(url, final_url, record.body, record.headers, record.date)
+
+    def record(self, entry):
+        """Writes the entry to the WARC output of the run, if any."""
+        if self.recorder is not None:
+            self.recorder.write(entry.url, entry.final_url, entry.headers, entry.body, entry.fetched_at)
+
+    def load(self, url):
+        """Returns the cached entry of `url` whatever its freshness, or None."""
+        url = self.canonical(url)
+        key = self.key(url)
+        data = self.backend.read(key)
+        if data is None:
+            entry = self._load_archived(url)
+        else:
+            # Keeps track of the least recently used entries
+            self.backend.touch(key)
+            entry = self._decode(url, data)
+
+        if entry is not None:
+            self.add_alias(url, entry.final_url)
+
+        return entry
+
+    def is_fresh(self, entry, since=None):
+        return entry.url in self.validated or self.policy.is_fresh(entry) or (since is not None and entry.fetched_at >= since)
+
+    def get(self, url):
+        """Returns the cached entry of `url` if the policy allows to use it as is, or None."""
+        url = self.canonical(url)
+        entry = self.load(url)
+        if entry and not self.is_fresh(entry):
+            entry = None
+
+        if entry:
+            self.used.add(self.key(url))
+            self.record(entry)
+
+        # Only the first lookup of an url during the run counts toward the hit ratio
+        if url not in self.lookups:
+            self.lookups[url] = entry is not None
+
+        return entry
+
+    def lock(self, url, timeout=60):
+        """
+        Prevents other threads and workers sharing the backend from fetching the same url at the same time. The lock
+        expires after `timeout` seconds in case its holder died, it must be longer than the fetch.
+        """
+        return self.backend.lock(self.key(url), timeout=timeout)
+
+    def put(self, url, final_url, content, headers=None):
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        url = self.canonical(url)
+        entry = CacheEntry(url, final_url, content, headers)
+        self.add_alias(url, final_url)
+
+        self.validated.add(url)
+        self._write_entry(entry)
+        self.record(entry)
+        return entry
+
+    def touch(self, entry):
+        """Marks a cached entry as fetched now, after the server told us it did not change."""
+        entry.fetched_at = time.time()
+        self.validated.add(entry.url)
+        self._write_entry(entry)
+        self.record(entry)
+        return entry
+
+    def replace(self, entry, body, content_type):
+        """
+        Replaces the body of an entry by what was extracted from it (e.g. the JSON data of a page), keeping its
+        urls, validators and fetch time so the entry is still revalidated against the original page.
+        """
+        entry.body = body if isinstance(body, bytes) else body.encode()
+        entry.headers['content-type'] = content_type
+        self._write_entry(entry)
+        return entry
+
+    def remove(self, url):
+        url = self.canonical(url)
+        self.backend.delete(self.key(url))
+        self.validated.discard(url)
+        self.used.discard(self.key(url))
+
+    def entries(self):
+        """Yields (key, size, last used time) of every cached page, leaving the dictionaries out."""
+        for key, size, last_used in self.backend.entries():
+            if not key.startswith(self.DICTIONARY_PREFIX):
+                yield key, size, last_used
+
+    def read_metadata(self, key):
+        header = self.backend.read_header(key)
+        if not header:
+            return None
+
+        try:
+            return json.loads(header)
+        except ValueError:
+            return None
+
+    def gc(self, max_size=None, max_age=None):
+        """
+        Removes the entries unused for more than `max_age` seconds, then the least recently used ones until the
+        cache fits in `max_size` bytes. Entries used during the current run are never removed.
+        Returns the number of entries and bytes removed.
+        """
+        max_size = max_size or self.max_size
+        max_age = max_age or self.max_age
+        protected = {self.key(url) for url in list(self.validated)} | set(self.used)
+        now = time.time()
+
+        kept = []
+        removed, freed = 0, 0
+        for key, size, last_used in self.entries():
+            if max_age is not None and now - last_used > max_age and key not in protected:
+                removed, freed = removed + 1, freed + size
+                self.backend.delete(key)
+            else:
+                kept.append((last_used, size, key))
+
+        if max_size:
+            total = sum(size for _, size, _ in kept)
+            for last_used, size, key in sorted(kept):
+                if total <= max_size:
+                    break
+
+                if key in protected:
+                    continue
+
+                total -= size
+                removed, freed = removed + 1, freed + size
+                self.backend.delete(key)
+
+        with self._lock:
+            self.written = 0
+
+        return removed, freed
+
+    def purge(self, host=None):
+        """Removes every entry, or only the entries of the given host. Returns the number of entries and bytes removed."""
+        removed, freed = 0, 0
+        for key, size, _ in list(self.backend.entries()):
+            if host:
+                if key.startswith(self.DICTIONARY_PREFIX):
+                    if key != self.DICTIONARY_PREFIX + host.lower():
+                        continue
+                else:
+                    metadata = self.read_metadata(key)
+                    if metadata is None or urlparse(metadata['url']).netloc.lower() != host.lower():
+                        continue
+
+            removed, freed = removed + 1, freed + size
+            self.backend.delete(key)
+
+        self.dictionaries = {}
+        return removed, freed
+
+    def save_stats(self):
+        """Adds the hits and misses of the current run to the statistics stored in the backend."""
+        if not self.lookups:
+            return
+
+        stats = {}
+        for url, hit in self.lookups.items():
+            host = stats.setdefault(urlparse(url).netloc.lower(), {'hits': 0, 'misses': 0})
+            host['hits' if hit else 'misses'] += 1
+
+        self.backend.add_stats(stats)
+        self.lookups = {}
+
+    def stats(self):
+        """Returns the number of entries, bytes and hit ratio of each host."""
+        hosts = {}
+        for key, size, _ in list(self.entries()):
+            metadata = self.read_metadata(key)
+            if metadata is None:
+                continue
+
+            host = hosts.setdefault(urlparse(metadata['url']).netloc.lower(), {'entries': 0, 'bytes': 0, 'hits': 0, 'misses': 0})
+            host['entries'] += 1
+            host['bytes'] += size
+
+        for name, lookups in self.backend.load_stats().items():
+            host = hosts.setdefault(name, {'entries': 0, 'bytes': 0, 'hits': 0, 'misses': 0})
+            host['hits'] += lookups['hits']
+            host['misses'] += lookups['misses']
+
+        for host in hosts.values():
+            total = host['hits'] + host['misses']
+            host['hit_ratio'] = host['hits'] / total if total else None
+
+        return hosts
+
+    def close(self):
+        self.save_stats()
+        self.backend.close()
+
+        if self.archive is not None:
+            self.archive.close()
+
+        if self.recorder is not None:
+            self.recorder.close()
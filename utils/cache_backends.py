@@ -0,0 +1,403 @@
+# -*- coding:utf-8 -*-
+
+from contextlib import contextmanager
+from urllib.parse import quote
+import json, os, sqlite3, tempfile, threading, time, uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+class CacheBackend:
+    """
+    Storage of the cache entries, addressed by an opaque key.
+
+    A backend stores bytes and knows when each entry was last used; the layout of an entry is up to the
+    PageCache. `lock` must exclude every other thread and process sharing the same storage, so that
+    only one of them fetches a given url at a time.
+    """
+
+    def read(self, key):
+        raise NotImplementedError('read method must be implemented')
+
+    def write(self, key, data):
+        raise NotImplementedError('write method must be implemented')
+
+    def delete(self, key):
+        raise NotImplementedError('delete method must be implemented')
+
+    def entries(self):
+        """Yields (key, size, last used time) of every entry."""
+        raise NotImplementedError('entries method must be implemented')
+
+    def touch(self, key):
+        """Marks an entry as used now."""
+        pass
+
+    def read_header(self, key):
+        """Returns the first line of the entry, which holds its metadata."""
+        data = self.read(key)
+        if data is None:
+            return None
+
+        return data.split(b'\n', 1)[0]
+
+    @contextmanager
+    def lock(self, key, timeout=60):
+        raise NotImplementedError('lock method must be implemented')
+
+    def load_stats(self):
+        raise NotImplementedError('load_stats method must be implemented')
+
+    def add_stats(self, stats):
+        """Adds the given {host: {'hits': x, 'misses': y}} to the stored statistics."""
+        raise NotImplementedError('add_stats method must be implemented')
+
+    def close(self):
+        pass
+
+
+class FilesystemBackend(CacheBackend):
+    """
+    Stores each entry in its own file, sharded in two levels of directories (`tmp/ab/cd/abcd...`).
+
+    Files are written to a temporary file then renamed, so readers never see a partial entry. The modification
+    time of a file is its last use. Locks are `flock`s on files in `locks/`, which works across processes
+    sharing the directory (but not across nodes on most network filesystems).
+    """
+
+    STATS_FILE = 'stats.json'
+
+    def __init__(self, directory='tmp'):
+        self.directory = directory
+        self._local_locks = {}
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[0:2], key[2:4], key)
+
+    def _write_file(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_fp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_fp, path)
+        except BaseException:
+            os.remove(tmp_fp)
+            raise
+
+    def read(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def read_header(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.readline().rstrip(b'\n')
+        except FileNotFoundError:
+            return None
+
+    def write(self, key, data):
+        self._write_file(self._path(key), data)
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def touch(self, key):
+        try:
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def entries(self):
+        if not os.path.isdir(self.directory):
+            return
+
+        for shard in os.scandir(self.directory):
+            if len(shard.name) != 2 or not shard.is_dir():
+                continue
+
+            for subshard in os.scandir(shard.path):
+                if not subshard.is_dir():
+                    continue
+
+                for item in os.scandir(subshard.path):
+                    if item.name.startswith('.tmp-'):
+                        # Leftover of an interrupted write
+                        try:
+                            if time.time() - item.stat().st_mtime > 3600:
+                                os.remove(item.path)
+                        except FileNotFoundError:
+                            pass
+                        continue
+
+                    try:
+                        stat = item.stat()
+                    except FileNotFoundError:
+                        continue
+
+                    yield item.name, stat.st_size, stat.st_mtime
+
+    @contextmanager
+    def lock(self, key, timeout=60):
+        # flock excludes other processes, the local lock other threads of this process sharing the backend
+        # The local lock of a key is dropped once no thread holds or waits for it
+        with self._lock:
+            local_lock = self._local_locks.setdefault(key, [threading.Lock(), 0])
+            local_lock[1] += 1
+
+        try:
+            with local_lock[0]:
+                if fcntl is None:
+                    yield
+                    return
+
+                lock_fp = os.path.join(self.directory, 'locks', key + '.lock')
+                os.makedirs(os.path.dirname(lock_fp), exist_ok=True)
+                with open(lock_fp, 'a') as f:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                    try:
+                        yield
+                    finally:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+        finally:
+            with self._lock:
+                local_lock[1] -= 1
+                if local_lock[1] == 0:
+                    del self._local_locks[key]
+
+    @contextmanager
+    def _stats_file(self):
+        with self.lock(self.STATS_FILE):
+            try:
+                with open(os.path.join(self.directory, self.STATS_FILE), 'r') as f:
+                    stats = json.load(f)
+            except (FileNotFoundError, ValueError):
+                stats = {}
+
+            yield stats
+
+    def load_stats(self):
+        with self._stats_file() as stats:
+            return stats
+
+    def add_stats(self, stats):
+        with self._stats_file() as stored:
+            merge_stats(stored, stats)
+            self._write_file(os.path.join(self.directory, self.STATS_FILE), json.dumps(stored).encode())
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    Stores the entries in a single SQLite database, which can be shared by several processes on the same host.
+    Locks are rows of the `locks` table, expiring after their timeout in case their owner died.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        # The connections of every thread, closed together by close(), which starts a new generation of connections
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._generation = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        with self.connection as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS locks (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS stats (host TEXT PRIMARY KEY, hits INTEGER NOT NULL, misses INTEGER NOT NULL)')
+
+    @property
+    def connection(self):
+        # sqlite3 connections can't be shared between threads
+        if getattr(self._local, 'connection', None) is None or self._local.generation != self._generation:
+            # Only used by this thread, but closed by the thread calling close()
+            self._local.connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._local.connection.execute('PRAGMA journal_mode=WAL')
+            with self._connections_lock:
+                self._local.generation = self._generation
+                self._connections.append(self._local.connection)
+
+        return self._local.connection
+
+    def read(self, key):
+        row = self.connection.execute('SELECT data FROM entries WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def write(self, key, data):
+        with self.connection as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO entries (key, data, size, last_used) VALUES (?, ?, ?, ?)',
+                (key, data, len(data), time.time())
+            )
+
+    def delete(self, key):
+        with self.connection as conn:
+            conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+
+    def touch(self, key):
+        with self.connection as conn:
+            conn.execute('UPDATE entries SET last_used = ? WHERE key = ?', (time.time(), key))
+
+    def entries(self):
+        yield from self.connection.execute('SELECT key, size, last_used FROM entries').fetchall()
+
+    @contextmanager
+    def lock(self, key, timeout=60):
+        # Each acquisition has its own owner, so that releasing a lock that expired never frees the next holder's
+        owner = uuid.uuid4().hex
+        while True:
+            with self.connection as conn:
+                conn.execute('DELETE FROM locks WHERE key = ? AND expires < ?', (key, time.time()))
+                try:
+                    conn.execute('INSERT INTO locks (key, owner, expires) VALUES (?, ?, ?)', (key, owner, time.time() + timeout))
+                    break
+                except sqlite3.IntegrityError:
+                    pass
+
+            time.sleep(0.1)
+
+        try:
+            yield
+        finally:
+            with self.connection as conn:
+                conn.execute('DELETE FROM locks WHERE key = ? AND owner = ?', (key, owner))
+
+    def load_stats(self):
+        rows = self.connection.execute('SELECT host, hits, misses FROM stats').fetchall()
+        return {host: {'hits': hits, 'misses': misses} for host, hits, misses in rows}
+
+    def add_stats(self, stats):
+        with self.connection as conn:
+            for host, counts in stats.items():
+                conn.execute(
+                    'INSERT INTO stats (host, hits, misses) VALUES (?, ?, ?) '
+                    'ON CONFLICT(host) DO UPDATE SET hits = hits + excluded.hits, misses = misses + excluded.misses',
+                    (host, counts['hits'], counts['misses'])
+                )
+
+    def close(self):
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+            self._generation += 1
+
+        for connection in connections:
+            connection.close()
+
+
+class HttpBackend(CacheBackend):
+    """
+    Stores the entries in a key-value service shared by all the workers, over HTTP:
+
+        GET/PUT/DELETE  <base>/entries/<key>     read (which marks the entry as used), write, delete an entry
+        GET             <base>/entries           JSON list of [key, size, last used time]
+        POST/DELETE     <base>/locks/<key>       acquire (200, or 409 when already held) and release a lock
+        GET/POST        <base>/stats             read, or add to, the hit/miss statistics
+
+    `utils/cache_server.py` implements this protocol on top of a local backend.
+    """
+
+    def __init__(self, base_url, timeout=30):
+        import requests
+
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _url(self, *parts):
+        return '/'.join([self.base_url] + [quote(part, safe='') for part in parts])
+
+    def read(self, key):
+        r = self.session.get(self._url('entries', key), timeout=self.timeout)
+        if r.status_code == 404:
+            return None
+
+        r.raise_for_status()
+        return r.content
+
+    def write(self, key, data):
+        self.session.put(self._url('entries', key), data=data, timeout=self.timeout).raise_for_status()
+
+    def delete(self, key):
+        r = self.session.delete(self._url('entries', key), timeout=self.timeout)
+        if r.status_code != 404:
+            r.raise_for_status()
+
+    def entries(self):
+        r = self.session.get(self._url('entries'), timeout=self.timeout)
+        r.raise_for_status()
+        for key, size, last_used in r.json():
+            yield key, size, last_used
+
+    @contextmanager
+    def lock(self, key, timeout=60):
+        # Each acquisition has its own owner: the threads of a worker exclude each other as the workers do
+        params = {'owner': uuid.uuid4().hex, 'timeout': timeout}
+        while True:
+            r = self.session.post(self._url('locks', key), params=params, timeout=self.timeout)
+            if r.status_code != 409:
+                r.raise_for_status()
+                break
+
+            time.sleep(0.1)
+
+        try:
+            yield
+        finally:
+            self.session.delete(self._url('locks', key), params=params, timeout=self.timeout)
+
+    def load_stats(self):
+        r = self.session.get(self._url('stats'), timeout=self.timeout)
+        r.raise_for_status()
+        return r.json()
+
+    def add_stats(self, stats):
+        self.session.post(self._url('stats'), json=stats, timeout=self.timeout).raise_for_status()
+
+    def close(self):
+        self.session.close()
+
+
+def merge_stats(stored, stats):
+    for host, counts in stats.items():
+        entry = stored.setdefault(host, {'hits': 0, 'misses': 0})
+        entry['hits'] += counts['hits']
+        entry['misses'] += counts['misses']
+
+    return stored
+
+
+def open_backend(spec=None):
+    """
+    Opens the backend described by `spec`:
+        * a directory (default: tmp) for the filesystem backend
+        * sqlite:<path> for the SQLite backend
+        * http(s)://host:port/path for a shared cache server
+    """
+    if isinstance(spec, CacheBackend):
+        return spec
+
+    spec = spec or 'tmp'
+    if spec.startswith('sqlite:'):
+        path = spec[len('sqlite:'):]
+        if path.startswith('//'):
+            # sqlite:///absolute/path
+            path = path[2:]
+
+        return SQLiteBackend(path)
+
+    if spec.startswith('http://') or spec.startswith('https://'):
+        return HttpBackend(spec)
+
+    return FilesystemBackend(spec)
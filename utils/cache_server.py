@@ -0,0 +1,127 @@
+# -*- coding:utf-8 -*-
+
+"""
+Minimal cache server implementing the protocol of `HttpBackend` on top of a local backend, so several export
+workers (or nodes) can share their fetches. Also used as a local stand-in when testing the network backend.
+
+    python -m utils.cache_server --port 8700 --backend sqlite:shared-cache.db
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+from utils.cache_backends import open_backend
+import argparse, json, threading, time
+
+
+class CacheRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _route(self):
+        parsed = urlparse(self.path)
+        parts = [unquote(part) for part in parsed.path.strip('/').split('/') if part]
+        return parts, {k: v[0] for k, v in parse_qs(parsed.query).items()}
+
+    def _send(self, status, body=b'', content_type='application/octet-stream'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, data):
+        self._send(200, json.dumps(data).encode(), 'application/json')
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def do_GET(self):
+        parts, _ = self._route()
+        backend = self.server.backend
+
+        if parts == ['entries']:
+            return self._send_json([list(entry) for entry in backend.entries()])
+
+        if parts == ['stats']:
+            return self._send_json(backend.load_stats())
+
+        if len(parts) == 2 and parts[0] == 'entries':
+            data = backend.read(parts[1])
+            if data is None:
+                return self._send(404)
+
+            backend.touch(parts[1])
+            return self._send(200, data)
+
+        self._send(404)
+
+    def do_PUT(self):
+        parts, _ = self._route()
+        if len(parts) == 2 and parts[0] == 'entries':
+            self.server.backend.write(parts[1], self._body())
+            return self._send(204)
+
+        self._send(404)
+
+    def do_POST(self):
+        parts, params = self._route()
+
+        if parts == ['stats']:
+            self.server.backend.add_stats(json.loads(self._body()))
+            return self._send(204)
+
+        if len(parts) == 2 and parts[0] == 'locks':
+            acquired = self.server.acquire(parts[1], params.get('owner'), float(params.get('timeout', 60)))
+            return self._send(200 if acquired else 409)
+
+        self._send(404)
+
+    def do_DELETE(self):
+        parts, params = self._route()
+
+        if len(parts) == 2 and parts[0] == 'entries':
+            self.server.backend.delete(parts[1])
+            return self._send(204)
+
+        if len(parts) == 2 and parts[0] == 'locks':
+            self.server.release(parts[1], params.get('owner'))
+            return self._send(204)
+
+        self._send(404)
+
+
+class CacheServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, backend=None):
+        super().__init__(address, CacheRequestHandler)
+        self.backend = open_backend(backend)
+        self.locks = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key, owner, timeout):
+        with self._lock:
+            # Locks are not reentrant, every acquisition comes with a new owner
+            current = self.locks.get(key)
+            if current and current[1] > time.time():
+                return False
+
+            self.locks[key] = (owner, time.time() + timeout)
+            return True
+
+    def release(self, key, owner):
+        with self._lock:
+            if key in self.locks and self.locks[key][0] == owner:
+                del self.locks[key]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='cache_server', description='Share the pages cache between several export workers.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8700)
+    parser.add_argument('--backend', default='tmp', help='Local storage of the server: a directory, or sqlite:<path>.')
+    args = parser.parse_args()
+
+    CacheServer((args.host, args.port), args.backend).serve_forever()
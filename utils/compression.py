@@ -0,0 +1,62 @@
+# -*- coding:utf-8 -*-
+
+import logging, zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODECS = ('zlib', 'zstd', 'zstd-dict')
+DICTIONARY_SIZE = 112640  # zstd's default dictionary size
+ZSTD_LEVEL = 9
+
+
+class Dictionary:
+    """A trained zstd dictionary, shared by all the compressors and decompressors using it."""
+
+    def __init__(self, data):
+        self.data = data
+        self.zstd = zstandard.ZstdCompressionDict(data)
+        self.zstd.precompute_compress(level=ZSTD_LEVEL)
+
+    @property
+    def id(self):
+        return self.zstd.dict_id()
+
+    @classmethod
+    def train(cls, samples, size=DICTIONARY_SIZE):
+        return cls(zstandard.train_dictionary(size, samples).as_bytes())
+
+
+def check_codec(codec):
+    """Returns the codec to use for `codec`, falling back to zlib when zstandard is not installed."""
+    codec = codec or 'zlib'
+    assert codec in CODECS, 'Unknown compression "{}", expected one of {}'.format(codec, ', '.join(CODECS))
+
+    if codec.startswith('zstd') and zstandard is None:
+        logging.getLogger('knowledge-base-exporter').warning('{} compression requires zstandard to be installed, using zlib'.format(codec))
+        return 'zlib'
+
+    return codec
+
+
+def compress(data, codec, dictionary=None):
+    if codec == 'zlib':
+        return zlib.compress(data)
+
+    if dictionary is not None:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dictionary.zstd).compress(data)
+
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+
+
+def decompress(data, codec, dictionary=None):
+    if codec == 'zlib':
+        return zlib.decompress(data)
+
+    assert zstandard is not None, 'zstandard is required to read {} compressed data'.format(codec)
+    if dictionary is not None:
+        return zstandard.ZstdDecompressor(dict_data=dictionary.zstd).decompress(data)
+
+    return zstandard.ZstdDecompressor().decompress(data)
@@ -0,0 +1,303 @@
+# -*- coding:utf-8 -*-
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+import asyncio, datetime, logging, threading, time
+
+
+class Throttled(Exception):
+    """Raised by a fetch function when the server asks us to slow down (HTTP 429 or 503)."""
+
+    def __init__(self, url, retry_after=None):
+        super().__init__('Throttled while fetching {}'.format(url))
+        self.url = url
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value):
+    """Returns the number of seconds to wait from a Retry-After header, which is either a delay or an HTTP date."""
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+
+    return max(0, (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls sharing the same key: the first caller runs the function, the callers arriving
+    while it runs wait for it and share its result (or its exception).
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.coalesced = 0
+        self._lock = threading.Lock()
+
+    def do(self, key, function, *args, **kwargs):
+        with self._lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return call.result()
+
+        try:
+            result = function(*args, **kwargs)
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self.calls[key]
+
+
+class HostState:
+    """
+    Rate limiting and concurrency state of a single host.
+
+    Requests are spaced by a token bucket (`rate` requests per second, bursts of `burst`), and the number of
+    requests in flight is adjusted with AIMD: it grows by one every `concurrency` successful responses, and is
+    multiplied by `decrease` when the host throttles us, fails, or becomes slow.
+
+    The state is shared by the threads fetching from the host, its updates are made under `lock`.
+    """
+
+    def __init__(self, rate, burst, concurrency, min_concurrency, max_concurrency, decrease=0.5, slow_latency=10.0):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+
+        self.concurrency = concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.decrease = decrease
+        self.slow_latency = slow_latency
+        self.latency = None
+        self.last_decrease = 0
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        self.released = threading.Condition(self.lock)
+
+    def try_acquire(self):
+        """Takes a slot among the requests in flight if one is free, returns whether it did."""
+        with self.lock:
+            if self.in_flight >= self.limit:
+                return False
+
+            self.in_flight += 1
+            return True
+
+    def acquire(self):
+        """Waits for a slot among the requests in flight."""
+        with self.lock:
+            while self.in_flight >= self.limit:
+                self.released.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+            self.released.notify()
+
+    def reserve(self):
+        """Takes a token from the bucket and returns how long to wait (in seconds) before sending the request."""
+        with self.lock:
+            now = time.monotonic()
+            if now > self.updated:
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+            self.tokens -= 1
+            wait = 0 if self.tokens >= 0 else -self.tokens / self.rate
+            return max(wait, self.blocked_until - now)
+
+    def block(self, seconds):
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            # No burst is allowed right after a throttle, the bucket starts refilling once the block is over
+            self.tokens = 0
+            self.updated = self.blocked_until
+
+    @property
+    def limit(self):
+        return max(self.min_concurrency, int(self.concurrency))
+
+    def on_success(self, latency):
+        with self.lock:
+            self.latency = latency if self.latency is None else self.latency * 0.8 + latency * 0.2
+            if self.latency > self.slow_latency:
+                self._decrease()
+            else:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+                self.released.notify()
+
+    def on_failure(self):
+        with self.lock:
+            self._decrease()
+
+    def _decrease(self):
+        # A burst of errors coming from the same congestion only counts once
+        now = time.monotonic()
+        if now - self.last_decrease < 1:
+            return
+
+        self.last_decrease = now
+        self.concurrency = max(self.min_concurrency, self.concurrency * self.decrease)
+
+
+class Crawler:
+    """
+    Fetches urls while being polite with the hosts serving them.
+
+    `fetch` is a blocking callable taking an url (and keyword arguments) that must raise `Throttled` when the host
+    answers with a 429 or a 503. Throttled requests are put back in the frontier and retried once the delay
+    given by Retry-After (or an exponential backoff) has elapsed.
+    """
+
+    def __init__(self, fetch, rate=10, burst=10, max_concurrency=8, min_concurrency=1, max_retries=5, max_backoff=60):
+        self.fetch_func = fetch
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = min(min_concurrency, self.max_concurrency)
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self.hosts = {}
+        self._lock = threading.Lock()
+
+    def get_host(self, url):
+        netloc = urlparse(url).netloc.lower()
+        with self._lock:
+            if netloc not in self.hosts:
+                self.hosts[netloc] = HostState(
+                    self.rate,
+                    self.burst,
+                    concurrency=max(self.min_concurrency, self.max_concurrency // 2),
+                    min_concurrency=self.min_concurrency,
+                    max_concurrency=self.max_concurrency
+                )
+
+            return self.hosts[netloc]
+
+    def _on_throttled(self, host, error, attempt):
+        host.on_failure()
+        if attempt >= self.max_retries:
+            raise error
+
+        delay = error.retry_after
+        if delay is None:
+            delay = min(self.max_backoff, 2 ** attempt)
+
+        host.block(delay)
+        logging.getLogger('knowledge-base-exporter').warning('Throttled on {}, retrying in {}s'.format(error.url, delay))
+
+    def fetch(self, url, **kwargs):
+        """
+        Fetches a single url, blocking the current thread while the host asks us to wait or already has as many
+        requests in flight as it allows.
+        """
+        host = self.get_host(url)
+        attempt = 0
+        while True:
+            host.acquire()
+            try:
+                time.sleep(host.reserve())
+                started = time.monotonic()
+                result = self.fetch_func(url, **kwargs)
+            except Throttled as e:
+                self._on_throttled(host, e, attempt)
+                attempt += 1
+                continue
+            except Exception:
+                host.on_failure()
+                raise
+            finally:
+                host.release()
+
+            host.on_success(time.monotonic() - started)
+            return result
+
+    def run(self, urls, **kwargs):
+        """Fetches all the given urls and returns the results in the same order."""
+        urls = list(urls)
+        if not urls:
+            return []
+
+        return asyncio.run(self._crawl(urls, kwargs))
+
+    async def _crawl(self, urls, kwargs):
+        results = [None] * len(urls)
+        errors = {}
+        frontier = asyncio.Queue()
+        for index, url in enumerate(urls):
+            frontier.put_nowait((index, url, 0))
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            workers = [
+                asyncio.create_task(self._worker(frontier, executor, kwargs, results, errors))
+                for _ in range(min(self.max_concurrency, len(urls)))
+            ]
+
+            await frontier.join()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        if errors:
+            raise errors[min(errors)]
+
+        return results
+
+    async def _worker(self, frontier, executor, kwargs, results, errors):
+        loop = asyncio.get_running_loop()
+        while True:
+            index, url, attempt = await frontier.get()
+            host = self.get_host(url)
+            try:
+                if errors:
+                    # The crawl already failed, we only drain the frontier
+                    continue
+
+                while not host.try_acquire():
+                    await asyncio.sleep(0.05)
+
+                try:
+                    await asyncio.sleep(host.reserve())
+                    started = time.monotonic()
+                    results[index] = await loop.run_in_executor(executor, lambda: self.fetch_func(url, **kwargs))
+                    host.on_success(time.monotonic() - started)
+                finally:
+                    host.release()
+            except Throttled as e:
+                try:
+                    self._on_throttled(host, e, attempt)
+                    frontier.put_nowait((index, url, attempt + 1))
+                except Throttled as error:
+                    errors[index] = error
+            except Exception as e:
+                host.on_failure()
+                errors[index] = e
+            finally:
+                frontier.task_done()
@@ -1,18 +1,172 @@
 # -*- coding:utf-8 -*-
 
+from collections.abc import Mapping
 from slugify import slugify
-from uuid import uuid4
-import logging, datetime
+import uuid
+import array, logging, datetime, functools, math, operator, threading
 
+NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, 'https://github.com/getfernand/knowledge-base-exporter')
 
-class KnowledgeData(dict):
-    def __init__(self, language, url, unique_categories_slug=False, unique_articles_slug=True):
-        self._slugs = {
-            'categories': [],
-            'articles': []
-        }
+# Titles repeat across articles ("Introduction", "FAQ"...) and languages
+_slugify = functools.lru_cache(maxsize=4096)(slugify)
+
+
+def make_identifier(service, language, kind, key):
+    """The identifier of a category or article, derived from where it comes from so that it is the same on every export."""
+    return str(uuid.uuid5(NAMESPACE, '{}:{}:{}:{}'.format(service, language, kind, key)))
+
+
+class Slugs:
+    """Allocates unique slugs, suffixing the taken ones with -2, -3..."""
+
+    def __init__(self):
+        self.taken = set()
+        # Last suffix given to each slug, the lower ones are all taken
+        self.suffixes = {}
+
+    def allocate(self, slug):
+        if slug not in self.taken:
+            self.taken.add(slug)
+            return slug
+
+        index = self.suffixes.get(slug, 1)
+        while True:
+            index += 1
+            key = '{}-{}'.format(slug, index)
+            if key not in self.taken:
+                self.taken.add(key)
+                self.suffixes[slug] = index
+                return key
+
+
+class Category:
+    """
+    A category of the datastore. Its articles are kept as the indexes of the articles in the datastore, with their
+    position in the category.
+    """
+
+    __slots__ = ('title', 'url', 'slug', 'icon', 'description', 'seo_title', 'seo_description', 'parent', 'position', 'articles', 'positions')
+    FIELDS = __slots__[:-3]
+    _values = operator.attrgetter(*FIELDS)
+
+    def __init__(self, title=None, url=None, slug=None, icon=None, description=None, seo_title=None, seo_description=None, parent=None, position=0):
+        self.title = title
+        self.url = url
+        self.slug = slug
+        self.icon = icon
+        self.description = description
+        self.seo_title = seo_title
+        self.seo_description = seo_description
+        self.parent = parent
+        self.position = position
+        self.articles = array.array('I')
+        self.positions = array.array('q')
+
+    def add(self, index, position=None):
+        self.articles.append(index)
+        self.positions.append(len(self.positions) if position is None else position)
+
+    def article_ids(self, article_ids):
+        order = sorted(range(len(self.articles)), key=self.positions.__getitem__)
+        return [article_ids[self.articles[i]] for i in order]
+
+    def encode(self, article_ids, slug=None):
+        entry = dict(zip(self.FIELDS, self._values(self)))
+        if slug is not None:
+            entry['slug'] = slug
+        entry['articles'] = self.article_ids(article_ids)
+        return entry
+
+
+class Uncategorized(Category):
+    """The articles added to no category, exported with their list only, after the other categories."""
+
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__(position=math.inf)
+
+    def encode(self, article_ids, slug=None):
+        return {'articles': self.article_ids(article_ids)}
+
+
+class Article:
+    """An article of the datastore. `content` is the digest of the content when the datastore uses a BlobStore."""
+
+    __slots__ = ('index', 'title', 'content', 'previous_url', 'slug', 'description', 'seo_title', 'seo_description', 'created', 'last_updated')
+    FIELDS = __slots__[1:]
+    _values = operator.attrgetter(*FIELDS)
+
+    def __init__(self, index, title, content, previous_url, slug=None, description=None, seo_title=None, seo_description=None, created=None, last_updated=None):
+        self.index = index
+        self.title = title
+        self.content = content
+        self.previous_url = previous_url
+        self.slug = slug
+        self.description = description
+        self.seo_title = seo_title
+        self.seo_description = seo_description
+        self.created = created
+        self.last_updated = last_updated
+
+    def encode(self, blobs=None, slug=None):
+        entry = dict(zip(self.FIELDS, self._values(self)))
+        if slug is not None:
+            entry['slug'] = slug
+        if blobs:
+            entry['content'] = blobs.get(self.content)
+        return entry
+
+
+class Records(Mapping):
+    """
+    Read-only mapping of records by identifier, encoded into the exported dictionaries one at a time as they are
+    accessed, so that the whole export never lives in memory as dictionaries.
+    """
+
+    def __init__(self, records, encode):
+        self.records = dict(records)
+        self.encode = encode
+
+    def __getitem__(self, key):
+        return self.encode(self.records[key])
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, key):
+        return key in self.records
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, dict(self.items()))
+
+    def items(self):
+        for key, record in self.records.items():
+            yield key, self.encode(record)
+
+    def values(self):
+        for record in self.records.values():
+            yield self.encode(record)
+
+
+class KnowledgeData:
+    """
+    The categories and articles of a language. Saving is thread-safe. Categories are exported by the positions of
+    their parents then their own, articles by the category they are in then their position in it, and the unique
+    slugs are allocated in that order when serializing: with explicit positions, the output does not depend on the
+    order the workers saved them in. Ties keep the order they were saved in.
+    """
+
+    def __init__(self, language, url, unique_categories_slug=False, unique_articles_slug=True, blobs=None, service=None):
+        self.service = service
         self.unique_categories_slug = unique_categories_slug
         self.unique_articles_slug = unique_articles_slug
+        # When set, the articles' content is kept in this BlobStore and only its digest in memory
+        self.blobs = blobs
+        self._lock = threading.Lock()
 
         # Will be exported
         self.base_url = url
@@ -20,34 +174,124 @@ class KnowledgeData(dict):
         self.metadata = {}
         self.categories = {}
         self.articles = {}
+        # Identifier of each article, by index
+        self._article_ids = []
+        # Identifier of each article, by previous url, and the previous url of the articles by id on the source platform
+        self._urls = {}
+        self._sources = {}
+        # Identifiers of the records sharing the same key, by kind and key
+        self._duplicates = {}
 
-    def _get_available_slug(self, slug, kind):
-        slug = slugify(slug)
+    def _identifier(self, kind, key, records):
+        """
+        Derives the identifier from the service, language and `key`. Two records with the same key (the same title
+        under a category for instance) are told apart by their rank. It is given in the order they are saved until
+        they are serialized, where it is given again in the order they are exported, see `_renames`.
+        """
+        identifier = make_identifier(self.service, self.language, kind, key)
+        if identifier in records:
+            duplicates = self._duplicates.setdefault((kind, key), [identifier])
+            rank = len(duplicates)
+            while identifier in records:
+                rank += 1
+                identifier = make_identifier(self.service, self.language, kind, '{}#{}'.format(key, rank))
+            duplicates.append(identifier)
+        return identifier
 
-        if slug not in self._slugs[kind]:
-            self._slugs[kind].append(slug)
-            return slug
+    def find_article(self, previous_url=None, source_id=None):
+        """Returns the identifier of the article saved with this previous url or source id, or None."""
+        if source_id is not None:
+            previous_url = self._sources.get(source_id)
+        return self._urls.get(previous_url)
 
-        index = 1
-        while True:
-            index += 1
-            key = '{}-{}'.format(slug, index)
-            if key not in self._slugs[kind]:
-                self._slugs[kind].append(key)
-                return key
+    def add_source(self, source_id, previous_url):
+        """Records the previous url of an article by its id on the source platform, before the article is saved."""
+        with self._lock:
+            self._sources[source_id] = previous_url
 
-    def _add_to_store(self, key, entry):
-        identifier = str(uuid4())
-        getattr(self, key)[identifier] = entry
-        return identifier
+    def source_url(self, source_id):
+        return self._sources.get(source_id)
+
+    def _category_paths(self):
+        """Returns the positions of the parents of each category followed by its own, by category id."""
+        paths = {}
+
+        def path(identifier):
+            if identifier not in paths:
+                category = self.categories[identifier]
+                parent = path(category.parent) if category.parent is not None and category.parent in self.categories else ()
+                paths[identifier] = parent + (category.position,)
+            return paths[identifier]
+
+        for identifier in self.categories:
+            path(identifier)
+        return paths
+
+    def _article_keys(self, paths):
+        """Returns the path of the first category of each article with its position in it, by article index."""
+        keys = {}
+        for identifier, category in self.categories.items():
+            for index, position in zip(category.articles, category.positions):
+                key = (paths[identifier], position)
+                if index not in keys or key < keys[index]:
+                    keys[index] = key
+        return keys
+
+    def _sorted(self):
+        # sorted is stable: records with the same key stay in the order they were saved
+        paths = self._category_paths()
+        keys = self._article_keys(paths)
+        # Articles added to no category come after all the others
+        last = ((math.inf, math.inf),)
+        categories = sorted(self.categories.items(), key=lambda item: paths[item[0]])
+        articles = sorted(self.articles.items(), key=lambda item: keys.get(item[1].index, last))
+        return categories, articles
+
+    def _renames(self, categories, articles):
+        """
+        Returns the new identifier of the sorted records sharing their key with others, by their identifier when
+        saved: the ranks are given back to each group in the order it is exported.
+        """
+        order = {identifier: index for index, (identifier, _) in enumerate(categories + articles)}
+        renames = {}
+        for duplicates in self._duplicates.values():
+            for identifier, renamed in zip(sorted(duplicates, key=order.__getitem__), duplicates):
+                if identifier != renamed:
+                    renames[identifier] = renamed
+        return renames
+
+    def _allocate_slugs(self, records, unique):
+        """Returns the slugs of the sorted `records` by record id, made unique in that order, if `unique` is set."""
+        if not unique:
+            return None
+
+        slugs = Slugs()
+        return {id(record): slugs.allocate(record.slug) for _, record in records if record.slug is not None}
 
     def serialize(self):
+        with self._lock:
+            categories, articles = self._sorted()
+            renames = self._renames(categories, articles)
+            article_ids = [renames.get(identifier, identifier) for identifier in self._article_ids] if renames else self._article_ids
+
+        category_slugs = self._allocate_slugs(categories, self.unique_categories_slug) or {}
+        article_slugs = self._allocate_slugs(articles, self.unique_articles_slug) or {}
+        if renames:
+            categories = [(renames.get(identifier, identifier), category) for identifier, category in categories]
+            articles = [(renames.get(identifier, identifier), article) for identifier, article in articles]
+
+        def encode_category(category):
+            entry = category.encode(article_ids, category_slugs.get(id(category)))
+            if entry.get('parent') in renames:
+                entry['parent'] = renames[entry['parent']]
+            return entry
+
         return {
             'base_url': self.base_url,
             'language': self.language,
             'metadata': self.metadata,
-            'categories': self.categories,
-            'articles': self.articles
+            'categories': Records(categories, encode_category),
+            'articles': Records(articles, lambda article: article.encode(self.blobs, article_slugs.get(id(article))))
         }
 
     def set_metadata(self, metadata):
@@ -66,53 +310,43 @@ class KnowledgeData(dict):
             * company_url
             * links
         """
-        for k in metadata:
-            self.metadata[k] = metadata[k]
+        with self._lock:
+            for k in metadata:
+                self.metadata[k] = metadata[k]
 
     def add_link(self, position, title, url):
-        if 'links' not in self.metadata:
-            self.metadata['links'] = []
+        with self._lock:
+            if 'links' not in self.metadata:
+                self.metadata['links'] = []
 
-        self.metadata['links'].append({
-            'title': title,
-            'url': url,
-            'position': position
-        })
+            self.metadata['links'].append({
+                'title': title,
+                'url': url,
+                'position': position
+            })
 
-    def add_category(self, parent_id, title, url=None, icon=None, slug=None, description=None, seo_title=None, seo_description=None):
+    def add_category(self, parent_id, title, url=None, icon=None, slug=None, description=None, seo_title=None, seo_description=None, position=None):
         assert title is not None, "Title is required"
 
-        if self.unique_categories_slug:
-            slug = self._get_available_slug(slug or title, 'categories')
-        elif not slug:
-            slug = slugify(title)
-
-        identifier = self._add_to_store('categories', {
-            'title': title,
-            'url': url,
-            'slug': slug,
-            'icon': icon,
-            'description': description,
-            'seo_title': seo_title,
-            'seo_description': seo_description,
-            'parent': parent_id,
-            'articles': []
-        })
+        if self.unique_categories_slug or not slug:
+            slug = _slugify(slug or title)
+
+        category = Category(title, url, slug, icon, description, seo_title, seo_description, parent_id)
+        with self._lock:
+            # Categories without url are identified by their path
+            identifier = self._identifier('category', url or '{}/{}'.format(parent_id or '', title), self.categories)
+            category.position = len(self.categories) if position is None else position
+            self.categories[identifier] = category
 
         logging.getLogger('knowledge-base-exporter').info('Added collection: {}'.format(title))
         return identifier
 
-    def add_article(self, title, content, previous_url, slug=None, description=None, seo_title=None, seo_description=None, created=None, last_updated=None):
+    def add_article(self, title, content, previous_url, slug=None, description=None, seo_title=None, seo_description=None, created=None, last_updated=None, source_id=None):
         assert title is not None, "Title is required"
         assert content is not None, "content is required"
         assert previous_url is not None, "previous_url is required"
         assert previous_url.startswith('http'), "Invalid URL for previous_url"
 
-        if self.unique_articles_slug:
-            slug = self._get_available_slug(slug or title, 'articles')
-        elif not slug:
-            slug = slugify(title)
-
         if last_updated and not created:
             created = last_updated
 
@@ -122,17 +356,22 @@ class KnowledgeData(dict):
         if last_updated:
             last_updated = self.parse_date(last_updated)
 
-        identifier = self._add_to_store('articles', {
-            'title': title,
-            'content': content,
-            'previous_url': previous_url,
-            'slug': slug,
-            'description': description,
-            'seo_title': seo_title,
-            'seo_description': seo_description,
-            'created': created,
-            'last_updated': last_updated
-        })
+        if self.unique_articles_slug or not slug:
+            slug = _slugify(slug or title)
+
+        if self.blobs:
+            content = self.blobs.put(content)
+
+        with self._lock:
+            identifier = self._identifier('article', previous_url if source_id is None else source_id, self.articles)
+            index = len(self._article_ids)
+            self.articles[identifier] = Article(
+                index, title, content, previous_url, slug, description, seo_title, seo_description, created, last_updated
+            )
+            self._article_ids.append(identifier)
+            self._urls.setdefault(previous_url, identifier)
+            if source_id is not None:
+                self._sources[source_id] = previous_url
 
         logging.getLogger('knowledge-base-exporter').info('Added article: {}'.format(title))
         return identifier
@@ -152,8 +391,9 @@ class KnowledgeData(dict):
 
         return dt
 
-    def add_article_to_category(self, article_id, category_id):
-        if category_id is None and category_id not in self.categories:
-            self.categories[None] = {'articles': []}
+    def add_article_to_category(self, article_id, category_id, position=None):
+        with self._lock:
+            if category_id is None and category_id not in self.categories:
+                self.categories[None] = Uncategorized()
 
-        self.categories[category_id]['articles'].append(article_id)
+            self.categories[category_id].add(self.articles[article_id].index, position)
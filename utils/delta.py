@@ -0,0 +1,62 @@
+# -*- coding:utf-8 -*-
+
+"""
+Changes between two exports of a knowledge base, for the imports that only need to process what changed.
+
+Each category and article is summarized by a digest of its JSON, so the previous export only needs to be kept as
+digests, and the records of the new export are compared by digest rather than field by field. The delta holds,
+per language, the added and updated records in full with their digest, and the identifiers of the removed ones:
+
+    {"en": {"categories": {"added": {id: record}, "updated": {id: record}, "removed": [id], "digests": {id: digest}},
+            "articles": {...}}}
+
+Identifiers are derived from the source of the records (see `utils.datastore.make_identifier`), a record keeps its
+identifier from one export to the next.
+"""
+
+import hashlib, json
+
+KINDS = ('categories', 'articles')
+
+
+def digest(record):
+    return hashlib.blake2b(json.dumps(record, sort_keys=True, separators=(',', ':')).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def digest_export(export):
+    """Returns the digest of each record of `export`, by language, kind and identifier."""
+    return {
+        language: {kind: {key: digest(record) for key, record in store.get(kind, {}).items()} for kind in KINDS}
+        for language, store in export.items()
+    }
+
+
+def compute_delta(previous, export):
+    """
+    Returns the delta from the `previous` digests (see `digest_export`) to `export`. The records of `export` are
+    iterated once, only the changed ones are kept.
+    """
+    delta = {}
+    for language in list(export) + [language for language in previous if language not in export]:
+        store = export.get(language, {})
+        before = previous.get(language, {})
+        delta[language] = {}
+        for kind in KINDS:
+            digests = before.get(kind, {})
+            changes = {'added': {}, 'updated': {}, 'removed': [], 'digests': {}}
+            seen = set()
+            for key, record in store.get(kind, {}).items():
+                # json turns the None key of the uncategorized articles into "null"
+                key = 'null' if key is None else key
+                seen.add(key)
+                current = digest(record)
+                if digests.get(key) == current:
+                    continue
+
+                changes['added' if key not in digests else 'updated'][key] = record
+                changes['digests'][key] = current
+
+            changes['removed'] = [key for key in digests if key not in seen]
+            delta[language][kind] = changes
+
+    return delta
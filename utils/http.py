@@ -0,0 +1,101 @@
+# -*- coding:utf-8 -*-
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+import requests, logging, threading
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+def _counting_pool(pool_class, client):
+    class CountingPool(pool_class):
+        def _new_conn(self):
+            client.on_connection()
+            return super()._new_conn()
+
+    return CountingPool
+
+
+class _CountingAdapter(HTTPAdapter):
+    def __init__(self, client, **kwargs):
+        self.client = client
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            scheme: _counting_pool(pool_class, self.client)
+            for scheme, pool_class in self.poolmanager.pool_classes_by_scheme.items()
+        }
+
+
+class HttpClient:
+    """
+    Pooled HTTP client shared by all the requests of an importer.
+
+    Connections are kept alive and reused across requests to the same host. Compressed transfer is requested
+    for every encoding urllib3 is able to decode (gzip and deflate, plus br and zstd when brotli and zstandard
+    are installed). HTTP/2 is used when requested and httpx is available.
+    """
+
+    def __init__(self, pool_size=10, http2=False, headers=None):
+        self.connections = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+
+        headers = {'Accept-Encoding': ACCEPT_ENCODING, **(headers or {})}
+
+        self.http2 = http2 and httpx is not None
+        if http2 and not self.http2:
+            logging.getLogger('knowledge-base-exporter').warning('HTTP/2 requires httpx[http2] to be installed, using HTTP/1.1')
+
+        if self.http2:
+            self.session = httpx.Client(
+                http2=True,
+                headers=headers,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+            )
+        else:
+            self.session = requests.Session()
+            self.session.headers.update(headers)
+            adapter = _CountingAdapter(self, pool_connections=pool_size, pool_maxsize=pool_size)
+            self.session.mount('http://', adapter)
+            self.session.mount('https://', adapter)
+
+    def on_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def _trace(self, event, info):
+        # httpcore does not expose its pool, we count the connections through its trace events
+        if event == 'connection.connect_tcp.complete':
+            self.on_connection()
+
+    def request(self, method, url, **kwargs):
+        with self._lock:
+            self.requests += 1
+
+        if self.http2:
+            kwargs.setdefault('extensions', {})['trace'] = self._trace
+
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'connections_opened': self.connections,
+            'connections_reused': max(0, self.requests - self.connections)
+        }
+
+    def close(self):
+        self.session.close()
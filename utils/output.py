@@ -0,0 +1,113 @@
+# -*- coding:utf-8 -*-
+
+"""
+Writes the export without building it in memory: the languages, categories and articles are encoded one by one
+into a temporary file next to the output, which only replaces the output once complete. A failed export leaves the
+previous file untouched.
+
+The output is compressed when its name ends with .gz (gzip) or .zst (zstd, requires zstandard), and read back
+the same way.
+"""
+
+from collections.abc import Mapping
+from utils.compression import zstandard
+import gzip, io, json, os, tempfile
+
+# Depth down to which the dictionaries are streamed entry by entry: languages, their sections, then the categories
+# and articles. Deeper values are encoded at once.
+STREAMED_DEPTH = 3
+
+
+def _key(key):
+    """Encodes a dictionary key as json.dumps does."""
+    if isinstance(key, str):
+        return json.dumps(key)
+    if key is None:
+        return '"null"'
+    if key is True or key is False:
+        return '"{}"'.format(str(key).lower())
+    return json.dumps(str(key))
+
+
+def _encode_mapping(obj):
+    # json only encodes dictionaries, the datastore's records are mappings
+    if isinstance(obj, Mapping):
+        return dict(obj.items())
+    raise TypeError('Object of type {} is not JSON serializable'.format(type(obj).__name__))
+
+
+def iterencode(obj, indent=None, depth=STREAMED_DEPTH, level=0):
+    """
+    Yields the JSON of `obj` in chunks, the dictionaries down to `depth` being encoded one entry at a time.
+    The concatenated chunks are identical to json.dumps(obj, indent=indent).
+    """
+    if not isinstance(obj, Mapping) or not obj or depth == 0:
+        encoded = json.dumps(obj, indent=indent, default=_encode_mapping)
+        if indent is not None and level:
+            encoded = encoded.replace('\n', '\n' + ' ' * indent * level)
+        yield encoded
+        return
+
+    if indent is None:
+        separator, opening, closing = ', ', '{', '}'
+    else:
+        newline = '\n' + ' ' * indent * (level + 1)
+        separator, opening, closing = ',' + newline, '{' + newline, '\n' + ' ' * indent * level + '}'
+
+    yield opening
+    for index, (key, value) in enumerate(obj.items()):
+        yield '{}{}: '.format(separator if index else '', _key(key))
+        yield from iterencode(value, indent, depth - 1, level + 1)
+    yield closing
+
+
+def _open_compressed(f, path):
+    if path.endswith('.gz'):
+        return gzip.GzipFile(fileobj=f, mode='wb')
+
+    if path.endswith('.zst'):
+        assert zstandard is not None, 'zstandard is required to write {}'.format(path)
+        return zstandard.ZstdCompressor().stream_writer(f, closefd=False)
+
+    return None
+
+
+def write_json(path, obj, pretty=False):
+    """Streams `obj` as JSON into `path`, atomically replacing it once written."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_fp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            compressed = _open_compressed(f, path)
+            stream = io.TextIOWrapper(compressed or f, encoding='utf-8', write_through=False)
+            for chunk in iterencode(obj, 4 if pretty else None):
+                stream.write(chunk)
+            stream.flush()
+            stream.detach()
+            if compressed is not None:
+                compressed.close()
+
+            f.flush()
+            os.fsync(f.fileno())
+
+        # mkstemp creates the file readable by its owner only, the output gets the permissions open() would give it
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp_fp, 0o666 & ~umask)
+        os.replace(tmp_fp, path)
+    except BaseException:
+        os.remove(tmp_fp)
+        raise
+
+
+def read_json(path):
+    """Reads an export written by write_json."""
+    with open(path, 'rb') as f:
+        if path.endswith('.gz'):
+            return json.load(gzip.GzipFile(fileobj=f))
+
+        if path.endswith('.zst'):
+            assert zstandard is not None, 'zstandard is required to read {}'.format(path)
+            return json.load(zstandard.ZstdDecompressor().stream_reader(f))
+
+        return json.load(f)
@@ -0,0 +1,247 @@
+# -*- coding:utf-8 -*-
+
+from bs4 import BeautifulSoup
+from bs4.builder import builder_registry, HTMLTreeBuilder
+from html.parser import HTMLParser
+import json, logging, re, soupsieve
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from bs4.filter import ElementFilter
+except ImportError:  # beautifulsoup4 < 4.13, pages are always parsed in full
+    ElementFilter = None
+
+PARSERS = ('html.parser', 'lxml', 'html5lib')
+DEFAULT_PARSER = 'html.parser'
+
+# Elements and attributes BeautifulSoup serializes specially, which `write_html` must serialize the same way
+VOID_ELEMENTS = getattr(HTMLTreeBuilder, 'DEFAULT_EMPTY_ELEMENT_TAGS', None) or HTMLTreeBuilder.empty_element_tags
+LIST_ATTRIBUTES = HTMLTreeBuilder.DEFAULT_CDATA_LIST_ATTRIBUTES
+ASCII_SPACES = ' \n\t\f\r'
+
+# Next.js escapes "<" in the JSON it embeds, so the first closing tag is the end of the script
+NEXT_DATA_RE = re.compile(rb'<script\b[^>]*\bid=["\']?__NEXT_DATA__["\']?[^>]*>(.*?)</script', re.DOTALL | re.IGNORECASE)
+
+
+def is_available(parser):
+    return builder_registry.lookup(parser) is not None
+
+
+def check_parser(parser):
+    """Returns the parser to use for `parser`, falling back to lxml, then html.parser, when it is not installed."""
+    parser = parser or DEFAULT_PARSER
+    assert parser in PARSERS, 'Unknown HTML parser "{}", expected one of {}'.format(parser, ', '.join(PARSERS))
+
+    if is_available(parser):
+        return parser
+
+    fallback = 'lxml' if is_available('lxml') else 'html.parser'
+    logging.getLogger('knowledge-base-exporter').warning('{} is not installed, using {} to parse the pages'.format(parser, fallback))
+    return fallback
+
+
+class Regions(ElementFilter or object):
+    """
+    Parts of a page a service needs, each given as the name and attributes of an element (a class matches any of
+    the classes of the element):
+
+        Regions(('section', {'id': 'main-content'}), ('meta', {'name': 'description'}), required='#main-content article')
+
+    Only the matching elements and their descendants are parsed, skipping navigation, footers, inline styles
+    and scripts. `required` is a CSS selector that must match in the restricted tree, otherwise the page
+    doesn't have the expected layout and is parsed in full.
+    """
+
+    def __init__(self, *regions, required=None):
+        self.regions = [(name, attrs or {}) for name, attrs in regions]
+        self.required = required
+        self.selector = soupsieve.compile(required) if required else None
+
+    @property
+    def excludes_everything(self):
+        return not self.regions
+
+    def _matches(self, name, attrs, region):
+        region_name, region_attrs = region
+        if region_name and region_name != name:
+            return False
+
+        for key, value in region_attrs.items():
+            actual = attrs.get(key)
+            if actual is None:
+                return False
+
+            if key == 'class':
+                if value not in (actual.split() if isinstance(actual, str) else actual):
+                    return False
+            elif value is not True and actual != value:
+                return False
+
+        return True
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        attrs = attrs or {}
+        return any(self._matches(name, attrs, region) for region in self.regions)
+
+    def allow_string_creation(self, string):
+        # Only called for the strings outside of any region
+        return False
+
+
+def parse_html(markup, parser=DEFAULT_PARSER, regions=None):
+    # html5lib doesn't support restricting the parsing
+    if regions is not None and ElementFilter is not None and parser != 'html5lib':
+        soup = BeautifulSoup(markup, features=parser, parse_only=regions)
+        if regions.selector is None or regions.selector.select_one(soup) is not None:
+            return soup
+
+        logging.getLogger('knowledge-base-exporter').debug('{} not found, parsing the whole page'.format(regions.required))
+
+    return BeautifulSoup(markup, features=parser)
+
+
+def parse_fragment(markup, parser=DEFAULT_PARSER):
+    """
+    Parses a piece of HTML that is not a whole document. Returns the soup and the element holding the fragment:
+    lxml and html5lib wrap fragments in <html><body>, which must not end up in the output.
+    """
+    soup = BeautifulSoup(markup, features=parser)
+    if parser == 'html.parser' or soup.body is None:
+        return soup, soup
+
+    return soup, soup.body
+
+
+def load_json(data):
+    """Decodes JSON with orjson when it is installed."""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson is stricter than json (e.g. on lone surrogates)
+            pass
+
+    return json.loads(data)
+
+
+def extract_next_data(body):
+    """Returns the JSON (as bytes) of the __NEXT_DATA__ script of a Next.js page, without parsing the HTML, or None."""
+    if isinstance(body, str):
+        body = body.encode()
+
+    match = NEXT_DATA_RE.search(body)
+    if match is None:
+        return None
+
+    return match.group(1).strip()
+
+
+def escape_text(text):
+    if '&' in text or '<' in text or '>' in text:
+        return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+    return text
+
+
+def format_attribute(name, value):
+    """Serializes an attribute (whose value is not escaped) as BeautifulSoup does."""
+    value = escape_text(str(value))
+    if '"' in value:
+        if "'" in value:
+            return '{}="{}"'.format(name, value.replace('"', '&quot;'))
+
+        return "{}='{}'".format(name, value)
+
+    return '{}="{}"'.format(name, value)
+
+
+def start_tag(name, attributes=None):
+    """Returns the opening tag of an element as BeautifulSoup serializes it: attributes sorted, empty elements closed."""
+    attributes = ''.join(' ' + format_attribute(k, v) for k, v in sorted((attributes or {}).items()) if v is not None)
+    return '<{}{}{}>'.format(name, attributes, '/' if name in VOID_ELEMENTS else '')
+
+
+class _HtmlWriter(HTMLParser):
+    def __init__(self, out, preserve_whitespace=False):
+        super().__init__(convert_charrefs=True)
+        self.out = out
+        self.open_tags = []
+        self.preserve_whitespace = preserve_whitespace
+
+    def _start(self, tag, attrs):
+        attributes = {}
+        for name, value in attrs:
+            value = value or ''
+            if name in LIST_ATTRIBUTES['*'] or name in LIST_ATTRIBUTES.get(tag, ()):
+                value = ' '.join(value.split())
+            attributes[name] = value
+
+        self.out.append(start_tag(tag, attributes))
+        if tag in VOID_ELEMENTS:
+            return False
+
+        self.open_tags.append(tag)
+        return True
+
+    def handle_starttag(self, tag, attrs):
+        self._start(tag, attrs)
+
+    def handle_startendtag(self, tag, attrs):
+        if self._start(tag, attrs):
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        # Like BeautifulSoup, closes the elements left open inside, and ignores a closing tag without opening one
+        if tag not in self.open_tags:
+            return
+
+        while True:
+            name = self.open_tags.pop()
+            self.out.append('</{}>'.format(name))
+            if name == tag:
+                return
+
+    def handle_data(self, data):
+        # The content of scripts and styles is not escaped
+        if self.open_tags and self.open_tags[-1] in ('script', 'style'):
+            self.out.append(data)
+            return
+
+        # BeautifulSoup collapses the strings made only of whitespace, except in <pre> and <textarea>
+        if not data.strip(ASCII_SPACES) and not self.preserve_whitespace and 'pre' not in self.open_tags and 'textarea' not in self.open_tags:
+            data = '\n' if '\n' in data else ' '
+
+        self.out.append(escape_text(data))
+
+    def handle_comment(self, data):
+        self.out.append('<!--{}-->'.format(data))
+
+    def handle_decl(self, decl):
+        self.out.append('<!{}>'.format(decl))
+
+    def handle_pi(self, data):
+        self.out.append('<?{}>'.format(data))
+
+    def close(self):
+        super().close()
+        while self.open_tags:
+            self.out.append('</{}>'.format(self.open_tags.pop()))
+
+
+def write_html(markup, out, preserve_whitespace=False):
+    """
+    Appends a piece of HTML to `out` (a list of strings) in the form BeautifulSoup would serialize it, without
+    building a tree: entities decoded then escaped again, empty elements closed (<br/>), unclosed elements closed.
+    Set `preserve_whitespace` when the markup is written inside a <pre>.
+    """
+    if '<' not in markup and '&' not in markup and '>' not in markup and (preserve_whitespace or markup.strip(ASCII_SPACES)):
+        out.append(markup)
+        return
+
+    writer = _HtmlWriter(out, preserve_whitespace)
+    writer.feed(markup)
+    writer.close()
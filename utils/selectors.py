@@ -0,0 +1,67 @@
+# -*- coding:utf-8 -*-
+
+"""
+Site profiles: the CSS selectors an importer relies on, declared once per service and compiled when the service is
+imported. `soup.select(css)` goes through soupsieve's compile step on every call, a profile compiles each selector
+once and reuses it on every page.
+
+Profiles also count the lookups that found nothing. Markup changes on a platform show up as a selector failing on
+most pages, reported when the importer is closed.
+"""
+
+import collections, logging, threading, soupsieve
+
+
+class SiteProfile:
+    """
+    The selectors of a platform's markup, by name. `version` is bumped whenever the selectors are updated for a new
+    markup, so that a failure report tells which markup the selectors were written for.
+
+    Selectors listed in `optional` may legitimately find nothing, their failures are not counted.
+    """
+
+    def __init__(self, name, version, optional=(), **selectors):
+        self.name = name
+        self.version = version
+        self.optional = frozenset(optional)
+        self.patterns = selectors
+        self.selectors = {key: soupsieve.compile(css) for key, css in selectors.items()}
+        self.lookups = collections.Counter()
+        self.failures = collections.Counter()
+        self._lock = threading.Lock()
+
+        unknown = self.optional - set(selectors)
+        assert not unknown, 'Unknown optional selectors: {}'.format(', '.join(sorted(unknown)))
+
+    def _count(self, key, found):
+        with self._lock:
+            self.lookups[key] += 1
+            if not found and key not in self.optional:
+                self.failures[key] += 1
+
+    def select(self, key, tag, limit=0):
+        """Returns the elements under `tag` matching the selector `key`, as soup.select does."""
+        results = self.selectors[key].select(tag, limit=limit)
+        self._count(key, results)
+        return results
+
+    def select_one(self, key, tag):
+        """Returns the first element under `tag` matching the selector `key`, or None."""
+        result = self.selectors[key].select_one(tag)
+        self._count(key, result is not None)
+        return result
+
+    def stats(self):
+        return {
+            key: {'selector': self.patterns[key], 'lookups': self.lookups[key], 'failures': self.failures[key]}
+            for key in self.selectors if self.lookups[key]
+        }
+
+    def report(self):
+        """Logs the selectors that found nothing, with how often they failed."""
+        logger = logging.getLogger('knowledge-base-exporter')
+        for key, stats in sorted(self.stats().items()):
+            if stats['failures']:
+                logger.warning('Selector {}.{} (profile v{}) "{}" found nothing {} times out of {}'.format(
+                    self.name, key, self.version, stats['selector'], stats['failures'], stats['lookups']
+                ))
@@ -0,0 +1,41 @@
+# -*- coding:utf-8 -*-
+
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Query parameters added by marketing tools, which never change the page served
+TRACKING_PARAMS = ('fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'igshid', 'mc_cid', 'mc_eid', '_ga', '_gl', '_hsenc', '_hsmi', 'hsctatracking', 'ref_src')
+TRACKING_PREFIXES = ('utm_', 'pk_', 'mtm_')
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def is_tracking_param(name):
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def canonicalize_url(url, strip_trailing_slash=True):
+    """
+    Returns the canonical form of an absolute url: lower cased scheme and host, no default port, no fragment and
+    no tracking parameters. With `strip_trailing_slash`, /article/foo/ and /article/foo are the same url.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+
+    netloc = (parts.hostname or '').lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc = '{}:{}'.format(netloc, parts.port)
+    if parts.username:
+        netloc = '{}@{}'.format(parts.username if parts.password is None else '{}:{}'.format(parts.username, parts.password), netloc)
+
+    path = parts.path or '/'
+    if strip_trailing_slash and len(path) > 1:
+        path = path.rstrip('/') or '/'
+
+    query = parts.query
+    if query:
+        params = parse_qsl(query, keep_blank_values=True)
+        if any(is_tracking_param(name) for name, _ in params):
+            query = urlencode([(name, value) for name, value in params if not is_tracking_param(name)])
+
+    return urlunsplit((scheme, netloc, path, query, ''))
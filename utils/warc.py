@@ -0,0 +1,281 @@
+# -*- coding:utf-8 -*-
+
+"""
+Minimal WARC 1.1 reader and writer, enough to archive the pages of a crawl and to replay them later.
+
+Records are gzipped one by one when the file name ends with .gz, as most WARC tools expect.
+"""
+
+from urllib.parse import urljoin
+from utils.urls import canonicalize_url
+import base64, datetime, gzip, hashlib, io, threading, time, uuid, zlib
+
+CHUNK_SIZE = 1024 * 1024
+MAX_REDIRECTS = 10
+
+# Headers describing the transfer of the body, which no longer apply to the decoded body we store
+TRANSFER_HEADERS = ('content-encoding', 'transfer-encoding', 'content-length')
+
+
+def _digest(data):
+    return 'sha1:' + base64.b32encode(hashlib.sha1(data).digest()).decode()
+
+
+def _warc_date(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _parse_warc_date(value):
+    value = value.strip().rstrip('Z')
+    try:
+        date = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+    return date.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+def _parse_headers(lines):
+    headers = {}
+    for line in lines:
+        name, _, value = line.decode('utf-8', 'replace').partition(':')
+        if name:
+            headers[name.strip().lower()] = value.strip()
+
+    return headers
+
+
+def _read_records(stream):
+    """Yields (offset, WARC headers, block) of every record in `stream`."""
+    while True:
+        offset = stream.tell()
+        line = stream.readline()
+        if not line:
+            return
+
+        if not line.strip():
+            continue
+
+        assert line.startswith(b'WARC/'), 'Invalid WARC record at offset {}'.format(offset)
+        lines = []
+        while True:
+            line = stream.readline()
+            if not line.strip():
+                break
+            lines.append(line.rstrip(b'\r\n'))
+
+        headers = _parse_headers(lines)
+        yield offset, headers, stream.read(int(headers.get('content-length', 0)))
+
+
+def _gzip_members(f):
+    """Yields (offset, compressed size, data) of each gzip member of `f`."""
+    offset, pending = 0, b''
+    while True:
+        data = pending or f.read(CHUNK_SIZE)
+        if not data:
+            return
+
+        decompressor, chunks, size = zlib.decompressobj(zlib.MAX_WBITS | 16), [], 0
+        while True:
+            size += len(data)
+            chunks.append(decompressor.decompress(data))
+            if decompressor.eof:
+                pending = decompressor.unused_data
+                size -= len(pending)
+                break
+
+            data = f.read(CHUNK_SIZE)
+            assert data, 'Truncated gzip member at offset {}'.format(offset)
+
+        yield offset, size, b''.join(chunks)
+        offset += size
+
+
+def _dechunk(body):
+    chunks, position = [], 0
+    while True:
+        end = body.find(b'\r\n', position)
+        if end == -1:
+            break
+
+        size = int(body[position:end].split(b';')[0], 16)
+        if size == 0:
+            break
+
+        chunks.append(body[end + 2:end + 2 + size])
+        position = end + 2 + size + 2
+
+    return b''.join(chunks)
+
+
+def parse_http_response(block):
+    """Returns the status, headers (lower cased) and decoded body of an HTTP response."""
+    head, _, body = block.partition(b'\r\n\r\n')
+    lines = head.split(b'\r\n')
+    status = int(lines[0].split(b' ')[1])
+    headers = _parse_headers(lines[1:])
+
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        body = _dechunk(body)
+
+    encoding = headers.get('content-encoding', '').lower()
+    if encoding in ('gzip', 'x-gzip'):
+        body = gzip.decompress(body)
+    elif encoding == 'deflate':
+        try:
+            body = zlib.decompress(body)
+        except zlib.error:
+            body = zlib.decompress(body, -zlib.MAX_WBITS)
+
+    return status, {k: v for k, v in headers.items() if k not in TRANSFER_HEADERS}, body
+
+
+class WarcRecord:
+    def __init__(self, url, status, headers, body, date=None):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.date = date
+
+    @property
+    def location(self):
+        return self.headers.get('location') if 300 <= self.status < 400 else None
+
+
+class WarcArchive:
+    """
+    Read-only access to the responses of a WARC file. The file is indexed when opened, records are read on demand.
+    Urls are compared in their canonical form. When an url was archived several times, the last response wins.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.compressed = path.endswith('.gz')
+        self.index = {}
+        self._lock = threading.Lock()
+        self._file = open(path, 'rb')
+
+        for position, offset, headers in self._scan():
+            if headers.get('warc-type') == 'response' and headers.get('warc-target-uri'):
+                self.index[canonicalize_url(headers['warc-target-uri'].strip('<>'))] = (position, offset)
+
+    def __contains__(self, url):
+        return canonicalize_url(url) in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def _scan(self):
+        if not self.compressed:
+            for offset, headers, _ in _read_records(self._file):
+                yield None, offset, headers
+            return
+
+        for position, size, data in _gzip_members(self._file):
+            for offset, headers, _ in _read_records(io.BytesIO(data)):
+                yield (position, size), offset, headers
+
+    def _read(self, position, offset):
+        with self._lock:
+            if position is None:
+                self._file.seek(offset)
+                return next(_read_records(self._file))
+
+            self._file.seek(position[0])
+            stream = io.BytesIO(gzip.decompress(self._file.read(position[1])))
+
+        stream.seek(offset)
+        return next(_read_records(stream))
+
+    def get(self, url):
+        """Returns the WarcRecord of `url`, or None when the url was not archived."""
+        position = self.index.get(canonicalize_url(url))
+        if position is None:
+            return None
+
+        _, headers, block = self._read(*position)
+        status, http_headers, body = parse_http_response(block)
+        return WarcRecord(url, status, http_headers, body, _parse_warc_date(headers.get('warc-date', '')))
+
+    def resolve(self, url):
+        """Returns the final url and WarcRecord of `url`, following the archived redirects."""
+        record = self.get(url)
+        for _ in range(MAX_REDIRECTS):
+            if record is None or not record.location:
+                break
+
+            url = urljoin(url, record.location)
+            record = self.get(url)
+
+        return url, record
+
+    def close(self):
+        self._file.close()
+
+
+class WarcWriter:
+    """Writes each page once as a `response` record. A redirected page is written under its final url, with a
+    redirect record for the original url."""
+
+    def __init__(self, path, software='knowledge-base-exporter'):
+        self.path = path
+        self.compressed = path.endswith('.gz')
+        self.written = set()
+        self._lock = threading.Lock()
+        self._file = open(path, 'wb')
+
+        info = 'software: {}\r\nformat: WARC File Format 1.1\r\n'.format(software).encode()
+        self._write_record('warcinfo', None, info, 'application/warc-fields')
+
+    def _write_record(self, record_type, url, block, content_type, date=None):
+        headers = [
+            ('WARC-Type', record_type),
+            ('WARC-Record-ID', '<urn:uuid:{}>'.format(uuid.uuid4())),
+            ('WARC-Date', _warc_date(date or time.time())),
+        ]
+        if url:
+            headers.append(('WARC-Target-URI', url))
+
+        headers += [
+            ('Content-Type', content_type),
+            ('WARC-Block-Digest', _digest(block)),
+            ('Content-Length', str(len(block))),
+        ]
+
+        record = b'WARC/1.1\r\n' + ''.join('{}: {}\r\n'.format(k, v) for k, v in headers).encode() + b'\r\n' + block + b'\r\n\r\n'
+        if self.compressed:
+            record = gzip.compress(record)
+
+        self._file.write(record)
+
+    def _write_response(self, url, status, headers, body, date):
+        reason = {200: 'OK', 302: 'Found'}.get(status, '')
+        head = ['HTTP/1.1 {} {}'.format(status, reason)]
+        head += ['{}: {}'.format(k, v) for k, v in headers.items() if k.lower() not in TRANSFER_HEADERS]
+        head.append('Content-Length: {}'.format(len(body)))
+
+        block = '\r\n'.join(head).encode('utf-8', 'replace') + b'\r\n\r\n' + body
+        self._write_record('response', url, block, 'application/http;msgtype=response', date)
+
+    def write(self, url, final_url, headers, body, date=None):
+        """Archives the page `url`, unless it was already written."""
+        with self._lock:
+            if url in self.written:
+                return
+
+            self.written.add(url)
+            if final_url and final_url != url:
+                self._write_response(url, 302, {'location': final_url}, b'', date)
+
+                if final_url in self.written:
+                    return
+
+                self.written.add(final_url)
+
+            self._write_response(final_url or url, 200, headers, body, date)
+
+    def close(self):
+        with self._lock:
+            self._file.close()